@@ -1,66 +1,164 @@
 # app.py
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import numpy as np
+import startup
+
+# Perfil d'arrencada: imports, dades, primer pintat i render (startup.py)
+boot = startup.StartupProfile("app")
+
+import functools  # noqa: E402
+
+import instrumentation  # noqa: E402
+from settings import HOTEL_SOURCE, MONTH_ORDER, file_hash, file_version  # noqa: E402
+from snapshot import hotel_options, load_snapshot, serve  # noqa: E402
+
+# Amb l'arrencada ràpida, pandas, plotly.express i les vistes s'importen
+# només quan calen (després del títol i dels KPI); si no, aquí mateix
+if not startup.FAST_START:
+    startup.preload("app")
+boot.mark("imports")
 
 # ========================
 # CONFIGURACIÓ PÀGINA
 # ========================
 st.set_page_config(page_title="Anàlisi de Reserves Hoteleres a Portugal", page_icon="🏨")
                    
+# ========================
+# CARREGAR DADES (noms de columnes i categories ja nets)
+# ========================
+@st.cache_resource(max_entries=1)
+def load_data(version):
+    # Reserves de només lectura, el cub agregat i la sèrie diària, compartits per totes les sessions
+    from hotel_cube import BookingCube
+    from hotel_daily import DailySeries
+    from hotel_data import load_bookings
+    from shared_data import freeze_booking_cube, freeze_daily, freeze_frame
+
+    df = load_bookings(HOTEL_SOURCE)
+    cube = freeze_booking_cube(BookingCube.from_bookings(df))
+    daily = freeze_daily(DailySeries.from_bookings(df))
+    return freeze_frame(df), cube, daily
+
+# Instrumentació per secció (VIZ_PROFILE=1 o ?debug=1)
+profiler = instrumentation.Profiler("app", enabled=instrumentation.enabled())
+
+
+@st.cache_resource(max_entries=1)
+def load_static_snapshot(version):
+    # Vista per defecte pre-renderitzada amb `python snapshot.py` (None si no n'hi ha per a aquesta versió)
+    return load_snapshot("app", version)
+
+
+version = file_version(HOTEL_SOURCE)
+snapshot = load_static_snapshot(version)
+
+
+@functools.cache
+def get_data():
+    # Els mòduls de dades (pandas) només s'importen si calen les reserves
+    boot.load("hotel_cube", "hotel_daily", "hotel_data", "shared_data")
+    with boot.phase("dades"):
+        return profiler.run('carrega', lambda: load_data(version))
+
+
+# Amb instantània, les opcions del sidebar surten del seu manifest i les
+# reserves només es carreguen quan cal la vista en viu
+options = snapshot["options"] if snapshot else hotel_options(get_data()[1])
+
+# ========================
+# Sidebar - filtres
+# ========================
+st.sidebar.header("Filtres")
+selected_hotels = st.sidebar.multiselect("Tipus d'hotel", options=options["hotels"], default=options["hotels"])
+selected_months = st.sidebar.select_slider(
+    "Mesos d'arribada", options=MONTH_ORDER, value=(MONTH_ORDER[0], MONTH_ORDER[-1])
+)
+if not selected_hotels:
+    st.info("Selecciona almenys un tipus d'hotel.")
+    st.stop()
+
+# Vista per defecte: es serveix la instantània estàtica si n'hi ha
+default_view = (sorted(selected_hotels) == sorted(options["hotels"])
+                and tuple(selected_months) == (MONTH_ORDER[0], MONTH_ORDER[-1]))
+if serve(snapshot, default_view):
+    boot.painted()
+    profiler.finish()
+    boot.finish()
+    st.stop()
+
+# ========================
+# Vista en viu
+# ========================
+# Primer el títol i el text, abans de carregar res més
 st.title("Anàlisi de Reserves Hoteleres a Portugal")
 st.markdown("""
 Anàlisi de més de 100.000 reserves d'hotels urbans i resorts a Portugal, incloent cancel·lacions, tarifa mitjana per habitació, tipologies d'estada, segments de mercat i canals de distribució.  
 Objectiu: proporcionar insights accionables per optimitzar rendibilitat, experiència dels clients i fidelització.
 """)
 
-# ========================
-# CARREGAR DADES
-# ========================
-df = pd.read_csv("hotel_bookings.csv")
+df, cube, daily = get_data()
+with boot.phase("imports"):
+    from hotel_cube import booking_filter_key, filter_bookings
+    from result_cache import ResultCache
+
+filters = booking_filter_key(selected_hotels, selected_months)
 
 # ========================
-# NETEJA DE NOMS DE COLUMNES I CATEGORIES
+# Memòria cau de resultats (compartida entre sessions)
 # ========================
-df.rename(columns={
-    'hotel':'Tipus_Hotel',
-    'is_canceled':'Cancel·lada',
-    'lead_time':'Dies_Abans',
-    'adr':'Tarifa',
-    'adults':'Adults',
-    'children':'Nens',
-    'distribution_channel':'Canal',
-    'market_segment':'Segment_Mercat',
-    'trip_type':'Tipus_Viatge',
-    'arrival_date_month':'Mes'
-}, inplace=True)
+@st.cache_resource
+def get_result_cache():
+    # Recupera les seccions precalculades per warmup.py per a aquest fitxer de dades
+    results = ResultCache("app")
+    results.restore(file_hash(HOTEL_SOURCE))
+    return results
 
-df['Tipus_Hotel'] = df['Tipus_Hotel'].map({'Resort Hotel':'Resort','City Hotel':'Hotel Ciutat'})
-df['Cancel·lada'] = df['Cancel·lada'].map({0:'Check-Out',1:'Cancel·lada'})
-df['Segment_Mercat'] = df['Segment_Mercat'].replace('undefined', np.nan)
-df = df[df['Segment_Mercat'].notna()]
-df = df[df['Canal'].notna()]
+with boot.phase("dades"):
+    results = get_result_cache()
+
+
+@functools.cache
+def filtered_cube():
+    # Només es talla el cub si alguna secció no és a la memòria cau
+    return cube.filter(selected_hotels, selected_months)
 
-# ========================
-# PALETA DE COLORS
-# ========================
-PALETTE = ["#c4002d", "#ffd231", "#2d733c", "#306fbe", "#c78095", "#b34667"]
+
+@functools.cache
+def filtered_rows():
+    # Reserves una a una, només per a la dispersió antelació-tarifa
+    return filter_bookings(df, selected_hotels, selected_months)
+
+
+@functools.cache
+def filtered_daily():
+    # Sèrie diària per data d'arribada, només per a la tendència diària
+    return daily.filter(selected_hotels, selected_months)
+
+
+def section(name, build, *params):
+    """Resultat d'una secció per als filtres actuals (amb memòria cau), instrumentat si cal."""
+    def compute():
+        data = filtered_cube()
+        instrumentation.note(rows=data.bookings, cells=len(data), cached=False)
+        return build(data, *params)
+    return profiler.run(name, lambda: results.get_or_build((name, filters) + params, compute), cached=True)
 
 # ========================
 # SECCIÓ 1: KPIs
 # ========================
 st.subheader("Indicadors Clau Generals")
-cancel_rate = round(df['Cancel·lada'].eq('Cancel·lada').mean()*100,1)
-avg_tarifa = round(df['Tarifa'].mean(),2)
-avg_stay = round(df[['stays_in_week_nights','stays_in_weekend_nights']].sum(axis=1).mean(),1)
-rev_par = round(avg_tarifa * (1 - cancel_rate/100),2)
+# Els KPI surten del cub (el mateix que hotel_views.kpis_view) sense importar les vistes
+kpis = section('kpis', lambda data: data.kpis())
+cancel_rate = kpis['cancel_rate']
+avg_tarifa = kpis['avg_tarifa']
+avg_stay = kpis['avg_stay']
+rev_par = kpis['rev_par']
 
 kpi_cols = st.columns(4)
 kpi_cols[0].metric("Cancel·lacions (%)", f"{cancel_rate}%")
 kpi_cols[1].metric("Tarifa Mitjana per Habitació (€)", f"{avg_tarifa}")
 kpi_cols[2].metric("Dies Mitjana Estada", f"{avg_stay}")
 kpi_cols[3].metric("Ingressos per Hab. Disponible (€)", f"{rev_par}")
+boot.painted()
 
 st.caption(
     "Tot i un ADR (Tarifa Mitjana Diària per Habitació) aparentment sòlid, el RevPAR real es veu reduït de manera significativa "
@@ -70,34 +168,22 @@ st.caption(
 
 st.markdown("---")
 
+# Pila de gràfics: s'importa un cop pintats el títol i els KPI
+with boot.phase("imports_grafics"):
+    import hotel_views
+    from charts import DEFAULT_MAX_POINTS, LOD_MODES
+    from hotel_daily import METRICS as DAILY_METRICS
+
 # ========================
 # SECCIÓ 2: Visió General de Cancel·lacions per Tipus d'Hotel (Side-by-Side)
 # ========================
 st.subheader("Visió General de Cancel·lacions per Tipus d'Hotel")
 
-tipus_hotels = df['Tipus_Hotel'].unique()
-cols = st.columns(len(tipus_hotels))
-
-for i, hotel in enumerate(tipus_hotels):
-    df_hotel = df[df['Tipus_Hotel'] == hotel]
-    df_counts = df_hotel['Cancel·lada'].value_counts().reset_index()
-    df_counts.columns = ['Cancel·lada','Nombre']
-
-    pie = px.pie(
-        df_counts,
-        names='Cancel·lada',
-        values='Nombre',
-        color='Cancel·lada',
-        color_discrete_sequence=["#2d733c", "#c78095"],
-        hole=0.3
-    )
-    pie.update_traces(textinfo='percent+label', textfont_size=14)
-    pie.update_layout(
-        title=f"{hotel}",
-        showlegend=True,
-        margin=dict(t=40, b=0, l=0, r=0)
-    )
-    cols[i].plotly_chart(pie, use_container_width=True)
+pies = section('cancel_pastissos', hotel_views.cancellation_pies_view)['figs']
+cols = st.columns(len(pies))
+
+for i, pie in enumerate(pies.values()):
+    cols[i].plotly_chart(pie.figure(), use_container_width=True)
 st.caption(
     "Els hotels urbans mostren una proporció de cancel·lacions superior als resorts. "
     "Això reflecteix un client més flexible i sensible a canvis d'agenda, especialment en viatges curts o professionals."
@@ -111,17 +197,8 @@ st.markdown("---")
 # SECCIÓ 3: Cancel·lacions segons Tipus de Viatge
 # ========================
 st.subheader("Cancel·lacions segons Tipus de Viatge")
-cancel_trip = df.groupby(['Tipus_Viatge','Cancel·lada']).size().reset_index(name='Nombre')
-fig_trip = px.bar(
-    cancel_trip,
-    x='Tipus_Viatge',
-    y='Nombre',
-    color='Cancel·lada',
-    color_discrete_sequence=PALETTE,
-    text='Nombre'
-)
-fig_trip.update_layout(barmode='stack', legend_title_text="Estat reserva")
-st.plotly_chart(fig_trip, use_container_width=True)
+fig_trip = section('tipus_viatge', hotel_views.trip_view)['fig']
+st.plotly_chart(fig_trip.figure(), use_container_width=True)
 st.caption(
     "Els viatges no recreatius concentren una proporció elevada de cancel·lacions. "
     "Aquest patró és coherent amb viatges corporatius o funcionals, més exposats a canvis d'última hora."
@@ -135,17 +212,8 @@ st.markdown("---")
 # SECCIÓ 4: Segments de Mercat per Tipus d'Hotel
 # ========================
 st.subheader("Segments de Mercat per Tipus d'Hotel")
-seg_summary = df.groupby(['Segment_Mercat','Tipus_Hotel']).size().reset_index(name='Nombre')
-fig_seg = px.bar(
-    seg_summary,
-    x='Segment_Mercat',
-    y='Nombre',
-    color='Tipus_Hotel',
-    color_discrete_sequence=["#2d733c", "#306fbe"],
-    text='Nombre'
-)
-fig_seg.update_layout(barmode='group', legend_title_text="Tipus d'Hotel")
-st.plotly_chart(fig_seg, use_container_width=True)
+fig_seg = section('segments', hotel_views.segment_view)['fig']
+st.plotly_chart(fig_seg.figure(), use_container_width=True)
 
 
 st.caption(
@@ -163,21 +231,8 @@ st.markdown("---")
 # SECCIÓ 5: Tendències Estacionals
 # ========================
 st.subheader("Tendències Estacionals")
-month_order = ["January","February","March","April","May","June","July","August","September","October","November","December"]
-month_summary = df.groupby(['Mes','Tipus_Hotel'])['Tarifa'].mean().reset_index()
-month_summary['Mes'] = pd.Categorical(month_summary['Mes'], categories=month_order, ordered=True)
-month_summary = month_summary.sort_values('Mes')
-
-fig_area = px.area(
-    month_summary,
-    x='Mes',
-    y='Tarifa',
-    color='Tipus_Hotel',
-    line_group='Tipus_Hotel',
-    color_discrete_sequence=["#2d733c", "#306fbe"],
-    labels={'Mes':'Mes','Tarifa':'Tarifa Mitjana (€)','Tipus_Hotel':'Tipus d\'Hotel'}
-)
-st.plotly_chart(fig_area, use_container_width=True)
+fig_area = section('estacionalitat', hotel_views.season_view)['fig']
+st.plotly_chart(fig_area.figure(), use_container_width=True)
 
 st.caption(
     "Els resorts presenten una estacionalitat molt marcada, amb pics de tarifa a l'estiu. "
@@ -188,21 +243,41 @@ st.markdown(
 )
 st.markdown("---")
 
+# ========================
+# SECCIÓ 5b: Tendència Diària per Data d'Arribada
+# ========================
+st.subheader("Tendència Diària per Data d'Arribada")
+daily_metric = st.selectbox("Indicador", list(DAILY_METRICS), key='daily_metric')
+fig_daily = section(
+    'diari',
+    lambda data, metric: hotel_views.daily_view(filtered_daily(), metric),
+    daily_metric,
+)['fig']
+st.plotly_chart(fig_daily.figure(), use_container_width=True, key='daily')
+st.caption(
+    "Mitjanes mòbils de 7 i 30 dies per data d'arribada, any a any. "
+    "La finestra de 7 dies mostra els pics puntuals (festius, esdeveniments) i la de 30 dies la tendència de fons."
+)
+st.markdown("---")
+
 # ========================
 # SECCIÓ 6: Temps d'Antelació de Reserva vs ADR
 # ========================
 st.subheader("Temps d'Antelació de Reserva vs Tarifa Mitjana per Habitació")
-fig_scatter_tarifa = px.scatter(
-    df,
-    x='Dies_Abans',
-    y='Tarifa',
-    size='Tarifa',
-    size_max=30,
-    color='Tipus_Hotel',
-    hover_data=['Segment_Mercat','Cancel·lada'],
-    labels={'Dies_Abans':'Dies abans de l\'arribada','Tarifa':'Tarifa (€)'}
+# Nivell de detall: amb moltes reserves s'envia una mostra o una densitat agregada
+lod_cols = st.columns(2)
+lod_mode = lod_cols[0].selectbox("Mode de visualització", LOD_MODES, key='lod_mode')
+lod_points = lod_cols[1].number_input(
+    "Màxim de punts (mostra)", min_value=1_000, max_value=200_000,
+    value=DEFAULT_MAX_POINTS, step=1_000, key='lod_points'
+)
+lead_adr = section(
+    'antelacio_tarifa',
+    lambda data, mode, max_points: hotel_views.lead_adr_view(filtered_rows(), mode, max_points),
+    lod_mode, lod_points,
 )
-st.plotly_chart(fig_scatter_tarifa, use_container_width=True, key='scatter_tarifa')
+st.plotly_chart(lead_adr['fig'].figure(), use_container_width=True, key='scatter_tarifa')
+st.caption(f"Mode: {lead_adr['mode']} ({filtered_cube().bookings:,} reserves)")
 
 st.caption(
     "No s'observa una relació lineal clara entre antelació i tarifa. "
@@ -222,49 +297,8 @@ st.markdown("---")
 # ========================
 st.subheader("Cancel·lacions segons Antelació de Reserva i Pèrdua Econòmica")
 
-df_cancelled = df[df['Cancel·lada'] == 'Cancel·lada'].copy()
-
-df_cancelled['Dies_Abans_Cat'] = pd.cut(
-    df_cancelled['Dies_Abans'],
-    bins=[0, 7, 14, 30, 60, 90, 180, 365],
-    labels=["0–7", "8–14", "15–30", "31–60", "61–90", "91–180", "181–365"]
-)
-
-cancel_agg = (
-    df_cancelled
-    .groupby(['Dies_Abans_Cat', 'Tipus_Hotel'])
-    .agg(
-        Nombre=('Cancel·lada', 'count'),
-        Perdua=('Tarifa', 'sum')
-    )
-    .reset_index()
-)
-
-fig_cancel_scatter = px.scatter(
-    cancel_agg,
-    x='Dies_Abans_Cat',
-    y='Nombre',
-    size='Nombre',
-    color='Perdua',
-    facet_col='Tipus_Hotel',
-    size_max=55,
-    color_continuous_scale='Greens',
-    labels={
-        'Dies_Abans_Cat': "Dies abans de l'arribada",
-        'Nombre': "Nombre de cancel·lacions",
-        'Perdua': "Pèrdua econòmica (€)",
-        'Tipus_Hotel': "Tipus d'hotel"
-    }
-)
-
-fig_cancel_scatter.update_layout(
-    coloraxis_colorbar=dict(title="Pèrdua (€)"),
-    yaxis_title="Nombre de cancel·lacions",
-    xaxis_title="Antelació de la reserva",
-    margin=dict(t=40)
-)
-
-st.plotly_chart(fig_cancel_scatter, use_container_width=True, key="cancel_scatter_loss")
+fig_cancel_scatter = section('perdua_cancel', hotel_views.cancel_loss_view)['fig']
+st.plotly_chart(fig_cancel_scatter.figure(), use_container_width=True, key="cancel_scatter_loss")
 
 st.caption(
     "El color indica la pèrdua econòmica acumulada per cancel·lacions, "
@@ -289,16 +323,8 @@ st.markdown("---")
 # SECCIÓ 7: Distribució d'Adults i Nens (Treemap)
 # ========================
 st.subheader("Distribució d'Adults i Nens")
-family_summary = df.groupby(['Adults','Nens']).size().reset_index(name='Nombre')
-family_summary['Tipus_Familia'] = family_summary['Adults'].astype(str)+' adults & '+family_summary['Nens'].astype(str)+' nens'
-fig_family = px.treemap(
-    family_summary,
-    path=['Tipus_Familia'],
-    values='Nombre',
-    color='Nombre',
-    color_continuous_scale='Teal'
-)
-st.plotly_chart(fig_family, use_container_width=True)
+fig_family = section('families', hotel_views.family_view)['fig']
+st.plotly_chart(fig_family.figure(), use_container_width=True)
 st.caption(
     "La majoria de reserves corresponen a parelles i famílies petites, perfils associats a estades més llargues."
 )
@@ -311,20 +337,8 @@ st.markdown("---")
 # SECCIÓ 8: Tarifa Mitjana per Habitació segons Canal
 # ========================
 st.subheader("Tarifa Mitjana per Habitació segons Canal de Distribució")
-dist_summary = df.groupby('Canal')['Tarifa'].mean().reset_index()
-dist_summary['Tarifa'] = dist_summary['Tarifa'].round(2)
-
-fig_dist = px.bar(
-    dist_summary,
-    x='Canal',
-    y='Tarifa',
-    text=dist_summary['Tarifa'].apply(lambda x: f"{x}€"),
-    color='Canal',
-    color_discrete_sequence=PALETTE
-)
-fig_dist.update_traces(showlegend=False)
-fig_dist.update_layout(yaxis_title="Tarifa Mitjana (€)", xaxis_title="Canal")
-st.plotly_chart(fig_dist, use_container_width=True)
+fig_dist = section('canals', hotel_views.channel_view)['fig']
+st.plotly_chart(fig_dist.figure(), use_container_width=True)
 st.caption(
     "Els canals directes i corporatius mostren una tarifa mitjana inferior i més estable."
 )
@@ -336,18 +350,8 @@ st.markdown("---")
 # SECCIÓ 10: Durada Mitja Estada per Tipus d'Hotel i Segment
 # ========================
 st.subheader("Durada Mitja d'Estada")
-df['Durada_Estada'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
-stay_summary = df.groupby(['Tipus_Hotel','Segment_Mercat'])['Durada_Estada'].mean().reset_index()
-fig_stay = px.bar(
-    stay_summary,
-    x='Segment_Mercat',
-    y='Durada_Estada',
-    color='Tipus_Hotel',
-    color_discrete_sequence=["#2d733c", "#306fbe"],
-    text=stay_summary['Durada_Estada'].round(1)
-)
-fig_stay.update_layout(barmode='group', yaxis_title="Dies mitjans d'estada")
-st.plotly_chart(fig_stay, use_container_width=True, key='stay')
+fig_stay = section('estada', hotel_views.stay_view)['fig']
+st.plotly_chart(fig_stay.figure(), use_container_width=True, key='stay')
 
 st.caption(
     "Els resorts presenten estades més llargues, mentre que els hotels urbans concentren estades curtes."
@@ -355,3 +359,6 @@ st.caption(
 st.markdown(
     "> Estades llargues + ADR alt + cancel·lació = màxim impacte negatiu sobre ingressos."
 )
+
+profiler.finish()
+boot.finish()
@@ -0,0 +1,313 @@
+"""Banc de proves sense interfície per als pipelines de dades dels dos dashboards.
+
+Executa la càrrega, els filtres, l'agregació de cada secció i la construcció
+de les figures d'app.py i app2.py sense Streamlit, amb les dades reals i
+amb datasets sintètics escalats (1x, 10x, 100x files). Per a cada etapa
+informa del temps de rellotge, el pic de memòria i la mida del JSON de les
+figures.
+
+Ús::
+
+    python benchmark.py                          # escales 1 10 100
+    python benchmark.py --scales 1 10 --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --tolerance 0.25
+
+Amb ``--baseline`` el procés acaba amb codi 1 si alguna etapa és més lenta,
+usa més memòria o genera figures més grans que la línia base més la
+tolerància.
+"""
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import crime_views
+import hotel_views
+from instrumentation import figure_bytes
+from crime_cube import CrimeCube
+from crime_store import (
+    SOURCE as CRIME_SOURCE, read_bundle, read_source_csv, stream_aggregates, write_bundle,
+)
+from geo_lod import AUTO, load_level
+from hotel_cube import MONTH_ORDER, BookingCube
+from hotel_daily import METRICS as DAILY_METRICS, DailySeries
+from hotel_data import SOURCE as HOTEL_SOURCE, load_bookings, prepare_bookings, read_bookings
+
+HOTEL_ROWS = 119_390
+# Marge absolut per sota del qual una diferència no es considera regressió
+MIN_SECONDS = 0.01
+MIN_BYTES = 64 * 1024
+
+
+# ---------- Mesura ----------
+def measure(fn, track_memory=True):
+    """Executa ``fn`` i retorna ``(resultat, segons, pic en bytes)``."""
+    gc.collect()
+    if track_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    peak = 0
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+# ---------- Datasets sintètics ----------
+def scale_crime(df, factor):
+    """Replica les files ``factor`` vegades amb tipus de delicte nous a cada còpia.
+
+    Així creix el nombre de claus del cub i no només el de files repetides.
+    """
+    if factor == 1:
+        return df
+    offences = df["Tipus_de_Delicte"].astype("category")
+    codes = offences.cat.codes.to_numpy()
+    categories = offences.cat.categories
+    data = {}
+    for name, col in df.items():
+        if name == "Tipus_de_Delicte":
+            ncat = len(categories)
+            tiled = np.concatenate([codes + i * ncat for i in range(factor)])
+            names = [f"{c} [{i}]" if i else c for i in range(factor) for c in categories]
+            data[name] = pd.Categorical.from_codes(tiled, categories=names)
+        elif isinstance(col.dtype, pd.CategoricalDtype):
+            data[name] = pd.Categorical.from_codes(
+                np.tile(col.cat.codes.to_numpy(), factor), categories=col.cat.categories
+            )
+        else:
+            data[name] = np.tile(col.to_numpy(), factor)
+    return pd.DataFrame(data)
+
+
+def synthetic_bookings(rows, seed=0):
+    """Reserves sintètiques amb les columnes crues que llegeix ``hotel_data``."""
+    rng = np.random.default_rng(seed)
+    months = MONTH_ORDER
+    return pd.DataFrame({
+        'hotel': pd.Categorical(rng.choice(['Resort Hotel', 'City Hotel'], rows, p=[.34, .66])),
+        'is_canceled': rng.choice([0, 1], rows, p=[.63, .37]).astype('int8'),
+        'lead_time': rng.integers(0, 500, rows).astype('int16'),
+        'adr': np.round(rng.gamma(4, 25, rows), 2),
+        'adults': rng.choice([1, 2, 3, 4], rows, p=[.2, .72, .06, .02]).astype('int16'),
+        'children': rng.choice([0, 1, 2, 3], rows, p=[.92, .04, .03, .01]).astype('float32'),
+        'distribution_channel': pd.Categorical(rng.choice(['TA/TO', 'Direct', 'Corporate', 'GDS'], rows, p=[.82, .12, .055, .005])),
+        'market_segment': pd.Categorical(rng.choice(['Online TA', 'Offline TA/TO', 'Groups', 'Direct', 'Corporate', 'Complementary', 'Aviation'], rows, p=[.47, .2, .17, .1, .044, .01, .006])),
+        'trip_type': pd.Categorical(rng.choice(['Leisure', 'Business', 'Family', 'Other'], rows)),
+        'arrival_date_year': rng.choice([2015, 2016, 2017], rows).astype('int16'),
+        'arrival_date_month': pd.Categorical(rng.choice(months, rows)),
+        'arrival_date_day_of_month': rng.integers(1, 29, rows).astype('int8'),
+        'stays_in_week_nights': rng.integers(0, 8, rows).astype('int16'),
+        'stays_in_weekend_nights': rng.integers(0, 4, rows).astype('int16'),
+    })
+
+
+def raw_bookings(factor):
+    """Reserves crues: reals (remostrejades per a ``factor`` > 1) o sintètiques."""
+    if Path(HOTEL_SOURCE).exists():
+        raw = read_bookings(HOTEL_SOURCE)
+        if factor == 1:
+            return raw
+        rng = np.random.default_rng(0)
+        return raw.iloc[rng.integers(0, len(raw), len(raw) * factor)].reset_index(drop=True)
+    return synthetic_bookings(HOTEL_ROWS * factor)
+
+
+# ---------- Pipelines ----------
+def crime_stages(bundle_dir):
+    """Etapes d'app2 en ordre, com a parells ``(nom, funció)``.
+
+    Cada etapa parteix del resultat de les anteriors, igual que en un rerun.
+    """
+    state = {}
+
+    def load():
+        state["df"] = read_bundle(bundle_dir)
+        return state["df"]
+
+    def cube():
+        state["cube"] = CrimeCube.from_frame(state["df"])
+        return state["cube"]
+
+    def filter_default():
+        c = state["cube"]
+        state["filtered"] = c.filter(c.year_range(), None, c.offences)
+        return state["filtered"]
+
+    def filter_canton():
+        c = state["cube"]
+        return c.filter(c.year_range(), "Zurich", c.offences[: len(c.offences) // 2])
+
+    stages = [("carrega", load), ("cub", cube), ("filtre_defecte", filter_default),
+              ("filtre_canto", filter_canton)]
+    views = [
+        ("kpis", lambda c: crime_views.kpis_view(c)),
+        ("mapa", lambda c: crime_views.map_view(
+            c, c.year_range()[1], "Taxa_Criminalitat_per_1000", AUTO, load_level,
+            state["cube"].cantons())),
+        ("evolucio", lambda c: crime_views.evolution_view(c, "Taxa_Criminalitat_per_1000")),
+        ("socioeconomic", crime_views.socioeconomic_view),
+        ("resolucio", crime_views.resolution_view),
+        ("tendencia_categoria", crime_views.category_trend_view),
+        ("tendencia_resolucio", crime_views.resolution_trend_view),
+        ("cantons", crime_views.canton_category_view),
+        ("correlacio", crime_views.correlation_view),
+        ("bombolles", crime_views.bubble_view),
+    ]
+    for name, view in views:
+        stages.append((name, lambda view=view: view(state["filtered"])))
+    return stages
+
+
+def hotel_stages(raw):
+    """Etapes d'app.py en ordre, a partir de les reserves crues."""
+    state = {}
+
+    def load():
+        state["df"] = prepare_bookings(raw)
+        return state["df"]
+
+    def cube():
+        state["cube"] = BookingCube.from_bookings(state["df"])
+        return state["cube"]
+
+    stages = [("carrega", load), ("cub", cube)]
+    views = [
+        ("kpis", hotel_views.kpis_view),
+        ("cancel_pastissos", hotel_views.cancellation_pies_view),
+        ("tipus_viatge", hotel_views.trip_view),
+        ("segments", hotel_views.segment_view),
+        ("estacionalitat", hotel_views.season_view),
+        ("perdua_cancel", hotel_views.cancel_loss_view),
+        ("families", hotel_views.family_view),
+        ("canals", hotel_views.channel_view),
+        ("estada", hotel_views.stay_view),
+    ]
+    for name, view in views:
+        stages.append((name, lambda view=view: view(state["cube"])))
+    # La dispersió és reserva a reserva
+    stages.insert(7, ("antelacio_tarifa", lambda: hotel_views.lead_adr_view(state["df"])))
+
+    # Sèrie diària per data d'arribada i les finestres mòbils de cada indicador
+    def daily():
+        state["daily"] = DailySeries.from_bookings(state["df"])
+        return state["daily"]
+
+    stages.insert(7, ("diari_serie", daily))
+    stages.insert(8, ("diari", lambda: hotel_views.daily_view(state["daily"], next(iter(DAILY_METRICS)))))
+    return stages
+
+
+def run_stages(stages, track_memory=True):
+    results = {}
+    for name, fn in stages:
+        value, seconds, peak = measure(fn, track_memory)
+        results[name] = {
+            "seconds": round(seconds, 5),
+            "peak_mb": round(peak / 1e6, 2),
+            "figure_bytes": figure_bytes(value),
+        }
+    return results
+
+
+def run(scales, track_memory=True):
+    """Resultats ``{"crim@10x": {etapa: mesures}, ...}`` per a totes les escales."""
+    report = {}
+    base_crime = read_source_csv(CRIME_SOURCE)
+    if 1 in scales:
+        _, seconds, peak = measure(lambda: read_source_csv(CRIME_SOURCE), track_memory)
+        report["crim@csv"] = {"carrega_csv": {"seconds": round(seconds, 5),
+                                              "peak_mb": round(peak / 1e6, 2),
+                                              "figure_bytes": 0}}
+        _, seconds, peak = measure(lambda: stream_aggregates(CRIME_SOURCE), track_memory)
+        report["crim@csv"]["cub_streaming"] = {"seconds": round(seconds, 5),
+                                               "peak_mb": round(peak / 1e6, 2),
+                                               "figure_bytes": 0}
+        if Path(HOTEL_SOURCE).exists():
+            _, seconds, peak = measure(lambda: load_bookings(HOTEL_SOURCE), track_memory)
+            report["hotel@csv"] = {"carrega_csv": {"seconds": round(seconds, 5),
+                                                   "peak_mb": round(peak / 1e6, 2),
+                                                   "figure_bytes": 0}}
+    for factor in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            df = scale_crime(base_crime, factor)
+            bundle = write_bundle(df, Path(tmp) / "bundle", "benchmark")
+            del df
+            report[f"crim@{factor}x"] = run_stages(crime_stages(bundle), track_memory)
+        report[f"hotel@{factor}x"] = run_stages(hotel_stages(raw_bookings(factor)), track_memory)
+        gc.collect()
+    return report
+
+
+# ---------- Informe i comparació ----------
+def print_report(report, out=sys.stdout):
+    for dataset, stages in report.items():
+        print(f"\n{dataset}", file=out)
+        print(f"  {'etapa':<22}{'temps (s)':>12}{'pic (MB)':>12}{'figures (KB)':>15}", file=out)
+        for name, m in stages.items():
+            print(f"  {name:<22}{m['seconds']:>12.4f}{m['peak_mb']:>12.2f}"
+                  f"{m['figure_bytes'] / 1024:>15.1f}", file=out)
+
+
+def regressions(report, baseline, tolerance):
+    """Llista d'etapes que empitjoren respecte a ``baseline`` més la tolerància."""
+    found = []
+    for dataset, stages in report.items():
+        for name, m in stages.items():
+            ref = baseline.get(dataset, {}).get(name)
+            if ref is None:
+                continue
+            checks = [
+                ("seconds", MIN_SECONDS),
+                ("peak_mb", MIN_BYTES / 1e6),
+                ("figure_bytes", MIN_BYTES),
+            ]
+            for key, slack in checks:
+                limit = ref[key] * (1 + tolerance) + slack
+                if m[key] > limit:
+                    found.append(f"{dataset}/{name}: {key} {m[key]} > {ref[key]} (+{tolerance:.0%})")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--baseline", help="fitxer JSON amb la línia base a comparar")
+    parser.add_argument("--save-baseline", help="desa els resultats com a nova línia base")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="no mesura el pic de memòria (tracemalloc alenteix les etapes)")
+    args = parser.parse_args(argv)
+
+    report = run(sorted(set(args.scales)), track_memory=not args.no_memory)
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nLínia base desada a {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        found = regressions(report, baseline, args.tolerance)
+        if found:
+            print("\nRegressions:")
+            for line in found:
+                print(f"  {line}")
+            return 1
+        print("\nCap regressió respecte a la línia base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
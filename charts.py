@@ -0,0 +1,244 @@
+"""Constructors de gràfics compartits pels dos dashboards."""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# ---------- Nivell de detall per a dispersions grans ----------
+LOD_AUTO = "Automàtic"
+LOD_FULL = "Complet"
+LOD_WEBGL = "WebGL"
+LOD_SAMPLE = "Mostra"
+LOD_DENSITY = "Densitat"
+LOD_MODES = [LOD_AUTO, LOD_FULL, LOD_WEBGL, LOD_SAMPLE, LOD_DENSITY]
+
+# Límits de files per al mode automàtic
+FULL_MAX_ROWS = 5_000
+WEBGL_MAX_ROWS = 50_000
+SAMPLE_MAX_ROWS = 500_000
+DEFAULT_MAX_POINTS = 20_000
+DENSITY_BINS = 60
+
+
+def choose_lod_mode(n_rows):
+    """Mode de representació segons el nombre de files."""
+    if n_rows <= FULL_MAX_ROWS:
+        return LOD_FULL
+    if n_rows <= WEBGL_MAX_ROWS:
+        return LOD_WEBGL
+    if n_rows <= SAMPLE_MAX_ROWS:
+        return LOD_SAMPLE
+    return LOD_DENSITY
+
+
+def stratified_sample(df, by, max_points, seed=0):
+    """Mostra de com a molt ``max_points`` files, proporcional a cada grup ``by``."""
+    if len(df) <= max_points:
+        return df
+    frac = max_points / len(df)
+    return df.groupby(by, observed=True, group_keys=False).sample(frac=frac, random_state=seed)
+
+
+def density_grid(df, x, y, by, bins=DENSITY_BINS):
+    """Histograma 2D de ``x`` × ``y`` per a cada grup de ``by``, calculat al servidor.
+
+    Retorna ``(z, x_centres, y_centres, grups)`` amb ``z`` de forma
+    ``(grups, bins, bins)``; tots els grups comparteixen les vores.
+    """
+    x_edges = np.histogram_bin_edges(df[x].dropna(), bins=bins)
+    y_edges = np.histogram_bin_edges(df[y].dropna(), bins=bins)
+    groups = [g for g in pd.unique(df[by]) if pd.notna(g)]
+    z = np.zeros((len(groups), bins, bins))
+    for i, group in enumerate(groups):
+        part = df[df[by] == group]
+        counts, _, _ = np.histogram2d(part[x], part[y], bins=[x_edges, y_edges])
+        z[i] = counts.T
+    x_centres = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centres = (y_edges[:-1] + y_edges[1:]) / 2
+    return z, x_centres, y_centres, groups
+
+
+def lod_scatter(df, x, y, color, mode=LOD_AUTO, max_points=DEFAULT_MAX_POINTS,
+                labels=None, **scatter_kwargs):
+    """Dispersió amb nivell de detall adaptat a la mida de ``df``.
+
+    * ``Complet``: ``px.scatter`` amb tots els punts i el render per defecte.
+    * ``WebGL``: tots els punts, pintats amb WebGL.
+    * ``Mostra``: mostra estratificada per ``color`` de com a molt
+      ``max_points`` punts, amb WebGL.
+    * ``Densitat``: histograma 2D per ``color`` agregat al servidor; la mida
+      de la figura ja no depèn del nombre de files.
+
+    Retorna ``(fig, mode)`` amb el mode efectivament usat.
+    """
+    labels = labels or {}
+    if mode == LOD_AUTO:
+        mode = choose_lod_mode(len(df))
+    if mode == LOD_DENSITY:
+        z, x_centres, y_centres, groups = density_grid(df, x, y, color)
+        fig = px.imshow(
+            z,
+            x=x_centres,
+            y=y_centres,
+            facet_col=0,
+            origin='lower',
+            aspect='auto',
+            color_continuous_scale='Blues',
+            labels={'x': labels.get(x, x), 'y': labels.get(y, y), 'color': 'Reserves'},
+        )
+        for i, group in enumerate(groups):
+            fig.layout.annotations[i].text = str(group)
+        return fig, mode
+    if mode == LOD_SAMPLE:
+        df = stratified_sample(df, color, max_points)
+    fig = px.scatter(
+        df,
+        x=x,
+        y=y,
+        color=color,
+        labels=labels,
+        render_mode='auto' if mode == LOD_FULL else 'webgl',
+        **scatter_kwargs,
+    )
+    return fig, mode
+
+
+# ---------- Animacions compactes ----------
+def _as_tuple(key):
+    return key if isinstance(key, tuple) else (key,)
+
+
+def typed_array(values, lossy=False):
+    """Array numèric amb el tipus més petit que conserva els valors.
+
+    Els valors enters (encara que vinguin com a float) passen a l'enter més
+    petit que els conté; amb ``lossy=True`` els decimals passen a float32
+    (per a mides de marcador, on la precisió no es veu).
+    """
+    values = np.asarray(values)
+    if values.size == 0 or values.dtype.kind not in "iuf":
+        return values
+    if values.dtype.kind == "f":
+        if not np.isfinite(values).all() or not np.array_equal(values, np.round(values)):
+            return values.astype(np.float32) if lossy else values
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _animation_controls(fig, names, prefix):
+    """Botons i slider d'animació amb la mateixa disposició que px."""
+    def frame_args(duration):
+        return {
+            "frame": {"duration": duration, "redraw": False},
+            "mode": "immediate",
+            "fromcurrent": True,
+            "transition": {"duration": duration, "easing": "linear"},
+        }
+
+    fig.layout.updatemenus = [{
+        "buttons": [
+            {"args": [None, frame_args(500)], "label": "&#9654;", "method": "animate"},
+            {"args": [[None], frame_args(0)], "label": "&#9724;", "method": "animate"},
+        ],
+        "direction": "left", "pad": {"r": 10, "t": 70}, "showactive": False,
+        "type": "buttons", "x": 0.1, "xanchor": "right", "y": 0, "yanchor": "top",
+    }]
+    fig.layout.sliders = [{
+        "active": 0, "yanchor": "top", "xanchor": "left",
+        "currentvalue": {"prefix": prefix},
+        "pad": {"b": 10, "t": 60}, "len": 0.9, "x": 0.1, "y": 0,
+        "steps": [
+            {"args": [[name], frame_args(0)], "label": name, "method": "animate"}
+            for name in names
+        ],
+    }]
+
+
+def animated_scatter(df, x, y, animation_frame, size=None, color=None, hover_name=None,
+                     facet_col=None, size_max=20, labels=None, **scatter_kwargs):
+    """``px.scatter`` animat amb frames que només porten el que canvia.
+
+    La disposició, els traços i els controls d'animació surten de
+    ``px.scatter`` sobre el primer frame; la resta de frames només porten
+    ``x``, ``y``, la mida i el color (si és continu) de cada traç, amb arrays
+    tipats, i el text dels punts quan no coincideix amb el del traç base.
+    Si els traços de px no es poden fer correspondre amb els grups, es
+    retorna la figura completa de px.
+    """
+    labels = labels or {}
+    full_kwargs = dict(x=x, y=y, size=size, color=color, hover_name=hover_name,
+                       facet_col=facet_col, size_max=size_max, labels=labels,
+                       animation_frame=animation_frame, **scatter_kwargs)
+    frame_values = list(pd.unique(df[animation_frame]))
+    continuous = color is not None and pd.api.types.is_numeric_dtype(df[color])
+    group_cols = list(dict.fromkeys(
+        c for c in ([] if continuous else [color]) + [facet_col] if c is not None
+    ))
+
+    first = df[df[animation_frame] == frame_values[0]]
+    fig = px.scatter(first, **full_kwargs)
+    if len(frame_values) == 1:
+        return fig
+
+    # Files de cada (frame, grup); cada traç de px és un grup del primer frame
+    rows = {
+        _as_tuple(key): idx for key, idx in
+        df.groupby([animation_frame] + group_cols, sort=False, observed=True).indices.items()
+    }
+    groups = [()] if not group_cols else [
+        _as_tuple(key) for key in first.groupby(group_cols, sort=False, observed=True).groups
+    ]
+    # Un grup absent del primer frame no tindria traç: cal la figura completa
+    if len(groups) != len(fig.data) or len({key[1:] for key in rows}) != len(groups):
+        return px.scatter(df, **full_kwargs)
+    for trace, group in zip(fig.data, groups):
+        idx = rows[(frame_values[0],) + group]
+        if not np.array_equal(np.asarray(trace.x), df[x].to_numpy()[idx]):
+            return px.scatter(df, **full_kwargs)
+
+    frame_label = labels.get(animation_frame, animation_frame)
+    base_text = [None if t.hovertext is None else list(t.hovertext) for t in fig.data]
+    base_template = [t.hovertemplate for t in fig.data]
+
+    def trace_update(i, value, idx):
+        part = df.iloc[idx]
+        marker = {}
+        if size is not None:
+            marker["size"] = typed_array(part[size].to_numpy(), lossy=True)
+        if continuous:
+            marker["color"] = typed_array(part[color].to_numpy())
+        update = {"type": "scatter", "x": typed_array(part[x].to_numpy()),
+                  "y": typed_array(part[y].to_numpy()), "marker": marker}
+        if hover_name is not None:
+            text = part[hover_name].astype(str).tolist()
+            if text != base_text[i]:
+                update["hovertext"] = text
+        if base_template[i]:
+            update["hovertemplate"] = base_template[i].replace(
+                f"{frame_label}={frame_values[0]}", f"{frame_label}={value}")
+        return update
+
+    frames = []
+    for value in frame_values:
+        data = []
+        for i, group in enumerate(groups):
+            idx = rows.get((value,) + group, np.array([], dtype=int))
+            data.append(trace_update(i, value, idx))
+        frames.append(go.Frame(name=str(value), data=data))
+    for trace, update in zip(fig.data, frames[0].data):
+        trace.x, trace.y = update.x, update.y
+        if size is not None:
+            trace.marker.size = update.marker.size
+        if continuous:
+            trace.marker.color = update.marker.color
+    if size is not None:
+        # La mida relativa es calcula sobre totes les dades, com fa px
+        fig.update_traces(marker_sizeref=df[size].max() / size_max ** 2)
+    fig.frames = frames
+
+    _animation_controls(fig, [str(v) for v in frame_values], f"{frame_label}=")
+    return fig
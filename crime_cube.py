@@ -0,0 +1,491 @@
+"""Cub pre-agregat del dataset de criminalitat.
+
+El cub es construeix una sola vegada en carregar les dades i substitueix les
+agregacions que cada secció d'app2 feia sobre totes les files filtrades.
+Té dues taules:
+
+* ``facts``: una fila per (Canto_norm, Any, Tipus_de_Delicte,
+  Nivell_de_Resolucio) amb la suma de ``Nombre_de_Delictes`` i les sumes i
+  recomptes necessaris per reproduir les mitjanes originals. Inclou també la
+  dimensió derivada ``Categorie`` (vegeu ``offence_categories``).
+* ``attributes``: una fila per (Canto_norm, Any) amb els atributs
+  socioeconòmics, que són constants dins de cada cantó-any.
+
+Els filtres del sidebar i totes les seccions es responen tallant ``facts``,
+de manera que el cost depèn del nombre de claus diferents i no del nombre de
+files del CSV. ``facts`` està ordenada per any i ``CubeIndex`` hi manté un
+índex invertit per cantó i per tipus de delicte, de manera que filtrar costa
+en proporció a la mida de la selecció.
+
+Per a la correlació i el scatter socioeconòmics, el cub guarda també un
+``crime_stats.StatsStore`` amb els moments per (delicte, cantó, any); els
+cubs filtrats recorden la selecció i responen aquestes seccions combinant
+moments en lloc d'agrupar files.
+
+Per als gràfics amb un desglossament per tipus de delicte o per cantó,
+``top`` i ``limit`` deixen els ``n`` valors amb més delictes i sumen la resta
+en un sol grup; els totals per valor es calculen un cop per cub i els ``n``
+primers s'escullen per selecció parcial.
+
+Els filtres sense índex i les agregacions es fan amb el backend de ``query``
+(pandas per defecte; vegeu ``VIZ_QUERY_BACKEND``).
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from crime_stats import StatsStore
+from offence_categories import categorize_column, load_rules
+from query import get_backend
+
+KEYS = ["Canto_norm", "Any", "Tipus_de_Delicte", "Nivell_de_Resolucio"]
+ATTRIBUTES = ["PIB_per_Capita", "Percentatge_Estrangers", "Poblacio_Total"]
+TOTAL_CASOS = "Total de casos"
+NACIONAL = "Switzerland"
+# Grups on ``CrimeCube.limit`` suma els valors fora del top N
+RESTA_DELICTES = "Resta de delictes"
+RESTA_CANTONS = "Resta de cantons"
+
+# Mesures guardades per clau: nom al cub -> (columna origen, funció)
+MEASURES = {
+    "Nombre_de_Delictes": ("Nombre_de_Delictes", "sum"),
+    "Taxa_suma": ("Taxa_Criminalitat_per_1000", "sum"),
+    "Taxa_n": ("Taxa_Criminalitat_per_1000", "count"),
+    "Resolts_suma": ("Percentatge_Casos_Resolts", "sum"),
+    "Resolts_n": ("Percentatge_Casos_Resolts", "count"),
+    "Files": ("Any", "size"),
+}
+
+
+def aggregate_facts(df):
+    """Agrega files crues al gra del cub (vegeu ``MEASURES``), ordenat per any."""
+    facts = (
+        df.groupby(KEYS, observed=True, sort=True)
+        .agg(**MEASURES)
+        .reset_index()
+    )
+    return facts.sort_values("Any", kind="stable", ignore_index=True)
+
+
+def aggregate_attributes(df):
+    """Atributs socioeconòmics per (Canto_norm, Any)."""
+    return (
+        df.groupby(["Canto_norm", "Any"], observed=True, sort=True)[ATTRIBUTES]
+        .first()
+        .reset_index()
+    )
+
+
+class FactsAccumulator:
+    """Agregats del cub calculats bloc a bloc, sense tenir totes les files.
+
+    Cada bloc de files crues s'agrega al gra del cub i es combina amb el que
+    ja s'ha acumulat. Totes les mesures són sumes o recomptes i els atributs
+    es queden amb el primer valor no nul, de manera que el resultat és el
+    mateix que ``aggregate_facts`` i ``aggregate_attributes`` sobre tot el
+    fitxer. Les columnes de text es codifiquen amb diccionaris globals, i la
+    memòria depèn de la mida del bloc i del nombre de claus, no de files.
+    """
+
+    TEXT_KEYS = ["Canto_norm", "Tipus_de_Delicte", "Nivell_de_Resolucio"]
+
+    def __init__(self, compact_rows=1_000_000):
+        self.compact_rows = compact_rows
+        # valor -> codi, en ordre d'aparició
+        self._dictionaries = {col: {} for col in self.TEXT_KEYS}
+        self._facts = []
+        self._attributes = []
+        self._pending_rows = 0
+
+    def _encode(self, col, values):
+        codes, uniques = pd.factorize(values)
+        dictionary = self._dictionaries[col]
+        lookup = np.array([dictionary.setdefault(v, len(dictionary)) for v in uniques],
+                          dtype=np.int32)
+        if not len(lookup):
+            return codes
+        encoded = lookup[codes]
+        encoded[codes < 0] = -1
+        return encoded
+
+    def add(self, chunk):
+        """Agrega un bloc de files crues (amb les columnes de ``KEYS``, mesures i atributs)."""
+        sources = list(dict.fromkeys(src for src, _ in MEASURES.values()))
+        coded = pd.DataFrame({col: chunk[col].to_numpy() for col in sources + ATTRIBUTES})
+        for col in self.TEXT_KEYS:
+            coded[col] = self._encode(col, chunk[col])
+        # Com el groupby original, les files amb alguna clau nul·la no compten
+        coded = coded[(coded[self.TEXT_KEYS] >= 0).all(axis=1)]
+        self._facts.append(coded.groupby(KEYS, sort=False).agg(**MEASURES))
+        self._attributes.append(
+            coded.groupby(["Canto_norm", "Any"], sort=False)[ATTRIBUTES].first()
+        )
+        self._pending_rows += len(self._facts[-1])
+        if self._pending_rows > self.compact_rows:
+            self._compact()
+
+    def _compact(self):
+        if len(self._facts) > 1:
+            self._facts = [pd.concat(self._facts).groupby(level=KEYS, sort=False).sum()]
+            self._attributes = [
+                pd.concat(self._attributes).groupby(level=["Canto_norm", "Any"], sort=False).first()
+            ]
+        self._pending_rows = len(self._facts[0]) if self._facts else 0
+
+    def _decode(self, frame):
+        """Converteix els codis a categòriques amb les categories en ordre alfabètic."""
+        for col in self.TEXT_KEYS:
+            if col not in frame:
+                continue
+            values = list(self._dictionaries[col])
+            order = sorted(range(len(values)), key=values.__getitem__)
+            remap = np.empty(len(values), dtype=np.int32)
+            remap[order] = np.arange(len(values), dtype=np.int32)
+            frame[col] = pd.Categorical.from_codes(
+                remap[frame[col].to_numpy()], categories=[values[i] for i in order]
+            )
+        return frame
+
+    def result(self):
+        """``(facts, attributes, offences)`` amb el format de ``CrimeCube.from_frame``."""
+        self._compact()
+        if not self._facts:
+            raise ValueError("no s'ha afegit cap bloc de files")
+        facts = self._decode(self._facts[0].reset_index())
+        facts = facts.sort_values(KEYS, ignore_index=True)
+        facts = facts.sort_values("Any", kind="stable", ignore_index=True)
+        attributes = self._decode(self._attributes[0].reset_index())
+        attributes = attributes.sort_values(["Canto_norm", "Any"], ignore_index=True)
+        return facts, attributes, list(self._dictionaries["Tipus_de_Delicte"])
+
+
+def partitions(*frames):
+    """Conjunt de parells (Canto_norm, Any) presents a ``frames``."""
+    pairs = set()
+    for frame in frames:
+        unique = frame[["Canto_norm", "Any"]].drop_duplicates()
+        pairs.update(zip(unique["Canto_norm"].astype(str), unique["Any"].astype(int)))
+    return pairs
+
+
+def drop_partitions(frame, pairs):
+    """Files de ``frame`` fora de les particions (Canto_norm, Any) de ``pairs``."""
+    if not pairs:
+        return frame
+    cantons = frame["Canto_norm"].astype("category")
+    codes = cantons.cat.codes.to_numpy().astype(np.int64)
+    lookup = {name: i for i, name in enumerate(cantons.cat.categories)}
+    # Clau entera cantó*10000 + any: l'isin es fa sobre enters, no sobre text
+    wanted = [lookup[c] * 10000 + y for c, y in pairs if c in lookup]
+    keys = codes * 10000 + frame["Any"].to_numpy().astype(np.int64)
+    return frame[~np.isin(keys, wanted)]
+
+
+def concat_typed(frames):
+    """``pd.concat`` que conserva les categòriques (categories unides i ordenades)."""
+    frames = [f for f in frames if len(f)] or frames[:1]
+    columns = {}
+    for col, dtype in frames[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            parts = [f[col].astype("category").cat.remove_unused_categories() for f in frames]
+            columns[col] = union_categoricals(parts, sort_categories=True)
+        else:
+            columns[col] = pd.concat([f[col] for f in frames], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def replace_partitions(base, update):
+    """Incorpora les taules agregades ``update`` a ``base``.
+
+    ``base`` i ``update`` són ``(facts, attributes, offences)``. Les particions
+    (cantó, any) que apareixen a ``update`` se substitueixen senceres; la resta
+    de ``base`` no es toca. L'ordre i les categories queden com si s'hagués
+    agregat tot el fitxer de cop. Retorna les taules noves i les particions
+    afectades.
+    """
+    facts, attributes, offences = base
+    new_facts, new_attributes, new_offences = update
+    pairs = partitions(new_facts, new_attributes)
+    facts = concat_typed([drop_partitions(facts, pairs), new_facts])
+    facts = facts.sort_values(["Any", "Canto_norm", "Tipus_de_Delicte", "Nivell_de_Resolucio"],
+                              ignore_index=True)
+    attributes = concat_typed([drop_partitions(attributes, pairs), new_attributes])
+    attributes = attributes.sort_values(["Canto_norm", "Any"], ignore_index=True)
+    # concat_typed deixa només les categories presents
+    present = set(facts["Tipus_de_Delicte"].cat.categories)
+    offences = [o for o in dict.fromkeys(list(offences) + list(new_offences)) if o in present]
+    return (facts, attributes, offences), pairs
+
+
+def top_positions(counts, n):
+    """Posicions dels ``n`` valors més grans de ``counts``, de més gran a més petit.
+
+    Amb ``argpartition`` només s'ordenen els ``n`` escollits, no tots els valors.
+    """
+    counts = np.asarray(counts)
+    if n >= len(counts):
+        return np.argsort(-counts, kind="stable")
+    chosen = np.argpartition(-counts, n - 1)[:n]
+    return chosen[np.argsort(-counts[chosen], kind="stable")]
+
+
+class CubeIndex:
+    """Índex invertit sobre les files de ``facts``.
+
+    Les files han d'estar ordenades per any: un rang d'anys és un tall
+    contigu. Per a cada cantó i cada tipus de delicte es guarden les seves
+    posicions (ordenades) en format compacte: un sol vector de posicions i un
+    vector de desplaçaments per valor.
+    """
+
+    def __init__(self, facts):
+        self.years = facts["Any"].to_numpy()
+        if len(self.years) and np.any(np.diff(self.years) < 0):
+            raise ValueError("facts ha d'estar ordenat per 'Any'")
+        self.cantons = _Postings(facts["Canto_norm"])
+        self.offences = _Postings(facts["Tipus_de_Delicte"])
+
+    def year_bounds(self, years):
+        if years is None:
+            return 0, len(self.years)
+        start = int(np.searchsorted(self.years, years[0], side="left"))
+        stop = int(np.searchsorted(self.years, years[1], side="right"))
+        return start, stop
+
+    def select(self, years=None, canton=None, offences=None):
+        """Posicions de les files que compleixen els tres filtres.
+
+        Retorna un ``slice`` si només hi ha filtre d'anys, o un vector de
+        posicions ordenades. Es parteix del conjunt més petit (tall d'anys,
+        files del cantó o files dels delictes) i la resta de filtres es
+        comproven sobre aquest conjunt.
+        """
+        start, stop = self.year_bounds(years)
+        offence_mask = None
+        if offences is not None:
+            offence_mask = self.offences.mask(offences)
+            if offence_mask.all():
+                offence_mask = None
+        if canton is None and offence_mask is None:
+            return slice(start, stop)
+        if canton is not None:
+            positions = self.cantons.positions(canton, start, stop)
+        elif offence_mask.sum() * 2 <= len(offence_mask):
+            # Pocs delictes: unió de les seves llistes de posicions
+            positions = np.sort(np.concatenate(
+                [self.offences.positions_of(code, start, stop)
+                 for code in np.flatnonzero(offence_mask)] or [np.empty(0, dtype=np.int64)]
+            ))
+            offence_mask = None
+        else:
+            positions = np.arange(start, stop)
+        if offence_mask is not None:
+            positions = positions[offence_mask[self.offences.codes[positions]]]
+        return positions
+
+
+class _Postings:
+    """Llistes de posicions per valor d'una columna (CSR)."""
+
+    def __init__(self, column):
+        codes, uniques = pd.factorize(column, sort=True)
+        self.codes = codes
+        self.lookup = {value: i for i, value in enumerate(uniques)}
+        self.order = np.argsort(codes, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))])
+
+    def positions_of(self, code, start, stop):
+        rows = self.order[self.offsets[code]:self.offsets[code + 1]]
+        lo, hi = np.searchsorted(rows, [start, stop])
+        return rows[lo:hi]
+
+    def positions(self, value, start, stop):
+        code = self.lookup.get(value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return self.positions_of(code, start, stop)
+
+    def mask(self, values):
+        """Vector booleà per codi: ``True`` si el valor és a ``values``."""
+        mask = np.zeros(len(self.lookup), dtype=bool)
+        codes = [self.lookup[v] for v in values if v in self.lookup]
+        mask[codes] = True
+        return mask
+
+
+class CrimeCube:
+    """Cub de delictes amb les agregacions de cada secció d'app2."""
+
+    def __init__(self, facts, attributes, offences=None, index=None, stats=None, selection=None,
+                 ranked=None):
+        self.facts = facts
+        self.attributes = attributes
+        self.index = index
+        # Moments precalculats i la selecció (anys, cantó, delictes) que representa el cub
+        self.stats = stats
+        self.selection = selection
+        # Ordre d'aparició dels tipus de delicte, per a les opcions del filtre
+        if offences is None:
+            offences = list(pd.unique(facts["Tipus_de_Delicte"]))
+        self.offences = offences
+        # Totals per valor de les dimensions usades pel top N (vegeu ``ranking``)
+        self._rankings = {}
+        # D'on surten aquests totals: ``(stats, selecció, exclusions)``; els cubs
+        # d'``exclude`` no tenen ``stats`` propis però hereten el d'origen
+        if ranked is None and stats is not None:
+            ranked = (stats, selection, ())
+        self.ranked = ranked
+
+    @classmethod
+    def from_frame(cls, df, rules=None):
+        return cls.from_aggregates(
+            aggregate_facts(df),
+            aggregate_attributes(df),
+            list(pd.unique(df["Tipus_de_Delicte"])),
+            rules,
+        )
+
+    @classmethod
+    def from_aggregates(cls, facts, attributes, offences, rules=None):
+        """Cub a partir de taules ja agregades (p. ex. de ``FactsAccumulator``)."""
+        facts["Categorie"] = categorize_column(
+            facts["Tipus_de_Delicte"], load_rules() if rules is None else rules
+        )
+        stats = StatsStore(facts, attributes, ATTRIBUTES, TOTAL_CASOS)
+        return cls(facts, attributes, offences=offences, index=CubeIndex(facts),
+                   stats=stats, selection=(None, None, None))
+
+    def __len__(self):
+        return len(self.facts)
+
+    # ---------- Dimensions per als filtres ----------
+    def year_range(self):
+        years = self.facts["Any"]
+        return int(years.min()), int(years.max())
+
+    def cantons(self):
+        return sorted(pd.unique(self.facts["Canto_norm"]))
+
+    # ---------- Filtres ----------
+    def filter(self, years=None, canton=None, offences=None):
+        """Retorna un cub nou restringit a la selecció del sidebar."""
+        facts = self.facts
+        if self.index is not None:
+            rows = self.index.select(years, canton, offences)
+            return CrimeCube(facts.iloc[rows], self.attributes, offences=self.offences,
+                             stats=self.stats, selection=(years, canton, offences))
+        mask = get_backend().mask(
+            facts,
+            isin={"Tipus_de_Delicte": offences} if offences is not None else None,
+            between={"Any": years} if years is not None else None,
+        )
+        if canton is not None:
+            mask &= (facts["Canto_norm"] == canton).to_numpy()
+        return CrimeCube(facts[mask], self.attributes, offences=self.offences)
+
+    def exclude(self, column, value):
+        """Cub sense les claus on ``column == value`` (p. ex. el total nacional)."""
+        facts = self.facts
+        mask = get_backend().mask(facts, exclude={column: value})
+        ranked = None
+        if self.ranked is not None:
+            stats, selection, exclusions = self.ranked
+            ranked = (stats, selection, exclusions + ((column, value),))
+        return CrimeCube(facts[mask], self.attributes, offences=self.offences, ranked=ranked)
+
+    # ---------- Agregacions ----------
+    def totals(self, by):
+        """Suma de ``Nombre_de_Delictes`` per les dimensions ``by``."""
+        return get_backend().group_sum(self.facts, by, "Nombre_de_Delictes")
+
+    # ---------- Top N ----------
+    def ranking(self, column):
+        """``(valors, delictes)`` de cada valor de ``column``; es calcula un sol cop per cub.
+
+        Per als cantons i els tipus de delicte surt dels totals precalculats
+        per (delicte, cantó, any) de ``StatsStore`` per a la selecció del cub,
+        sense tornar a agrupar les files; si no n'hi ha, d'un ``totals(column)``.
+        """
+        if column not in self._rankings:
+            ranking = None
+            if self.ranked is not None:
+                stats, selection, exclusions = self.ranked
+                ranking = stats.ranking(column, *selection, exclude=dict(exclusions))
+            if ranking is None:
+                totals = self.totals(column)
+                ranking = (totals[column].to_numpy(), totals["Nombre_de_Delictes"].to_numpy())
+            self._rankings[column] = ranking
+        return self._rankings[column]
+
+    def top(self, column, n):
+        """Els ``n`` valors de ``column`` amb més delictes, de més a menys."""
+        values, counts = self.ranking(column)
+        return list(values[top_positions(counts, n)])
+
+    def limit(self, frame, column, n, other):
+        """``frame`` (resultat de ``totals``) amb els valors de ``column`` fora del top ``n`` sumats a ``other``.
+
+        Els valors que queden mantenen el seu ordre i ``other`` va al final.
+        """
+        keep = set(self.top(column, n))
+        values = frame[column]
+        if values.isin(keep).all():
+            return frame
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            order = values.cat.categories
+        else:
+            order = np.sort(pd.unique(values))
+        kept = pd.Index([v for v in order if v in keep])
+        # Codi de cada fila: la seva posició al top o ``other`` (l'últim)
+        codes = kept.get_indexer(values)
+        codes[codes < 0] = len(kept)
+        dtype = pd.CategoricalDtype(list(kept) + [other])
+        keys = [col for col in frame.columns if col != "Nombre_de_Delictes"]
+        frame = frame.assign(**{column: pd.Categorical.from_codes(codes, dtype=dtype)})
+        return get_backend().group_sum(frame, keys, "Nombre_de_Delictes")
+
+    def with_attributes(self, frame):
+        """Afegeix els atributs socioeconòmics del cantó-any a ``frame``."""
+        return frame.merge(self.attributes, on=["Canto_norm", "Any"], how="left")
+
+    def kpis(self):
+        facts = self.facts
+        return {
+            "total_crimes": facts["Nombre_de_Delictes"].sum(),
+            "avg_crime_rate": facts["Taxa_suma"].sum() / facts["Taxa_n"].sum(),
+            "avg_resolution": facts["Resolts_suma"].sum() / facts["Resolts_n"].sum(),
+        }
+
+    def _rate(self, by, facts):
+        out = get_backend().group_sum(facts, by, ["Taxa_suma", "Taxa_n", "Nombre_de_Delictes"])
+        out["Taxa_Criminalitat_per_1000"] = out["Taxa_suma"] / out["Taxa_n"]
+        return out
+
+    def map_data(self):
+        by = ["Canto_norm", "Any"]
+        out = self._rate(by, self.facts)
+        return out[by + ["Taxa_Criminalitat_per_1000", "Nombre_de_Delictes"]]
+
+    def scatter_data(self):
+        if self.stats is not None:
+            return self.stats.scatter_data(*self.selection)
+        # Només "Total de casos" (una observació per cantó-any)
+        facts = self.facts[self.facts["Nivell_de_Resolucio"] == TOTAL_CASOS]
+        by = ["Canto_norm", "Any"]
+        out = self._rate(by, facts)
+        return self.with_attributes(out[by + ["Taxa_Criminalitat_per_1000"]])
+
+    def canton_profile(self):
+        """Per cantó: total de delictes i mitjana (ponderada per files) dels atributs."""
+        if self.stats is not None:
+            return self.stats.canton_profile(*self.selection)
+        backend = get_backend()
+        rows = backend.group_sum(self.facts, ["Canto_norm", "Any"], ["Nombre_de_Delictes", "Files"])
+        rows = self.with_attributes(rows)
+        for col in ATTRIBUTES:
+            rows[col] = rows[col] * rows["Files"]
+        out = backend.group_sum(rows, "Canto_norm", ["Nombre_de_Delictes", "Files"] + ATTRIBUTES)
+        out = out.set_index("Canto_norm")
+        for col in ATTRIBUTES:
+            out[col] = out[col] / out["Files"]
+        return out[["Nombre_de_Delictes"] + ATTRIBUTES]
@@ -0,0 +1,183 @@
+"""Estadístics suficients per a les seccions socioeconòmiques d'app2.
+
+La correlació de la secció 9 i el scatter de la secció 4 només necessiten,
+per a cada (cantó, any), sumes additives sobre els tipus de delicte
+seleccionats: el nombre de delictes, el recompte de files i, per a la taxa,
+la suma i el recompte de ``Taxa_Criminalitat_per_1000`` del nivell "Total de
+casos". ``StatsStore`` les guarda una sola vegada per (delicte, cantó, any),
+agrupades per delicte (CSR), i els atributs socioeconòmics com una matriu
+(cantó-any × variable).
+
+Per a qualsevol selecció del sidebar es combinen aquests moments sense
+tornar a agrupar les files: amb tots els delictes s'usen els totals ja
+calculats i, si no, se sumen només les llistes dels delictes seleccionats
+(o es resten les dels no seleccionats, si són menys). Després tot és
+proporcional al nombre de cantons-any. Afegir una variable socioeconòmica
+és afegir una columna a la matriu d'atributs.
+"""
+import numpy as np
+import pandas as pd
+
+# Sumes guardades per (delicte, cantó, any); les de taxa només del nivell total
+MOMENTS = ["Nombre_de_Delictes", "Files", "Taxa_suma", "Taxa_n", "Files_total"]
+# Moments enters (sumes exactes): es poden obtenir restant del total
+EXACT = {"Nombre_de_Delictes", "Files", "Taxa_n", "Files_total"}
+
+
+class StatsStore:
+    """Moments per (delicte, cantó, any) i atributs per (cantó, any)."""
+
+    def __init__(self, facts, attributes, variables, total_level):
+        cantons = facts["Canto_norm"].astype("category")
+        self.canton_dtype = cantons.dtype
+        self.year_dtype = facts["Any"].dtype
+        self.cantons = np.asarray(cantons.cat.categories)
+        self.years = np.unique(facts["Any"].to_numpy()) if len(facts) else np.empty(0, int)
+        self.variables = list(variables)
+        n_years = len(self.years)
+
+        # Clau (delicte, cantó-any) de cada fila de facts
+        offence_codes, offences = pd.factorize(facts["Tipus_de_Delicte"], sort=True)
+        self.offences = np.asarray(offences)
+        self.lookup = {value: i for i, value in enumerate(offences)}
+        cy = (cantons.cat.codes.to_numpy().astype(np.int64) * n_years
+              + np.searchsorted(self.years, facts["Any"].to_numpy()))
+        width = max(len(self), 1)
+        keys, inverse = np.unique(offence_codes.astype(np.int64) * width + cy, return_inverse=True)
+        total = (facts["Nivell_de_Resolucio"] == total_level).to_numpy()
+        weights = {
+            "Nombre_de_Delictes": facts["Nombre_de_Delictes"].to_numpy(),
+            "Files": facts["Files"].to_numpy(),
+            "Taxa_suma": np.where(total, facts["Taxa_suma"].to_numpy(), 0.0),
+            "Taxa_n": np.where(total, facts["Taxa_n"].to_numpy(), 0),
+            "Files_total": np.where(total, facts["Files"].to_numpy(), 0),
+        }
+        self.moments = {name: np.bincount(inverse, weights=w, minlength=len(keys))
+                        for name, w in weights.items()}
+        self.cy = keys % width
+        self.row_offence = keys // width
+        self.offsets = np.searchsorted(self.row_offence, np.arange(len(offences) + 1))
+        self.totals = {name: self._sum(slice(None), values)
+                       for name, values in self.moments.items()}
+
+        self.attribute_dtypes = attributes[self.variables].dtypes
+        self.attributes = np.full((len(self), len(self.variables)), np.nan)
+        self.known = np.zeros(len(self), dtype=bool)
+        rows = attributes[attributes["Canto_norm"].isin(self.cantons)
+                          & attributes["Any"].isin(self.years)]
+        at = (pd.Categorical(rows["Canto_norm"], categories=self.cantons).codes.astype(np.int64)
+              * n_years + np.searchsorted(self.years, rows["Any"].to_numpy()))
+        self.attributes[at] = rows[self.variables].to_numpy(dtype=float)
+        self.known[at] = True
+
+    def __len__(self):
+        """Nombre de cantons-any."""
+        return len(self.cantons) * len(self.years)
+
+    def _sum(self, rows, values):
+        return np.bincount(self.cy[rows], weights=values[rows], minlength=len(self))
+
+    def _rows(self, codes):
+        spans = [np.arange(self.offsets[c], self.offsets[c + 1]) for c in codes]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    # ---------- Selecció ----------
+    def cell_moments(self, years=None, canton=None, offences=None):
+        """Moments de la selecció per cantó-any: ``{nom: vector de len(self)}``."""
+        if offences is None:
+            out = {name: values.copy() for name, values in self.totals.items()}
+        else:
+            selected = np.zeros(len(self.lookup), dtype=bool)
+            selected[[self.lookup[o] for o in offences if o in self.lookup]] = True
+            if selected.sum() * 2 <= len(selected):
+                rows = self._rows(np.flatnonzero(selected))
+                out = {name: self._sum(rows, values) for name, values in self.moments.items()}
+            else:
+                # Molts delictes: total menys els no seleccionats (exacte per a sumes enteres)
+                rows = self._rows(np.flatnonzero(~selected))
+                every = self._rows(np.flatnonzero(selected))
+                out = {
+                    name: (self.totals[name] - self._sum(rows, values)) if name in EXACT
+                    else self._sum(every, values)
+                    for name, values in self.moments.items()
+                }
+        keep = self._keep(years, canton)
+        for values in out.values():
+            values[~keep] = 0
+        return out
+
+    def _keep(self, years=None, canton=None):
+        """Cantons-any dins de la selecció."""
+        keep = np.ones((len(self.cantons), len(self.years)), dtype=bool)
+        if years is not None:
+            keep &= (self.years >= years[0]) & (self.years <= years[1])
+        if canton is not None:
+            keep &= (self.cantons == canton)[:, None]
+        return keep.ravel()
+
+    # ---------- Top N ----------
+    def ranking(self, column, years=None, canton=None, offences=None, exclude=None):
+        """``(valors, delictes)`` de ``column`` per a la selecció, com ``CrimeCube.ranking``.
+
+        Surt dels moments per (delicte, cantó, any), sense agrupar les files.
+        ``column`` és ``Canto_norm`` o ``Tipus_de_Delicte`` i ``exclude``
+        ({columna: valor}) només admet un cantó; en altres casos retorna
+        ``None``. Com un ``groupby(observed=True)``, només hi ha els valors
+        amb alguna fila a la selecció.
+        """
+        exclude = dict(exclude or {})
+        if column not in ("Canto_norm", "Tipus_de_Delicte") or set(exclude) - {"Canto_norm"}:
+            return None
+        crimes, files = self.moments["Nombre_de_Delictes"], self.moments["Files"]
+        keep = self._keep(years, canton)
+        if "Canto_norm" in exclude:
+            keep &= np.repeat(self.cantons != exclude["Canto_norm"], len(self.years))
+        rows = keep[self.cy]
+        if offences is not None:
+            selected = np.zeros(len(self.lookup), dtype=bool)
+            selected[[self.lookup[o] for o in offences if o in self.lookup]] = True
+            rows &= selected[self.row_offence]
+        if column == "Canto_norm":
+            groups, values = self.cy // len(self.years), self.cantons
+        else:
+            groups, values = self.row_offence, self.offences
+        counts = np.bincount(groups[rows], weights=crimes[rows], minlength=len(values))
+        present = np.bincount(groups[rows], weights=files[rows], minlength=len(values)) > 0
+        return values[present], counts[present].astype(np.int64)
+
+    # ---------- Agregacions ----------
+    def canton_profile(self, years=None, canton=None, offences=None):
+        """Com ``CrimeCube.canton_profile``: delictes i atributs ponderats per files, per cantó."""
+        m = self.cell_moments(years, canton, offences)
+        shape = (len(self.cantons), len(self.years))
+        files = m["Files"].reshape(shape)
+        crimes = m["Nombre_de_Delictes"].reshape(shape).sum(axis=1)
+        weighted = np.nansum(
+            (m["Files"][:, None] * self.attributes).reshape(shape + (len(self.variables),)), axis=1
+        )
+        n = files.sum(axis=1)
+        present = n > 0
+        out = pd.DataFrame(weighted[present] / n[present, None], columns=self.variables,
+                           index=pd.CategoricalIndex(self.cantons[present], dtype=self.canton_dtype,
+                                                     name="Canto_norm"))
+        out.insert(0, "Nombre_de_Delictes", crimes[present])
+        return out
+
+    def scatter_data(self, years=None, canton=None, offences=None):
+        """Com ``CrimeCube.scatter_data``: taxa del nivell total i atributs per cantó-any."""
+        m = self.cell_moments(years, canton, offences)
+        present = np.flatnonzero(m["Files_total"] > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = m["Taxa_suma"][present] / m["Taxa_n"][present]
+        n_years = len(self.years)
+        out = pd.DataFrame({
+            "Canto_norm": pd.Categorical.from_codes(present // n_years, dtype=self.canton_dtype),
+            "Any": self.years[present % n_years].astype(self.year_dtype),
+            "Taxa_Criminalitat_per_1000": rate,
+        })
+        # Mateixos tipus que el merge amb la taula d'atributs (float si en falta algun)
+        complete = self.known[present].all()
+        for i, name in enumerate(self.variables):
+            values = self.attributes[present, i]
+            out[name] = values.astype(self.attribute_dtypes[name]) if complete else values
+        return out
@@ -0,0 +1,376 @@
+"""Magatzem columnar i tipat del dataset de criminalitat.
+
+El CSV comprimit (``df_final_compressed.csv.gz``) es converteix una sola
+vegada en un paquet de fitxers ``.npy`` (un per columna) dins de
+``.cache/crime/<hash>/``. Les columnes de text es guarden com a categòriques
+(codis enters + llista de categories) i ``Any`` com a enter petit, de manera
+que la càrrega és una lectura binària directa, sense gzip ni parseig de text.
+
+El paquet només es reconstrueix quan canvia el hash del fitxer font.
+
+Per a extractes que no caben en memòria hi ha un camí en streaming: el CSV
+es llegeix per blocs (``VIZ_CHUNK_ROWS`` files) i cada bloc s'agrega
+directament al gra del cub (``crime_cube.FactsAccumulator``), sense
+materialitzar mai totes les files. Les taules agregades es desen a
+``.cache/crime/cube-<hash>/`` amb el mateix format columnar.
+
+Els anys nous es poden afegir sense reprocessar la base: els fitxers afegits
+es registren a ``crime_appends.json`` (al costat de la font) i cada un
+substitueix les particions (cantó, any) que conté. El hash de l'estat encadena
+el de la base amb el de cada afegit, i les memòries cau d'un estat es
+construeixen a partir de les de l'estat anterior. ``lineage.json`` del cub
+guarda quines particions va canviar cada afegit, perquè l'app només invalidi
+els resultats afectats.
+
+Ús des de línia d'ordres::
+
+    python crime_store.py [fitxer.csv.gz]            # paquet de files
+    python crime_store.py --cube [fitxer.csv.gz]     # cub agregat per blocs
+    python crime_store.py --append any_2023.csv.gz   # afegeix anys nous
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from crime_cube import (
+    ATTRIBUTES, KEYS, MEASURES, FactsAccumulator, concat_typed, drop_partitions, partitions,
+    replace_partitions,
+)
+from settings import CRIME_SOURCE as SOURCE, appends_file, file_hash, read_appends
+
+CACHE_DIR = Path(".cache") / "crime"
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+CATEGORICAL_COLUMNS = ["Canto", "Canto_norm", "Tipus_de_Delicte", "Nivell_de_Resolucio"]
+CHUNK_ROWS = int(os.environ.get("VIZ_CHUNK_ROWS", "200000"))
+# Les apps projecten els paquets amb mmap (pàgines compartides entre processos)
+MMAP = os.environ.get("VIZ_MMAP", "1").lower() in ("1", "true", "yes", "on")
+OFFENCES_FILE = "offences.json"
+LINEAGE_FILE = "lineage.json"
+# Només les columnes que necessita el cub
+CUBE_COLUMNS = list(dict.fromkeys(KEYS + [src for src, _ in MEASURES.values()] + ATTRIBUTES))
+
+DTYPES = {
+    "Any": "int16",
+    "Canto": "category",
+    "Tipus_de_Delicte": "category",
+    "Nombre_de_Delictes": "float64",
+    "Nivell_de_Resolucio": "category",
+    "Poblacio_Total": "float64",
+    "Swiss": "float64",
+    "Foreigner": "float64",
+    "Percentatge_Estrangers": "float64",
+    "Taxa_Criminalitat_per_1000": "float64",
+    "Percentatge_Casos_Resolts": "float64",
+    "Canto_norm": "category",
+    "PIB_per_Capita": "int32",
+}
+
+
+def read_source_csv(path=SOURCE):
+    """Llegeix el CSV original aplicant directament els tipus compactes."""
+    return pd.read_csv(
+        path, sep=';', decimal='.', encoding='utf-8', compression='infer', dtype=DTYPES
+    )
+
+
+def iter_source_chunks(path=SOURCE, chunksize=CHUNK_ROWS, usecols=None):
+    """Blocs de com a molt ``chunksize`` files del CSV original, ja tipats."""
+    dtype = DTYPES if usecols is None else {c: DTYPES[c] for c in usecols if c in DTYPES}
+    return pd.read_csv(
+        path, sep=';', decimal='.', encoding='utf-8', compression='infer',
+        dtype=dtype, usecols=usecols, chunksize=chunksize,
+    )
+
+
+def stream_aggregates(path=SOURCE, chunksize=CHUNK_ROWS):
+    """``(facts, attributes, offences)`` del cub, llegint el CSV per blocs."""
+    accumulator = FactsAccumulator(compact_rows=4 * chunksize)
+    with iter_source_chunks(path, chunksize, usecols=CUBE_COLUMNS) as reader:
+        for chunk in reader:
+            accumulator.add(chunk)
+    return accumulator.result()
+
+
+def write_bundle(df, bundle_dir, source_hash):
+    """Escriu ``df`` com a paquet columnar dins de ``bundle_dir``.
+
+    El paquet s'escriu primer en un directori temporal i després es mou al
+    seu lloc, de manera que un lector mai veu un paquet a mig escriure.
+    """
+    bundle_dir = Path(bundle_dir)
+    bundle_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=bundle_dir.parent))
+    columns = []
+    for i, (name, col) in enumerate(df.items()):
+        fname = f"{i:03d}.npy"
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            np.save(tmp_dir / fname, col.cat.codes.to_numpy())
+            columns.append({
+                "name": name,
+                "file": fname,
+                "kind": "category",
+                "categories": [str(c) for c in col.cat.categories],
+            })
+        else:
+            np.save(tmp_dir / fname, col.to_numpy())
+            columns.append({"name": name, "file": fname, "kind": "array"})
+    manifest = {
+        "format": FORMAT_VERSION,
+        "source_hash": source_hash,
+        "rows": len(df),
+        "columns": columns,
+    }
+    with open(tmp_dir / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    try:
+        os.rename(tmp_dir, bundle_dir)
+    except OSError:
+        # Un altre procés ja ha escrit el mateix paquet
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return bundle_dir
+
+
+def read_bundle(bundle_dir, mmap=False):
+    """Reconstrueix el DataFrame a partir d'un paquet columnar.
+
+    Amb ``mmap=True`` les columnes numèriques es projecten en memòria en
+    lloc de llegir-se, i les pàgines es comparteixen entre processos.
+    """
+    bundle_dir = Path(bundle_dir)
+    with open(bundle_dir / MANIFEST, encoding="utf-8") as f:
+        manifest = json.load(f)
+    data = {}
+    for col in manifest["columns"]:
+        values = np.load(bundle_dir / col["file"], mmap_mode="r" if mmap else None)
+        if col["kind"] == "category":
+            data[col["name"]] = pd.Categorical.from_codes(values, categories=col["categories"])
+        else:
+            data[col["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def bundle_path(source_hash, cache_dir=CACHE_DIR):
+    return Path(cache_dir) / f"v{FORMAT_VERSION}-{source_hash[:16]}"
+
+
+def cube_path(source_hash, cache_dir=CACHE_DIR):
+    return Path(cache_dir) / f"cube-v{FORMAT_VERSION}-{source_hash[:16]}"
+
+
+def remove_stale_bundles(current, cache_dir=CACHE_DIR):
+    """Esborra els paquets del mateix tipus d'altres versions del fitxer font."""
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return
+    prefix = Path(current).name.rsplit("-", 1)[0] + "-"
+    for entry in cache_dir.iterdir():
+        if entry.is_dir() and entry != Path(current) and entry.name.startswith(prefix):
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def register_append(new_file, path=SOURCE):
+    """Afegeix ``new_file`` al registre d'afegits de ``path`` (si no hi era)."""
+    registry = appends_file(path)
+    name = os.path.relpath(new_file, Path(path).parent)
+    names = []
+    if registry.exists():
+        with open(registry, encoding="utf-8") as f:
+            names = json.load(f)["appends"]
+    if name not in names:
+        names.append(name)
+        with open(registry, "w", encoding="utf-8") as f:
+            json.dump({"appends": names}, f, ensure_ascii=False, indent=2)
+    return [str(Path(path).parent / n) for n in names]
+
+
+def source_states(path=SOURCE, appends=None):
+    """Hash de l'estat del dataset després de cada fitxer: base, base + 1r afegit, ...
+
+    Retorna ``(estats, afegits)``; l'estat ``i`` identifica la base amb els
+    ``i`` primers afegits aplicats.
+    """
+    appends = read_appends(path) if appends is None else list(appends)
+    states = [file_hash(path)]
+    for extra in appends:
+        states.append(hashlib.sha256((states[-1] + file_hash(extra)).encode()).hexdigest())
+    return states, appends
+
+
+def _latest_state(states, exists):
+    """Índex de l'últim estat que ja és a la memòria cau, o -1."""
+    for i in range(len(states) - 1, -1, -1):
+        if exists(states[i]):
+            return i
+    return -1
+
+
+def build_cache(path=SOURCE, cache_dir=CACHE_DIR, appends=None):
+    """Garanteix que existeix el paquet per a la versió actual de ``path``.
+
+    Si ja hi ha el paquet d'un estat anterior (sense els darrers afegits),
+    només es llegeixen els fitxers afegits i se substitueixen les seves
+    particions (cantó, any); el CSV base no es torna a llegir.
+    """
+    states, appends = source_states(path, appends)
+    target = bundle_path(states[-1], cache_dir)
+    if (target / MANIFEST).exists():
+        return target
+    start = _latest_state(states, lambda h: (bundle_path(h, cache_dir) / MANIFEST).exists())
+    if start < 0:
+        df, start = read_source_csv(path), 0
+    else:
+        df = read_bundle(bundle_path(states[start], cache_dir))
+    for extra in appends[start:]:
+        new = read_source_csv(extra)
+        df = concat_typed([drop_partitions(df, partitions(new)), new])
+    write_bundle(df, target, states[-1])
+    remove_stale_bundles(target, cache_dir)
+    return target
+
+
+def load_crime_data(path=SOURCE, cache_dir=CACHE_DIR, mmap=False):
+    """Carrega el dataset de criminalitat (amb els anys afegits) des del paquet columnar.
+
+    Si el paquet no existeix o el hash del fitxer font ha canviat, es
+    reconstrueix a partir del CSV. Si el directori de memòria cau no és
+    escrivible, es retorna directament el CSV tipat.
+    """
+    try:
+        target = build_cache(path, cache_dir)
+    except OSError:
+        df = read_source_csv(path)
+        for extra in read_appends(path):
+            new = read_source_csv(extra)
+            df = concat_typed([drop_partitions(df, partitions(new)), new])
+        return df
+    return read_bundle(target, mmap=mmap)
+
+
+def write_cube(facts, attributes, offences, target, lineage=None):
+    """Desa les taules del cub com a dos paquets columnars més l'ordre dels delictes."""
+    target = Path(target)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=target.parent))
+    write_bundle(facts, tmp_dir / "facts", target.name)
+    write_bundle(attributes, tmp_dir / "attributes", target.name)
+    with open(tmp_dir / LINEAGE_FILE, "w", encoding="utf-8") as f:
+        json.dump(lineage or {"states": [], "partitions": []}, f, ensure_ascii=False)
+    with open(tmp_dir / OFFENCES_FILE, "w", encoding="utf-8") as f:
+        json.dump(offences, f, ensure_ascii=False)
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return target
+
+
+def read_cube(target, mmap=False):
+    target = Path(target)
+    with open(target / OFFENCES_FILE, encoding="utf-8") as f:
+        offences = json.load(f)
+    return (read_bundle(target / "facts", mmap=mmap),
+            read_bundle(target / "attributes", mmap=mmap),
+            offences)
+
+
+def read_lineage(target, state=None):
+    """Estats del dataset i particions (cantó, any) que va canviar cada afegit.
+
+    Els cubs desats sense llinatge només coneixen el seu propi estat.
+    """
+    path = Path(target) / LINEAGE_FILE
+    if not path.exists():
+        return {"states": [state] if state else [], "partitions": [[]] if state else []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_cube_cache(path=SOURCE, cache_dir=CACHE_DIR, chunksize=CHUNK_ROWS, appends=None):
+    """Garanteix que existeix el cub agregat per a la versió actual de ``path``.
+
+    Els afegits s'apliquen sobre el darrer cub desat: s'agreguen només els
+    fitxers nous i se substitueixen les seves particions (cantó, any).
+    """
+    states, appends = source_states(path, appends)
+    target = cube_path(states[-1], cache_dir)
+    if (target / OFFENCES_FILE).exists():
+        return target
+    target.parent.mkdir(parents=True, exist_ok=True)
+    start = _latest_state(states, lambda h: (cube_path(h, cache_dir) / OFFENCES_FILE).exists())
+    if start < 0:
+        tables, start = stream_aggregates(path, chunksize), 0
+        lineage = {"states": states[:1], "partitions": [[]]}
+    else:
+        tables = read_cube(cube_path(states[start], cache_dir))
+        lineage = read_lineage(cube_path(states[start], cache_dir), states[start])
+    for i, extra in enumerate(appends[start:], start + 1):
+        tables, pairs = replace_partitions(tables, stream_aggregates(extra, chunksize))
+        lineage["states"].append(states[i])
+        lineage["partitions"].append(sorted([c, y] for c, y in pairs))
+    write_cube(*tables, target, lineage=lineage)
+    remove_stale_bundles(target, cache_dir)
+    return target
+
+
+def load_cube_tables(path=SOURCE, cache_dir=CACHE_DIR, chunksize=CHUNK_ROWS, mmap=False):
+    """Taules ``(facts, attributes, offences)`` del cub, ingerides per blocs.
+
+    Mai es tenen totes les files crues en memòria: el pic depèn de
+    ``chunksize`` i del nombre de claus del cub. Si el directori de memòria
+    cau no és escrivible, s'agrega en streaming sense desar res.
+    """
+    try:
+        target = build_cube_cache(path, cache_dir, chunksize)
+    except OSError:
+        tables = stream_aggregates(path, chunksize)
+        for extra in read_appends(path):
+            tables, _ = replace_partitions(tables, stream_aggregates(extra, chunksize))
+        return tables
+    return read_cube(target, mmap=mmap)
+
+
+def cube_lineage(path=SOURCE, cache_dir=CACHE_DIR):
+    """Llinatge del cub actual (vegeu ``read_lineage``), o ``None`` si no és a la memòria cau."""
+    states, _ = source_states(path)
+    target = cube_path(states[-1], cache_dir)
+    if not (target / OFFENCES_FILE).exists():
+        return None
+    return read_lineage(target, states[-1])
+
+
+def append_year(new_file, path=SOURCE, cache_dir=CACHE_DIR, chunksize=CHUNK_ROWS):
+    """Registra ``new_file`` com a afegit de ``path`` i actualitza les memòries cau.
+
+    Retorna les particions (cantó, any) afectades.
+    """
+    register_append(new_file, path)
+    build_cache(path, cache_dir)
+    lineage = read_lineage(build_cube_cache(path, cache_dir, chunksize))
+    return lineage["partitions"][-1] if lineage["partitions"] else []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construeix la memòria cau del dataset de criminalitat.")
+    parser.add_argument("source", nargs="?", default=SOURCE)
+    parser.add_argument("--cube", action="store_true",
+                        help="agrega el CSV per blocs i desa només el cub")
+    parser.add_argument("--append", metavar="FITXER",
+                        help="afegeix un fitxer amb anys nous sense reprocessar la base")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    if args.append:
+        changed = append_year(args.append, args.source, chunksize=args.chunk_rows)
+        years = sorted({year for _, year in changed})
+        print(f"{len(changed)} particions (cantó, any) actualitzades; anys: {years}")
+    elif args.cube:
+        print(build_cube_cache(args.source, chunksize=args.chunk_rows))
+    else:
+        print(build_cache(args.source))
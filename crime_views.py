@@ -0,0 +1,260 @@
+"""Agregacions i figures de cada secció d'app2.
+
+Cada funció rep el cub ja filtrat i els paràmetres propis de la secció, i
+retorna un diccionari amb les dades derivades i les figures. No depenen de
+Streamlit, de manera que els resultats es poden desar a la memòria cau i
+reutilitzar entre reruns i sessions. Les figures surten de ``cached_figure``:
+dos estats de filtres amb el mateix agregat comparteixen la figura serialitzada.
+
+La resolució per tipus de delicte i el gràfic de cantons només dibuixen els
+``top_n`` valors amb més delictes i sumen la resta en un grup (vegeu
+``CrimeCube.limit``): el nombre de barres i d'etiquetes queda fitat encara que
+s'afegeixin tipus de delicte. Les categories surten de la taula de regles
+(``offence_categories``) i no creixen amb els tipus de delicte.
+"""
+import plotly.express as px
+
+from charts import animated_scatter
+from crime_cube import NACIONAL, RESTA_CANTONS, RESTA_DELICTES, TOTAL_CASOS
+from geo_lod import AUTO, auto_level, missing_names, subset
+from instrumentation import figure_phase
+from query import get_backend
+from result_cache import cached_figure
+from settings import TOP_CANTONS, TOP_DELICTES
+
+
+def metric_label(metric):
+    return "Crims" if metric == "Nombre_de_Delictes" else "Crims per 1000 habitants"
+
+
+def kpis_view(cube):
+    return cube.kpis()
+
+
+def map_view(cube, year, metric, detail, load_geojson, cantons):
+    """Secció 2: mapa coroplètic de l'últim any seleccionat."""
+    map_data = cube.map_data()
+    map_year = map_data[map_data['Any'] == year]
+    # Nivell més lleuger que encaixa amb la vista, i només les geometries que es pinten
+    level = auto_level(map_year['Canto_norm'].nunique()) if detail == AUTO else detail
+    geojson = load_geojson(level)
+
+    def build():
+        map_fig = px.choropleth(
+            map_year,
+            geojson=subset(geojson, map_year['Canto_norm']),
+            locations='Canto_norm',
+            featureidkey="properties.name",
+            color=metric,
+            color_continuous_scale="Reds",
+            hover_name='Canto_norm',
+            hover_data={metric: True, 'Any': True},
+            labels={metric: metric_label(metric)}
+        )
+        map_fig.update_geos(fitbounds="locations", visible=False)
+        map_fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+        return map_fig
+
+    with figure_phase():
+        map_fig = cached_figure('crime.mapa', map_year, build, metric, level)
+    return {"data": map_year, "fig": map_fig, "missing": missing_names(geojson, cantons)}
+
+
+def evolution_view(cube, metric):
+    """Secció 3: evolució temporal per cantó."""
+    map_data = cube.map_data()
+
+    def build():
+        line_fig = px.line(
+            map_data,
+            x='Any',
+            y=metric,
+            color='Canto_norm',
+            markers=True,
+            labels={"Canto_norm": "Cantó", metric: metric_label(metric)}
+        )
+        return line_fig
+
+    with figure_phase():
+        line_fig = cached_figure('crime.evolucio', map_data, build, metric)
+    return {"data": map_data, "fig": line_fig}
+
+
+def socioeconomic_view(cube):
+    """Secció 4: PIB, % d'estrangers i taxa de crim per cantó-any."""
+    # Només "Total de casos" (una observació per cantó-any), amb els atributs del cantó-any
+    scatter_data = cube.scatter_data()
+
+    def build():
+        scatter_fig = animated_scatter(
+            scatter_data,
+            x='PIB_per_Capita',
+            y='Taxa_Criminalitat_per_1000',
+            size='Poblacio_Total',
+            color='Percentatge_Estrangers',
+            hover_name='Canto_norm',
+            animation_frame='Any',   # 🔥 molt potent per storytelling
+            size_max=50,
+            labels={
+                "PIB_per_Capita": "PIB per càpita (CHF)",
+                "Taxa_Criminalitat_per_1000": "Crims per 1.000 habitants",
+                "Percentatge_Estrangers": "% població estrangera",
+                "Any": "Any"
+            },
+            color_continuous_scale='Viridis'
+        )
+        return scatter_fig
+
+    with figure_phase():
+        scatter_fig = cached_figure('crime.socioeconomic', scatter_data, build)
+    return {"data": scatter_data, "fig": scatter_fig}
+
+
+def resolution_view(cube, top_n=TOP_DELICTES):
+    """Secció 5: percentatge de resolució per tipus de delicte."""
+    # Agrupem per tipus de delicte i nivell de resolució (top N de tipus de delicte)
+    stacked_data = cube.limit(
+        cube.totals(['Tipus_de_Delicte', 'Nivell_de_Resolucio']), 'Tipus_de_Delicte', top_n, RESTA_DELICTES
+    )
+
+    # Calculem percentatge dins de cada tipus de delicte
+    stacked_data['Percentatge'] = get_backend().share(stacked_data, 'Tipus_de_Delicte', 'Nombre_de_Delictes')
+
+    # Eliminem 'Total de casos'
+    stacked_data = stacked_data[
+        stacked_data['Nivell_de_Resolucio'] != TOTAL_CASOS
+    ]
+
+    def build():
+        stacked_fig = px.bar(
+            stacked_data,
+            x='Tipus_de_Delicte',
+            y='Percentatge',
+            color='Nivell_de_Resolucio',
+            text=stacked_data['Percentatge'].apply(lambda x: f"{x:.1f}%"),
+            labels={"Percentatge": "Percentatge de delictes (%)", "Tipus_de_Delicte": "Tipus de delicte"}
+        )
+
+        stacked_fig.update_layout(
+            barmode='stack',
+            xaxis_tickangle=-45,
+            yaxis=dict(ticksuffix="%")
+        )
+        return stacked_fig
+
+    with figure_phase():
+        stacked_fig = cached_figure('crime.resolucio', stacked_data, build)
+    return {"data": stacked_data, "fig": stacked_fig}
+
+
+def category_trend_view(cube):
+    """Secció 6: evolució temporal per categoria de delicte."""
+    temporal_data = cube.totals(['Any', 'Categorie'])
+
+    def build():
+        line_cat_fig = px.line(
+            temporal_data,
+            x='Any',
+            y='Nombre_de_Delictes',
+            color='Categorie',
+            markers=True,
+            labels={"Nombre_de_Delictes": "Nombre de delictes"}
+        )
+        return line_cat_fig
+
+    with figure_phase():
+        line_cat_fig = cached_figure('crime.tendencia_categoria', temporal_data, build)
+    return {"data": temporal_data, "fig": line_cat_fig}
+
+
+def resolution_trend_view(cube):
+    """Secció 7: taxa de resolució per categoria al llarg dels anys."""
+    resolution_data = cube.exclude('Nivell_de_Resolucio', TOTAL_CASOS)
+    resolution_pct = resolution_data.totals(['Any','Categorie','Nivell_de_Resolucio'])
+    resolution_pct['Percentatge'] = get_backend().share(resolution_pct, ['Any','Categorie'], 'Nombre_de_Delictes')
+
+    def build():
+        line_res_fig = px.line(
+            resolution_pct[resolution_pct['Nivell_de_Resolucio']=='Resolts'],
+            x='Any',
+            y='Percentatge',
+            color='Categorie',
+            markers=True,
+            labels={"Percentatge": "% casos resolts"}
+        )
+        return line_res_fig
+
+    with figure_phase():
+        line_res_fig = cached_figure('crime.tendencia_resolucio', resolution_pct, build)
+    return {"data": resolution_pct, "fig": line_res_fig}
+
+
+def canton_category_view(cube, top_cantons=TOP_CANTONS):
+    """Secció 8: delictes per cantó i categoria."""
+    cantonal = cube.exclude('Canto_norm', NACIONAL)
+    cantons_cat = cantonal.limit(
+        cantonal.totals(['Canto_norm', 'Categorie']), 'Canto_norm', top_cantons, RESTA_CANTONS
+    )
+
+    def build():
+        bar_canton_fig = px.bar(
+            cantons_cat,
+            x='Canto_norm',
+            y='Nombre_de_Delictes',
+            color='Categorie',
+            text='Nombre_de_Delictes'
+        )
+        bar_canton_fig.update_layout(barmode='stack', xaxis_tickangle=-45)
+        return bar_canton_fig
+
+    with figure_phase():
+        bar_canton_fig = cached_figure('crime.cantons', cantons_cat, build)
+    return {"data": cantons_cat, "fig": bar_canton_fig}
+
+
+def correlation_view(cube):
+    """Secció 9: correlació entre característiques socioeconòmiques i delictes."""
+    corr_df = cube.canton_profile().corr()
+
+    def build():
+        heatmap_fig = px.imshow(
+            corr_df,
+            text_auto=True,
+            color_continuous_scale='RdBu_r',
+            zmin=-1, zmax=1,
+            labels=dict(x="Variable", y="Variable", color="Correlació"),
+        )
+        return heatmap_fig
+
+    with figure_phase():
+        heatmap_fig = cached_figure('crime.correlacio', corr_df, build)
+    return {"data": corr_df, "fig": heatmap_fig}
+
+
+def bubble_view(cube):
+    """Secció 10: característiques socioeconòmiques i tendències per categoria."""
+    bubble_data = cube.with_attributes(
+        cube.totals(['Any','Categorie','Canto_norm'])
+    )
+
+    def build():
+        bubble_fig = animated_scatter(
+            bubble_data,
+            x='PIB_per_Capita',
+            y='Nombre_de_Delictes',
+            size='Poblacio_Total',
+            color='Categorie',   # 👈 color discret
+            animation_frame='Any',
+            hover_name='Canto_norm',
+            facet_col='Categorie',
+            size_max=40,
+            labels={
+                'Nombre_de_Delictes':'Delictes',
+                'PIB_per_Capita':'PIB per càpita'
+            }
+        )
+        return bubble_fig
+
+    with figure_phase():
+        bubble_fig = cached_figure('crime.bombolles', bubble_data, build)
+    return {"data": bubble_data, "fig": bubble_fig}
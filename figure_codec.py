@@ -0,0 +1,128 @@
+"""Figures de Plotly ja serialitzades, amb arrays numèrics compactes.
+
+``st.plotly_chart`` converteix cada figura a diccionari i a JSON a cada
+rerun. Una ``EncodedFigure`` guarda el diccionari i el JSON ja fets, amb els
+arrays numèrics com a arrays tipats de Plotly (``{"dtype", "bdata"}`` en
+base64) amb el tipus més petit que conserva els valors, en lloc de llistes
+de números en text. ``figure()`` en construeix la ``go.Figure`` un sol cop
+per procés; en enviar-la, Streamlit no la torna a validar.
+"""
+import base64
+import json
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Llistes més curtes es deixen tal qual: el base64 no hi guanya res
+MIN_TYPED_LENGTH = 8
+# Tipus que accepta plotly.js per als arrays tipats
+TYPED_DTYPES = {"i1", "u1", "i2", "u2", "i4", "u4", "f4", "f8"}
+# Atributs que no són arrays de dades de Plotly: les coordenades del GeoJSON
+# han de ser llistes
+PLAIN_KEYS = {"geojson"}
+
+
+def _encode_array(values):
+    """Array tipat de Plotly per a ``values`` (enters o decimals, 1 o 2 dimensions)."""
+    # charts importa plotly.express: només quan es codifica una figura (vegeu startup)
+    from charts import typed_array
+
+    values = typed_array(values)
+    if values.dtype == np.float64:
+        narrow = values.astype(np.float32)
+        # float32 només si cap valor no canvia
+        if np.array_equal(narrow.astype(np.float64), values, equal_nan=True):
+            values = narrow
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+    dtype = values.dtype.str[1:]
+    if dtype not in TYPED_DTYPES:
+        values, dtype = values.astype("<f8"), "f8"
+    spec = {"dtype": dtype, "bdata": base64.b64encode(values.tobytes()).decode("ascii")}
+    if values.ndim > 1:
+        spec["shape"] = ",".join(map(str, values.shape))
+    return spec
+
+
+def _decode_array(spec):
+    values = np.frombuffer(base64.b64decode(spec["bdata"]), dtype=np.dtype(spec["dtype"]).newbyteorder("<"))
+    if "shape" in spec:
+        values = values.reshape([int(n) for n in str(spec["shape"]).split(",")])
+    return values
+
+
+def _numeric(values):
+    """``values`` com a array numèric si és una llista (o matriu) de números, si no ``None``."""
+    if len(values) < MIN_TYPED_LENGTH:
+        return None
+    first = values[0]
+    if isinstance(first, list):
+        if not first or any(not isinstance(row, list) or len(row) != len(first) for row in values):
+            return None
+        sample = first[0]
+    else:
+        sample = first
+    if isinstance(sample, bool) or not isinstance(sample, (int, float)):
+        return None
+    try:
+        array = np.array(values)
+    except (ValueError, OverflowError):
+        return None
+    return array if array.dtype.kind in "iuf" and array.ndim <= 2 else None
+
+
+def compact(value):
+    """Còpia de ``value`` (part d'un diccionari de figura) amb els arrays numèrics tipats."""
+    if isinstance(value, dict):
+        if "bdata" in value and value.get("dtype") in TYPED_DTYPES:
+            return _encode_array(_decode_array(value))
+        return {key: item if key in PLAIN_KEYS else compact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        array = _numeric(value)
+        if array is not None:
+            return _encode_array(array)
+        return [compact(item) for item in value]
+    return value
+
+
+class EncodedFigure:
+    """Figura serialitzada una sola vegada: el diccionari compacte (``spec``) i el seu JSON.
+
+    No és una ``go.Figure``: a ``st.plotly_chart`` se li passa ``figure()``.
+    """
+
+    __slots__ = ("spec", "json", "_figure")
+
+    def __init__(self, spec, json_text=None):
+        self.spec = spec
+        self.json = json_text or pio.to_json(spec, validate=False)
+        self._figure = None
+
+    def figure(self):
+        """``go.Figure`` amb el mateix contingut, construïda un sol cop i compartida.
+
+        Streamlit no torna a validar una ``go.Figure`` (un diccionari sí, a
+        cada rerun). Els arrays numèrics hi queden tipats, com en una figura
+        llegida amb ``plotly.io.from_json``. No s'ha de modificar: per editar-la,
+        ``go.Figure(fig.figure())``.
+        """
+        if self._figure is None:
+            self._figure = go.Figure(self.spec)
+        return self._figure
+
+    def __reduce__(self):
+        return (EncodedFigure, (self.spec, self.json))
+
+    def __repr__(self):
+        return f"EncodedFigure({len(self.spec.get('data', []))} traços, {len(self.json)} bytes)"
+
+
+def encode_figure(fig):
+    """``EncodedFigure`` de ``fig`` (una ``go.Figure`` o el seu diccionari)."""
+    if isinstance(fig, EncodedFigure):
+        return fig
+    spec = json.loads(pio.to_json(fig, validate=False))
+    for trace in spec.get("data", []):
+        trace.pop("uid", None)
+    spec = {key: compact(value) if key in ("data", "frames") else value for key, value in spec.items()}
+    return EncodedFigure(spec)
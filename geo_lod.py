@@ -0,0 +1,266 @@
+"""GeoJSON de cantons simplificat a diversos nivells de detall.
+
+A partir de ``switzerland.geojson`` es generen versions més lleugeres per al
+mapa coroplètic d'app2:
+
+* les coordenades es quantitzen a una graella de ``precision`` decimals;
+* les fronteres es simplifiquen amb Douglas-Peucker arc per arc, de manera
+  que un tram compartit entre dos cantons se simplifica exactament igual a
+  tots dos costats (no apareixen forats ni solapaments);
+* només es conserva la propietat ``name`` (es descarten ``cartodb_id``,
+  ``created_at`` i ``updated_at``), traduïda als noms de ``Canto_norm``.
+
+Els nivells es guarden a ``.cache/geo/<hash>/`` i només es regeneren si
+canvia el fitxer font. ``python geo_lod.py`` els genera i comprova que tots
+els valors de ``Canto_norm`` tenen geometria.
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from settings import file_hash
+
+SOURCE = "switzerland.geojson"
+CACHE_DIR = Path(".cache") / "geo"
+
+# Nom del nivell -> tolerància de simplificació (graus) i decimals
+LEVELS = {
+    "alt": {"tolerance": 0.0, "precision": 3},
+    "mitjà": {"tolerance": 0.004, "precision": 3},
+    "baix": {"tolerance": 0.012, "precision": 2},
+}
+AUTO = "Automàtic"
+
+# Noms del GeoJSON -> noms de Canto_norm al dataset
+NAME_ALIASES = {
+    "Zürich": "Zurich",
+    "Luzern": "Lucerne",
+    "Graubünden": "Graubunden",
+    "Neuchâtel": "Neuchatel",
+    "Genève": "Geneva",
+}
+
+# Files del dataset que no són cantons
+NON_CANTONS = ("Switzerland",)
+
+
+def _polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    return geometry["coordinates"]
+
+
+def _quantize(ring, scale):
+    """Anells a enters de la graella, sense punts consecutius repetits."""
+    out = []
+    for x, y in ring:
+        p = (int(round(x * scale)), int(round(y * scale)))
+        if not out or out[-1] != p:
+            out.append(p)
+    if len(out) > 1 and out[0] == out[-1]:
+        out.pop()
+    return out
+
+
+def _douglas_peucker(points, tolerance):
+    """Punts conservats d'una polilínia oberta (extrems sempre inclosos)."""
+    pts = np.asarray(points, dtype=float)
+    n = len(pts)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = pts[start], pts[end]
+        seg = pts[start + 1:end]
+        d = b - a
+        norm = np.hypot(*d)
+        if norm == 0:
+            dist = np.hypot(*(seg - a).T)
+        else:
+            dist = np.abs(d[0] * (seg[:, 1] - a[1]) - d[1] * (seg[:, 0] - a[0])) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return [points[i] for i in np.flatnonzero(keep)]
+
+
+def _junctions(rings):
+    """Punts on es troben o se separen anells diferents (nusos de la topologia)."""
+    neighbours = {}
+    junctions = set()
+    for ring in rings:
+        n = len(ring)
+        for i, p in enumerate(ring):
+            pair = frozenset((ring[i - 1], ring[(i + 1) % n]))
+            seen = neighbours.setdefault(p, pair)
+            if seen != pair:
+                junctions.add(p)
+    return junctions
+
+
+def _simplify_arc(arc, tolerance, cache):
+    """Simplifica un arc de forma canònica, independent del sentit de recorregut."""
+    key = tuple(arc)
+    if key in cache:
+        return cache[key]
+    reverse = tuple(reversed(arc))
+    canonical = min(key, reverse)
+    if arc[0] == arc[-1]:
+        # Arc tancat: es parteix pel punt més llunyà de l'inici
+        pts = np.asarray(canonical[:-1], dtype=float)
+        far = int(np.argmax(np.hypot(*(pts - pts[0]).T)))
+        simplified = (
+            _douglas_peucker(list(canonical[:far + 1]), tolerance)
+            + _douglas_peucker(list(canonical[far:]), tolerance)[1:]
+        )
+    else:
+        simplified = _douglas_peucker(list(canonical), tolerance)
+        if len(simplified) == 2 and len(canonical) > 2:
+            # Mai no es redueix un arc a un segment recte: dos arcs amb els
+            # mateixos nusos quedarien superposats
+            pts = np.asarray(canonical, dtype=float)
+            a, b = pts[0], pts[-1]
+            d = b - a
+            dist = np.abs(d[0] * (pts[:, 1] - a[1]) - d[1] * (pts[:, 0] - a[0]))
+            simplified = [canonical[0], canonical[int(np.argmax(dist))], canonical[-1]]
+    cache[canonical] = simplified
+    cache[reverse if canonical == key else key] = simplified[::-1]
+    return cache[key]
+
+
+def _simplify_ring(ring, junctions, tolerance, cache):
+    cut = [i for i, p in enumerate(ring) if p in junctions]
+    if not cut:
+        # Anell aïllat: s'hi entra pel punt mínim perquè el resultat sigui estable
+        start = ring.index(min(ring))
+        rotated = ring[start:] + ring[:start]
+        return _simplify_arc(rotated + [rotated[0]], tolerance, cache)
+    rotated = ring[cut[0]:] + ring[:cut[0]]
+    cut = [i - cut[0] for i in cut] + [len(ring)]
+    closed = rotated + [rotated[0]]
+    out = [closed[0]]
+    for start, end in zip(cut[:-1], cut[1:]):
+        out.extend(_simplify_arc(closed[start:end + 1], tolerance, cache)[1:])
+    return out
+
+
+def simplify(geojson, tolerance, precision):
+    """Retorna una còpia de ``geojson`` quantitzada i simplificada."""
+    scale = 10 ** precision
+    shapes = []
+    for feature in geojson["features"]:
+        polygons = [[_quantize(ring, scale) for ring in polygon]
+                    for polygon in _polygons(feature["geometry"])]
+        shapes.append(polygons)
+    rings = [ring for polygons in shapes for polygon in polygons for ring in polygon
+             if len(ring) >= 3]
+    junctions = _junctions(rings)
+    cache = {}
+
+    features = []
+    for feature, polygons in zip(geojson["features"], shapes):
+        coordinates = []
+        for polygon in polygons:
+            out_polygon = []
+            for k, ring in enumerate(polygon):
+                if len(ring) < 3:
+                    continue
+                if tolerance > 0:
+                    simple = _simplify_ring(ring, junctions, tolerance * scale, cache)
+                else:
+                    simple = ring + [ring[0]]
+                if len(simple) < 4:
+                    if k > 0:
+                        continue  # forat degenerat
+                    simple = ring + [ring[0]]
+                out_polygon.append([[x / scale, y / scale] for x, y in simple])
+            if out_polygon:
+                coordinates.append(out_polygon)
+        name = feature["properties"]["name"]
+        features.append({
+            "type": "Feature",
+            "properties": {"name": NAME_ALIASES.get(name, name)},
+            "geometry": {"type": "MultiPolygon", "coordinates": coordinates},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def build_levels(path=SOURCE):
+    with open(path, encoding="utf-8") as f:
+        geojson = json.load(f)
+    return {
+        level: simplify(geojson, spec["tolerance"], spec["precision"])
+        for level, spec in LEVELS.items()
+    }
+
+
+def load_level(level, path=SOURCE, cache_dir=CACHE_DIR):
+    """GeoJSON del nivell ``level``, generant i desant tots els nivells si cal."""
+    target = Path(cache_dir) / file_hash(path)[:16]
+    fname = target / f"{level}.geojson"
+    if not fname.exists():
+        levels = build_levels(path)
+        try:
+            target.mkdir(parents=True, exist_ok=True)
+            for name, data in levels.items():
+                fd, tmp = tempfile.mkstemp(dir=target, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp, target / f"{name}.geojson")
+        except OSError:
+            pass
+        return levels[level]
+    with open(fname, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def missing_names(geojson, names, ignore=NON_CANTONS):
+    """Valors de ``names`` sense cap ``properties.name`` coincident al GeoJSON."""
+    available = {f["properties"]["name"] for f in geojson["features"]}
+    return sorted(set(names) - available - set(ignore))
+
+
+def subset(geojson, names):
+    """Només les geometries de ``names`` (la resta no cal enviar-les al navegador)."""
+    names = set(names)
+    return {
+        "type": "FeatureCollection",
+        "features": [f for f in geojson["features"] if f["properties"]["name"] in names],
+    }
+
+
+def auto_level(n_locations):
+    """Nivell més lleuger adequat a la vista: més detall com menys cantons."""
+    if n_locations <= 1:
+        return "alt"
+    if n_locations <= 6:
+        return "mitjà"
+    return "baix"
+
+
+if __name__ == "__main__":
+    from crime_store import load_crime_data
+
+    names = load_crime_data()["Canto_norm"].unique()
+    failed = False
+    for level in LEVELS:
+        data = load_level(level)
+        size = len(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+        points = sum(len(r) for f in data["features"]
+                     for p in f["geometry"]["coordinates"] for r in p)
+        missing = missing_names(data, names)
+        print(f"{level}: {points} punts, {size / 1024:.0f} KB")
+        if missing:
+            print(f"  cantons sense geometria: {', '.join(missing)}")
+            failed = True
+    sys.exit(1 if failed else 0)
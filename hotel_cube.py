@@ -0,0 +1,136 @@
+"""Cub pre-agregat de les reserves hoteleres (app.py).
+
+Es construeix amb una sola passada (un ``groupby``) en carregar les dades:
+una fila per combinació observada de les dimensions del dashboard amb el
+nombre de reserves, la suma i el recompte de la tarifa i la suma de nits.
+Totes les seccions d'app.py, menys la dispersió reserva a reserva i la
+tendència diària (``hotel_daily``), surten d'aquí, i els filtres del sidebar
+(tipus d'hotel, rang de mesos) només tallen les cel·les del cub en lloc de
+recórrer totes les reserves. Filtres i agregacions passen pel backend de
+``query``.
+"""
+import pandas as pd
+
+from query import get_backend
+from settings import MONTH_ORDER
+
+LEAD_BINS = [0, 7, 14, 30, 60, 90, 180, 365]
+LEAD_LABELS = ["0–7", "8–14", "15–30", "31–60", "61–90", "91–180", "181–365"]
+
+DIMENSIONS = [
+    'Tipus_Hotel', 'Mes', 'Segment_Mercat', 'Canal', 'Tipus_Viatge', 'Cancel·lada',
+    'Dies_Abans_Cat', 'Adults', 'Nens',
+]
+# Mesures per cel·la: nom al cub -> (columna origen, funció)
+MEASURES = {
+    'Nombre': ('Tarifa', 'size'),
+    'Tarifa_suma': ('Tarifa', 'sum'),
+    'Tarifa_n': ('Tarifa', 'count'),
+    'Nits_suma': ('Durada_Estada', 'sum'),
+}
+
+
+def lead_bins(lead_time):
+    """Franges d'antelació (interval tancat per la dreta; fora de rang, nul)."""
+    return pd.cut(lead_time, bins=LEAD_BINS, labels=LEAD_LABELS)
+
+
+def month_range(months):
+    """Mesos de calendari entre ``months[0]`` i ``months[1]`` (inclosos)."""
+    lo, hi = MONTH_ORDER.index(months[0]), MONTH_ORDER.index(months[1])
+    return MONTH_ORDER[lo:hi + 1]
+
+
+def filter_bookings(df, hotels=None, months=None):
+    """Reserves una a una amb els mateixos filtres que ``BookingCube.filter``."""
+    mask = _filter_mask(df, hotels, months)
+    return df if mask.all() else df[mask].reset_index(drop=True)
+
+
+def _filter_mask(frame, hotels, months):
+    isin = {}
+    if hotels is not None:
+        isin['Tipus_Hotel'] = hotels
+    if months is not None:
+        isin['Mes'] = month_range(months)
+    return get_backend().mask(frame, isin=isin)
+
+
+def booking_filter_key(hotels, months):
+    """Estat normalitzat dels filtres del sidebar d'app.py."""
+    return (tuple(sorted(hotels)), months[0], months[1])
+
+
+class BookingCube:
+    """Reserves agregades per ``DIMENSIONS``; una cel·la per combinació observada."""
+
+    def __init__(self, cells, hotels):
+        self.cells = cells
+        # Tipus d'hotel en ordre d'aparició a les dades (ordre dels pastissos)
+        self.hotels = list(hotels)
+
+    @classmethod
+    def from_bookings(cls, df):
+        rows = df.assign(Dies_Abans_Cat=lead_bins(df['Dies_Abans']))
+        cells = (
+            rows.groupby(DIMENSIONS, observed=True, dropna=False, sort=False)
+            .agg(**MEASURES)
+            .reset_index()
+        )
+        return cls(cells, pd.unique(df['Tipus_Hotel']))
+
+    def __len__(self):
+        return len(self.cells)
+
+    @property
+    def bookings(self):
+        return int(self.cells['Nombre'].sum())
+
+    # ---------- Filtres ----------
+    def filter(self, hotels=None, months=None):
+        """Cub restringit als tipus d'hotel i al rang de mesos (en ordre de calendari)."""
+        cells = self.cells
+        mask = _filter_mask(cells, hotels, months)
+        if mask.all():
+            return self
+        hotels_kept = [h for h in self.hotels if hotels is None or h in hotels]
+        return BookingCube(cells[mask], hotels_kept)
+
+    # ---------- Agregacions ----------
+    def count(self, by, observed=True):
+        """Nombre de reserves per ``by`` (com ``groupby(by).size()``)."""
+        return self._group_sum(by, ['Nombre'], observed)['Nombre']
+
+    def sum(self, measure, by):
+        return self._group_sum(by, [measure])[measure]
+
+    def mean(self, measure, by):
+        """Mitjana de la columna original de ``measure`` (``Tarifa`` o ``Nits``) per ``by``."""
+        count = 'Tarifa_n' if measure == 'Tarifa' else 'Nombre'
+        grouped = self._group_sum(by, [f'{measure}_suma', count])
+        return grouped[f'{measure}_suma'] / grouped[count]
+
+    def _group_sum(self, by, columns, observed=True):
+        """Sumes de ``columns`` per ``by``, indexades per ``by`` (com ``groupby(by)[columns].sum()``)."""
+        return get_backend().group_sum(self.cells, by, columns, observed=observed).set_index(by)
+
+    def totals(self):
+        """Totals de totes les cel·les: reserves, cancel·lades, tarifa i nits."""
+        cells = self.cells
+        cancelled = cells['Cancel·lada'] == 'Cancel·lada'
+        return {
+            'Nombre': cells['Nombre'].sum(),
+            'Cancel·lades': cells.loc[cancelled, 'Nombre'].sum(),
+            'Tarifa_suma': cells['Tarifa_suma'].sum(),
+            'Tarifa_n': cells['Tarifa_n'].sum(),
+            'Nits_suma': cells['Nits_suma'].sum(),
+        }
+
+    def kpis(self):
+        """Indicadors clau: % de cancel·lacions, tarifa mitjana, estada mitjana i RevPAR."""
+        totals = self.totals()
+        cancel_rate = round(totals['Cancel·lades']/totals['Nombre']*100,1)
+        avg_tarifa = round(totals['Tarifa_suma']/totals['Tarifa_n'],2)
+        avg_stay = round(totals['Nits_suma']/totals['Nombre'],1)
+        rev_par = round(avg_tarifa * (1 - cancel_rate/100),2)
+        return {"cancel_rate": cancel_rate, "avg_tarifa": avg_tarifa, "avg_stay": avg_stay, "rev_par": rev_par}
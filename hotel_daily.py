@@ -0,0 +1,147 @@
+"""Sèrie diària de reserves per data d'arribada (app.py).
+
+L'estacionalitat del cub només té el nom del mes (``Mes``), sumat entre anys.
+Aquí la data d'arribada es construeix amb l'any, el mes i el dia de cada
+reserva, i en una sola passada (``np.bincount``) les reserves s'agreguen en
+arrays densos d'una fila per tipus d'hotel i una columna per dia, del primer
+a l'últim dia del dataset (els dies sense arribades hi són amb zeros).
+
+Les finestres mòbils (7 i 30 dies) de taxa de cancel·lació, tarifa mitjana i
+pèrdua per cancel·lacions surten de sumes acumulades: la suma d'una finestra
+és la diferència de dos acumulats, de manera que el cost és lineal en el
+nombre de dies sigui quina sigui la mida de la finestra. Els filtres del
+sidebar només seleccionen files i posen a zero els dies dels mesos exclosos;
+les finestres que en toquen algun queden a NaN, com les incompletes.
+"""
+import numpy as np
+import pandas as pd
+
+from hotel_cube import month_range
+from settings import MONTH_ORDER
+
+WINDOWS = (7, 30)
+# Indicadors de les finestres: nom -> (numerador, denominador, factor)
+METRICS = {
+    "Cancel·lacions (%)": ('Cancel·lades', 'Nombre', 100),
+    "Tarifa mitjana (€)": ('Tarifa_suma', 'Tarifa_n', 1),
+    "Pèrdua per cancel·lacions (€)": ('Perdua', None, 1),
+}
+
+
+def arrival_dates(df):
+    """Data d'arribada de cada reserva (``datetime64[D]``) a partir d'``Any``, ``Mes`` i ``Dia``."""
+    mes = df['Mes'].array
+    # Número de mes (0-11) de cada categoria, indexat pels codis
+    month_of = np.array([MONTH_ORDER.index(name) for name in mes.categories], dtype=np.int64)
+    months = (df['Any'].to_numpy(np.int64) - 1970) * 12 + month_of[mes.codes]
+    days = df['Dia'].to_numpy(np.int64) - 1
+    return months.astype('datetime64[M]').astype('datetime64[D]') + days
+
+
+def window_sums(values, window):
+    """Suma de cada finestra de ``window`` dies que acaba a cada dia (per fila).
+
+    Amb sumes acumulades: ``S[d] - S[d - window]``. Els primers ``window - 1``
+    dies no tenen la finestra completa i queden a NaN.
+    """
+    totals = np.cumsum(values, axis=1, dtype=np.float64)
+    sums = totals.copy()
+    sums[:, window:] -= totals[:, :-window]
+    sums[:, :window - 1] = np.nan
+    return sums
+
+
+class DailySeries:
+    """Mesures per (tipus d'hotel, dia d'arribada) en arrays densos ``(hotels, dies)``."""
+
+    def __init__(self, start, values, hotels, days=None):
+        self.start = start
+        self.values = values
+        # Tipus d'hotel en ordre d'aparició a les dades, com a ``BookingCube``
+        self.hotels = list(hotels)
+        # Dies dins dels mesos seleccionats (None: tots)
+        self.days = days
+
+    @classmethod
+    def from_bookings(cls, df):
+        dates = arrival_dates(df)
+        start = dates.min()
+        n_days = int((dates.max() - start) // np.timedelta64(1, 'D')) + 1
+        hotels = list(pd.unique(df['Tipus_Hotel']))
+        row = pd.Categorical(df['Tipus_Hotel'], categories=hotels).codes.astype(np.int64)
+        cell = row * n_days + (dates - start).astype(np.int64)
+
+        cancelled = (df['Cancel·lada'] == 'Cancel·lada').to_numpy()
+        tarifa = df['Tarifa'].to_numpy(np.float64)
+        priced = ~np.isnan(tarifa)
+        tarifa = np.where(priced, tarifa, 0.0)
+
+        def total(weights=None):
+            return np.bincount(cell, weights, minlength=len(hotels) * n_days).reshape(len(hotels), n_days)
+
+        # La pèrdua és la tarifa de les cancel·lades, com a ``hotel_views.cancel_loss_view``
+        values = {
+            'Nombre': total(),
+            'Cancel·lades': total(cancelled),
+            'Tarifa_suma': total(tarifa),
+            'Tarifa_n': total(priced),
+            'Perdua': total(np.where(cancelled, tarifa, 0.0)),
+        }
+        return cls(start, values, hotels)
+
+    def __len__(self):
+        return self.values['Nombre'].shape[1]
+
+    def dates(self):
+        return self.start + np.arange(len(self), dtype=np.int64).astype('timedelta64[D]')
+
+    # ---------- Filtres ----------
+    def filter(self, hotels=None, months=None):
+        """Sèrie restringida als tipus d'hotel i al rang de mesos (en ordre de calendari)."""
+        rows = [i for i, h in enumerate(self.hotels) if hotels is None or h in hotels]
+        values = {name: v[rows] for name, v in self.values.items()}
+        days = self.days
+        if months is not None:
+            selected = [MONTH_ORDER.index(m) for m in month_range(months)]
+            if len(selected) < len(MONTH_ORDER):
+                month = self.dates().astype('datetime64[M]').astype(np.int64) % 12
+                days = np.isin(month, selected) if days is None else days & np.isin(month, selected)
+                values = {name: np.where(days, v, 0) for name, v in values.items()}
+        return DailySeries(self.start, values, [self.hotels[i] for i in rows], days)
+
+    # ---------- Finestres mòbils ----------
+    def rolling(self, metric, window):
+        """``metric`` (clau de ``METRICS``) en finestres de ``window`` dies, ``(hotels, dies)``.
+
+        Les taxes són quocients de sumes de la finestra (no mitjanes de taxes
+        diàries). El valor és NaN sense reserves a la finestra i quan la
+        finestra és incompleta: als primers dies del dataset o quan inclou
+        algun dia fora dels mesos seleccionats (al principi de cada rang de
+        mesos, cada any).
+        """
+        numerator, denominator, factor = METRICS[metric]
+        result = window_sums(self.values[numerator], window) * factor
+        if denominator is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = result / window_sums(self.values[denominator], window)
+            result[~np.isfinite(result)] = np.nan
+        if self.days is not None:
+            # Dies exclosos dins de cada finestra (també compta el mateix dia)
+            excluded = window_sums((~self.days)[np.newaxis], window)[0]
+            result[:, excluded != 0] = np.nan
+        return result
+
+    def frame(self, metric, windows=WINDOWS):
+        """Taula llarga per al gràfic: una fila per (finestra, tipus d'hotel, dia)."""
+        dates = self.dates()
+        parts = []
+        for window in windows:
+            values = self.rolling(metric, window)
+            for i, hotel in enumerate(self.hotels):
+                parts.append(pd.DataFrame({
+                    'Data': dates,
+                    'Tipus_Hotel': hotel,
+                    'Finestra': f"{window} dies",
+                    metric: values[i],
+                }))
+        return pd.concat(parts, ignore_index=True)
@@ -0,0 +1,66 @@
+"""Càrrega i preprocés del dataset de reserves hoteleres (app.py).
+
+Només es llegeixen les columnes que fa servir el dashboard, amb tipus
+compactes explícits, i es fan una sola vegada el canvi de noms, les
+traduccions de categories i la neteja de nuls.
+"""
+import pandas as pd
+
+from settings import HOTEL_SOURCE as SOURCE
+
+# Columna original -> (nom al dashboard, tipus)
+COLUMNS = {
+    'hotel': ('Tipus_Hotel', 'category'),
+    'is_canceled': ('Cancel·lada', 'int8'),
+    'lead_time': ('Dies_Abans', 'int16'),
+    'adr': ('Tarifa', 'float64'),
+    'adults': ('Adults', 'int16'),
+    'children': ('Nens', 'float32'),
+    'distribution_channel': ('Canal', 'category'),
+    'market_segment': ('Segment_Mercat', 'category'),
+    'trip_type': ('Tipus_Viatge', 'category'),
+    'arrival_date_year': ('Any', 'int16'),
+    'arrival_date_month': ('Mes', 'category'),
+    'arrival_date_day_of_month': ('Dia', 'int8'),
+    'stays_in_week_nights': ('stays_in_week_nights', 'int16'),
+    'stays_in_weekend_nights': ('stays_in_weekend_nights', 'int16'),
+}
+
+HOTEL_NAMES = {'Resort Hotel': 'Resort', 'City Hotel': 'Hotel Ciutat'}
+CANCEL_NAMES = {0: 'Check-Out', 1: 'Cancel·lada'}
+
+
+def _sorted_categories(values):
+    """Categòrica amb les categories en ordre alfabètic, com un groupby de text."""
+    values = pd.Series(values)
+    categories = sorted(values.dropna().unique())
+    return pd.Categorical(values, categories=categories)
+
+
+def read_bookings(path=SOURCE):
+    """Llegeix només les columnes usades, amb els tipus de ``COLUMNS``."""
+    return pd.read_csv(
+        path,
+        usecols=list(COLUMNS),
+        dtype={col: dtype for col, (_, dtype) in COLUMNS.items()},
+    )
+
+
+def prepare_bookings(raw):
+    """Aplica els noms, categories i filtres del dashboard a ``raw``."""
+    df = raw.rename(columns={col: name for col, (name, _) in COLUMNS.items()})
+    segment = df['Segment_Mercat']
+    df = df[segment.notna() & (segment != 'undefined') & df['Canal'].notna()]
+    df = df.reset_index(drop=True)
+
+    df['Tipus_Hotel'] = _sorted_categories(df['Tipus_Hotel'].map(HOTEL_NAMES))
+    df['Cancel·lada'] = _sorted_categories(df['Cancel·lada'].map(CANCEL_NAMES))
+    for col in ['Canal', 'Segment_Mercat', 'Tipus_Viatge', 'Mes']:
+        df[col] = df[col].cat.remove_unused_categories()
+    df['Durada_Estada'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
+    return df
+
+
+def load_bookings(path=SOURCE):
+    """Dataset de reserves llest per al dashboard."""
+    return prepare_bookings(read_bookings(path))
@@ -0,0 +1,287 @@
+"""Agregacions i figures de cada secció d'app.py.
+
+Cada funció rep el cub de reserves (``hotel_cube.BookingCube``) ja filtrat i
+retorna les dades derivades i les figures, sense dependre de Streamlit. La
+dispersió antelació-tarifa és l'única que necessita les reserves una a una
+i rep el DataFrame preparat per ``hotel_data``; la tendència diària rep la
+sèrie per data d'arribada de ``hotel_daily``.
+
+Les figures surten de ``cached_figure``: si l'agregat d'entrada no ha
+canviat, es reutilitza la figura ja serialitzada.
+"""
+import pandas as pd
+import plotly.express as px
+
+from charts import DEFAULT_MAX_POINTS, LOD_AUTO, choose_lod_mode, lod_scatter
+from hotel_cube import MONTH_ORDER
+from instrumentation import figure_phase
+from query import get_backend
+from result_cache import cached_figure
+
+# ========================
+# PALETA DE COLORS
+# ========================
+PALETTE = ["#c4002d", "#ffd231", "#2d733c", "#306fbe", "#c78095", "#b34667"]
+# Un dia en mil·lisegons (pas de l'eix de dates de la tendència diària)
+DAY_MS = 86_400_000
+
+
+def kpis_view(cube):
+    """Secció 1: indicadors clau."""
+    return cube.kpis()
+
+
+def cancellation_pies_view(cube):
+    """Secció 2: un pastís de cancel·lacions per tipus d'hotel."""
+    figs = {}
+    for hotel in cube.hotels:
+        # Com value_counts: totes les categories, de més a menys freqüent
+        counts = cube.filter(hotels=[hotel]).count('Cancel·lada', observed=False)
+        df_counts = counts.sort_values(ascending=False).reset_index()
+        df_counts.columns = ['Cancel·lada','Nombre']
+
+        def build():
+            pie = px.pie(
+                df_counts,
+                names='Cancel·lada',
+                values='Nombre',
+                color='Cancel·lada',
+                color_discrete_sequence=["#2d733c", "#c78095"],
+                hole=0.3
+            )
+            pie.update_traces(textinfo='percent+label', textfont_size=14)
+            pie.update_layout(
+                title=f"{hotel}",
+                showlegend=True,
+                margin=dict(t=40, b=0, l=0, r=0)
+            )
+            return pie
+
+        with figure_phase():
+            figs[hotel] = cached_figure('hotel.cancel_pastis', df_counts, build, hotel)
+    return {"figs": figs}
+
+
+def trip_view(cube):
+    """Secció 3: cancel·lacions segons tipus de viatge."""
+    cancel_trip = cube.count(['Tipus_Viatge','Cancel·lada']).reset_index(name='Nombre')
+
+    def build():
+        fig_trip = px.bar(
+            cancel_trip,
+            x='Tipus_Viatge',
+            y='Nombre',
+            color='Cancel·lada',
+            color_discrete_sequence=PALETTE,
+            text='Nombre'
+        )
+        fig_trip.update_layout(barmode='stack', legend_title_text="Estat reserva")
+        return fig_trip
+
+    with figure_phase():
+        fig_trip = cached_figure('hotel.tipus_viatge', cancel_trip, build)
+    return {"data": cancel_trip, "fig": fig_trip}
+
+
+def segment_view(cube):
+    """Secció 4: segments de mercat per tipus d'hotel."""
+    seg_summary = cube.count(['Segment_Mercat','Tipus_Hotel']).reset_index(name='Nombre')
+
+    def build():
+        fig_seg = px.bar(
+            seg_summary,
+            x='Segment_Mercat',
+            y='Nombre',
+            color='Tipus_Hotel',
+            color_discrete_sequence=["#2d733c", "#306fbe"],
+            text='Nombre'
+        )
+        fig_seg.update_layout(barmode='group', legend_title_text="Tipus d'Hotel")
+        return fig_seg
+
+    with figure_phase():
+        fig_seg = cached_figure('hotel.segments', seg_summary, build)
+    return {"data": seg_summary, "fig": fig_seg}
+
+
+def season_view(cube):
+    """Secció 5: tarifa mitjana per mes i tipus d'hotel."""
+    month_summary = cube.mean('Tarifa', ['Mes','Tipus_Hotel']).reset_index(name='Tarifa')
+    month_summary['Mes'] = pd.Categorical(month_summary['Mes'], categories=MONTH_ORDER, ordered=True)
+    month_summary = month_summary.sort_values('Mes')
+
+    def build():
+        fig_area = px.area(
+            month_summary,
+            x='Mes',
+            y='Tarifa',
+            color='Tipus_Hotel',
+            line_group='Tipus_Hotel',
+            color_discrete_sequence=["#2d733c", "#306fbe"],
+            labels={'Mes':'Mes','Tarifa':'Tarifa Mitjana (€)','Tipus_Hotel':'Tipus d\'Hotel'}
+        )
+        return fig_area
+
+    with figure_phase():
+        fig_area = cached_figure('hotel.estacionalitat', month_summary, build)
+    return {"data": month_summary, "fig": fig_area}
+
+
+def daily_view(series, metric):
+    """Tendència diària: ``metric`` en finestres mòbils de 7 i 30 dies per data d'arribada.
+
+    Rep la sèrie diària (``hotel_daily.DailySeries``) ja filtrada.
+    """
+    daily = series.frame(metric)
+
+    def build():
+        fig_daily = px.line(
+            daily,
+            x='Data',
+            y=metric,
+            color='Tipus_Hotel',
+            line_dash='Finestra',
+            color_discrete_sequence=["#2d733c", "#306fbe"],
+            labels={'Data':"Data d'arribada",'Tipus_Hotel':'Tipus d\'Hotel','Finestra':'Finestra mòbil'}
+        )
+        # Cada traç té tots els dies seguits: l'eix x surt del primer dia i d'un pas
+        # d'un dia (en ms) en lloc d'enviar una data per punt
+        fig_daily.update_traces(x=None, x0=str(series.start), dx=DAY_MS, line_width=1.5)
+        fig_daily.update_xaxes(type='date')
+        fig_daily.update_layout(hovermode='x unified')
+        return fig_daily
+
+    with figure_phase():
+        fig_daily = cached_figure('hotel.diari', daily, build, metric)
+    return {"data": daily, "fig": fig_daily}
+
+
+def lead_adr_view(df, mode=LOD_AUTO, max_points=DEFAULT_MAX_POINTS):
+    """Secció 6: antelació vs tarifa, amb nivell de detall segons la mida."""
+    lod_used = choose_lod_mode(len(df)) if mode == LOD_AUTO else mode
+
+    def build():
+        fig, _ = lod_scatter(
+            df,
+            x='Dies_Abans',
+            y='Tarifa',
+            color='Tipus_Hotel',
+            mode=lod_used,
+            max_points=max_points,
+            size='Tarifa',
+            size_max=30,
+            hover_data=['Segment_Mercat','Cancel·lada'],
+            labels={'Dies_Abans':'Dies abans de l\'arribada','Tarifa':'Tarifa (€)'}
+        )
+        return fig
+
+    with figure_phase():
+        fig_scatter_tarifa = cached_figure('hotel.antelacio_tarifa', df, build, lod_used, max_points)
+    return {"fig": fig_scatter_tarifa, "mode": lod_used}
+
+
+def cancel_loss_view(cube):
+    """Cancel·lacions i pèrdua econòmica segons l'antelació de la reserva."""
+    cells = cube.cells
+    # Les franges (Dies_Abans_Cat) ja són una dimensió del cub
+    cells_cancelled = cells[cells['Cancel·lada'] == 'Cancel·lada']
+
+    cancel_agg = (
+        get_backend()
+        .group_sum(cells_cancelled, ['Dies_Abans_Cat', 'Tipus_Hotel'], ['Nombre', 'Tarifa_suma'])
+        .rename(columns={'Tarifa_suma': 'Perdua'})
+    )
+
+    def build():
+        fig_cancel_scatter = px.scatter(
+            cancel_agg,
+            x='Dies_Abans_Cat',
+            y='Nombre',
+            size='Nombre',
+            color='Perdua',
+            facet_col='Tipus_Hotel',
+            size_max=55,
+            color_continuous_scale='Greens',
+            labels={
+                'Dies_Abans_Cat': "Dies abans de l'arribada",
+                'Nombre': "Nombre de cancel·lacions",
+                'Perdua': "Pèrdua econòmica (€)",
+                'Tipus_Hotel': "Tipus d'hotel"
+            }
+        )
+
+        fig_cancel_scatter.update_layout(
+            coloraxis_colorbar=dict(title="Pèrdua (€)"),
+            yaxis_title="Nombre de cancel·lacions",
+            xaxis_title="Antelació de la reserva",
+            margin=dict(t=40)
+        )
+        return fig_cancel_scatter
+
+    with figure_phase():
+        fig_cancel_scatter = cached_figure('hotel.perdua_cancel', cancel_agg, build)
+    return {"data": cancel_agg, "fig": fig_cancel_scatter}
+
+
+def family_view(cube):
+    """Secció 7: distribució d'adults i nens."""
+    family_summary = cube.count(['Adults','Nens']).reset_index(name='Nombre')
+    family_summary['Tipus_Familia'] = family_summary['Adults'].astype(str)+' adults & '+family_summary['Nens'].astype(str)+' nens'
+
+    def build():
+        fig_family = px.treemap(
+            family_summary,
+            path=['Tipus_Familia'],
+            values='Nombre',
+            color='Nombre',
+            color_continuous_scale='Teal'
+        )
+        return fig_family
+
+    with figure_phase():
+        fig_family = cached_figure('hotel.families', family_summary, build)
+    return {"data": family_summary, "fig": fig_family}
+
+
+def channel_view(cube):
+    """Secció 8: tarifa mitjana per canal de distribució."""
+    dist_summary = cube.mean('Tarifa', 'Canal').reset_index(name='Tarifa')
+    dist_summary['Tarifa'] = dist_summary['Tarifa'].round(2)
+
+    def build():
+        fig_dist = px.bar(
+            dist_summary,
+            x='Canal',
+            y='Tarifa',
+            text=dist_summary['Tarifa'].apply(lambda x: f"{x}€"),
+            color='Canal',
+            color_discrete_sequence=PALETTE
+        )
+        fig_dist.update_traces(showlegend=False)
+        fig_dist.update_layout(yaxis_title="Tarifa Mitjana (€)", xaxis_title="Canal")
+        return fig_dist
+
+    with figure_phase():
+        fig_dist = cached_figure('hotel.canals', dist_summary, build)
+    return {"data": dist_summary, "fig": fig_dist}
+
+
+def stay_view(cube):
+    """Secció 10: durada mitjana d'estada per tipus d'hotel i segment."""
+    stay_summary = cube.mean('Nits', ['Tipus_Hotel','Segment_Mercat']).reset_index(name='Durada_Estada')
+
+    def build():
+        fig_stay = px.bar(
+            stay_summary,
+            x='Segment_Mercat',
+            y='Durada_Estada',
+            color='Tipus_Hotel',
+            color_discrete_sequence=["#2d733c", "#306fbe"],
+            text=stay_summary['Durada_Estada'].round(1)
+        )
+        fig_stay.update_layout(barmode='group', yaxis_title="Dies mitjans d'estada")
+        return fig_stay
+
+    with figure_phase():
+        fig_stay = cached_figure('hotel.estada', stay_summary, build)
+    return {"data": stay_summary, "fig": fig_stay}
@@ -0,0 +1,167 @@
+"""Instrumentació opcional del temps i la mida de cada secció dels dashboards.
+
+S'activa amb la variable d'entorn ``VIZ_PROFILE=1`` o amb el paràmetre
+``?debug=1`` a la URL. Per a cada secció es registra el temps de preparació
+de dades, el temps de construcció de figures, la mida del JSON de les
+figures i les files processades. Els registres es mostren en un panell al
+sidebar i s'afegeixen com a línies JSON a ``logs/perf.jsonl`` (o al fitxer
+de ``VIZ_PROFILE_LOG``).
+
+Els constructors de figures marquen la seva part amb ``figure_phase()``;
+fora d'una secció instrumentada no fa res.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from figure_codec import EncodedFigure
+
+ENV_VAR = "VIZ_PROFILE"
+QUERY_PARAM = "debug"
+LOG_PATH = Path(os.environ.get("VIZ_PROFILE_LOG", Path("logs") / "perf.jsonl"))
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+_current = contextvars.ContextVar("viz_profile_record", default=None)
+_log_lock = threading.Lock()
+
+
+def figure_bytes(value):
+    """Mida total del JSON de totes les figures dins de ``value``."""
+    if isinstance(value, EncodedFigure):
+        return len(value.json)
+    if isinstance(value, go.Figure):
+        return len(pio.to_json(value, validate=False))
+    if isinstance(value, dict):
+        return sum(figure_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(figure_bytes(v) for v in value)
+    return 0
+
+
+def _rows(value):
+    data = value.get("data") if isinstance(value, dict) else None
+    return len(data) if hasattr(data, "__len__") else None
+
+
+@contextmanager
+def figure_phase():
+    """Compta el temps del bloc com a construcció de figures de la secció activa."""
+    record = _current.get()
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["figure_s"] += time.perf_counter() - start
+
+
+def note(**fields):
+    """Afegeix camps (p. ex. ``rows``) al registre de la secció activa."""
+    record = _current.get()
+    if record is not None:
+        record.update(fields)
+
+
+def enabled():
+    """Cert si la instrumentació està activada per entorn o per la URL."""
+    if os.environ.get(ENV_VAR, "").lower() in TRUE_VALUES:
+        return True
+    try:
+        import streamlit as st
+        return str(st.query_params.get(QUERY_PARAM, "")).lower() in TRUE_VALUES
+    except Exception:
+        return False
+
+
+def _session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx is not None else None
+    except Exception:
+        return None
+
+
+class Profiler:
+    """Registres d'un rerun; si està desactivat, ``run`` només crida la funció."""
+
+    def __init__(self, app, enabled=False, log_path=LOG_PATH):
+        self.app = app
+        self.enabled = enabled
+        self.log_path = Path(log_path)
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+
+    def run(self, name, build, rows=None, **fields):
+        """Executa ``build()`` com a secció ``name`` i en registra les mesures."""
+        if not self.enabled:
+            return build()
+        record = {"section": name, "figure_s": 0.0, "rows": rows, **fields}
+        token = _current.set(record)
+        start = time.perf_counter()
+        try:
+            value = build()
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+        record["total_s"] = round(total, 5)
+        record["prep_s"] = round(total - record["figure_s"], 5)
+        record["figure_s"] = round(record["figure_s"], 5)
+        record["figure_bytes"] = figure_bytes(value)
+        record["rows_out"] = _rows(value)
+        self.records.append(record)
+        return value
+
+    def flush(self):
+        """Afegeix els registres del rerun al fitxer JSONL."""
+        if not self.enabled or not self.records:
+            return
+        stamp = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        session = _session_id()
+        lines = [
+            json.dumps({"ts": stamp, "app": self.app, "run": self.run_id,
+                        "session": session, **record}, ensure_ascii=False)
+            for record in self.records
+        ]
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with _log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError:
+            pass
+
+    def sidebar_panel(self):
+        """Panell de depuració al sidebar amb les mesures d'aquest rerun."""
+        if not self.enabled:
+            return
+        import pandas as pd
+        import streamlit as st
+
+        with st.sidebar.expander("Rendiment (debug)", expanded=True):
+            if not self.records:
+                st.caption("Cap secció instrumentada en aquest rerun.")
+                return
+            table = pd.DataFrame(self.records).set_index("section")
+            columns = ["prep_s", "figure_s", "total_s", "figure_bytes", "rows", "rows_out"]
+            columns += [c for c in table.columns if c not in columns]
+            st.dataframe(table[columns], use_container_width=True)
+            st.caption(
+                f"Total: {table['total_s'].sum():.3f} s · "
+                f"{table['figure_bytes'].sum() / 1024:.0f} KB de figures · "
+                f"registre a {self.log_path}"
+            )
+
+    def finish(self):
+        self.sidebar_panel()
+        self.flush()
@@ -0,0 +1,332 @@
+"""Prova de càrrega d'app.py i app2.py amb sessions concurrents, sense navegador.
+
+Cada sessió és un ``AppTest`` de Streamlit que executa l'script com ho faria
+el servidor per a un usuari: una primera càrrega i després una seqüència de
+canvis de controls triats a l'atzar amb pesos realistes (rang d'anys, cantó,
+tipus de delicte, mètrica del mapa, obrir o plegar seccions; a app.py, tipus
+d'hotel, rang de mesos i mode de la dispersió). Les sessions d'un procés
+corren en fils i comparteixen les dades i les memòries cau de
+``st.cache_resource``, com les sessions d'un mateix servidor; amb
+``--processes`` es llancen diversos processos independents (com diverses
+rèpliques).
+
+Per a cada nivell de concurrència informa de la latència de rerun (p50, p95 i
+p99, sense la primera càrrega de cada sessió, que es dona a part), el
+rendiment (reruns per segon) i la memòria resident de cada procés a l'inici,
+al final i el pic.
+
+Ús::
+
+    python loadtest.py --app app2 --sessions 1 4 8 --steps 20
+    python loadtest.py --app app --sessions 8 --processes 2 --think 0.5 --out carrega.json
+    python loadtest.py --app app2 --sessions 16 --max-p95 2.0     # codi 1 si p95 > 2 s
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from snapshot import LIVE_KEY, SCRIPTS, SECTION_PREFIX
+
+TIMEOUT = 600
+PERCENTILES = (50, 95, 99)
+
+
+# ---------- Memòria ----------
+def rss_mb():
+    """Memòria resident actual del procés (MB)."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Pic de memòria resident del procés (MB)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux en dona KB; macOS, bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+# ---------- Accions dels usuaris ----------
+def _widget(at, kind, label):
+    return next((w for w in getattr(at, kind) if w.label == label), None)
+
+
+def _toggle_option(widget, rng):
+    """Treu o afegeix una opció d'un multiselect (sempre en queda una)."""
+    if widget is None:
+        return False
+    option = widget.options[rng.integers(len(widget.options))]
+    if option in widget.value and len(widget.value) > 1:
+        widget.unselect(option)
+    else:
+        widget.select(option)
+    return True
+
+
+def _choose(widget, rng, different=True):
+    if widget is None:
+        return False
+    options = [o for o in widget.options if not different or o != widget.value] or widget.options
+    widget.set_value(options[rng.integers(len(options))])
+    return True
+
+
+def _range(widget, rng, values):
+    """Subrang a l'atzar de ``values`` (inclosos els extrems)."""
+    if widget is None:
+        return False
+    lo = int(rng.integers(len(values)))
+    hi = int(rng.integers(lo, len(values)))
+    widget.set_value((values[lo], values[hi]))
+    return True
+
+
+def _years(at, rng):
+    widget = _widget(at, "slider", "Any")
+    if widget is None:
+        return False
+    return _range(widget, rng, list(range(int(widget.min), int(widget.max) + 1)))
+
+
+def _months(at, rng):
+    widget = _widget(at, "select_slider", "Mesos d'arribada")
+    if widget is None:
+        return False
+    return _range(widget, rng, list(widget.options))
+
+
+def _section(at, rng):
+    keys = [key for key in at.session_state if key.startswith(SECTION_PREFIX)]
+    if not keys:
+        return False
+    key = keys[rng.integers(len(keys))]
+    at.session_state[key] = not at.session_state[key]
+    return True
+
+
+def _live(at, rng):
+    if LIVE_KEY not in at.session_state or at.session_state[LIVE_KEY]:
+        return False
+    at.session_state[LIVE_KEY] = True
+    return True
+
+
+# Nom -> (pes, acció); una acció retorna False si el control no és a la pàgina
+ACTIONS = {
+    "app": {
+        "hotels": (0.3, lambda at, rng: _toggle_option(_widget(at, "multiselect", "Tipus d'hotel"), rng)),
+        "mesos": (0.4, _months),
+        "mode_dispersio": (0.2, lambda at, rng: _choose(_widget(at, "selectbox", "Mode de visualització"), rng)),
+        "vista_interactiva": (0.1, _live),
+    },
+    "app2": {
+        "anys": (0.3, _years),
+        "canto": (0.25, lambda at, rng: _choose(_widget(at, "selectbox", "Cantó"), rng)),
+        "delictes": (0.15, lambda at, rng: _toggle_option(_widget(at, "multiselect", "Tipus de delicte"), rng)),
+        "metrica": (0.1, lambda at, rng: _choose(_widget(at, "selectbox", "Mètrica del mapa"), rng)),
+        "seccio": (0.15, _section),
+        "vista_interactiva": (0.05, _live),
+    },
+}
+
+
+def _act(at, rng, actions):
+    """Aplica una acció a l'atzar (segons els pesos) que tingui el control a la pàgina."""
+    names = list(actions)
+    weights = np.array([actions[name][0] for name in names])
+    while names:
+        i = rng.choice(len(names), p=weights / weights.sum())
+        if actions[names[i]][1](at, rng):
+            return names[i]
+        del names[i]
+        weights = np.delete(weights, i)
+    return None
+
+
+# ---------- Sessions ----------
+def share_runtime():
+    """Deixa conviure diversos ``AppTest`` en fils del mateix procés.
+
+    ``AppTest.run`` instal·la un runtime simulat a ``Runtime._instance`` i el
+    torna a posar a ``None`` en acabar, de manera que el run d'una sessió
+    deixaria sense runtime els scripts de les altres que encara corren.
+    Mentre ``_instance`` és ``None`` es fa servir l'últim runtime instal·lat.
+    Només afecta el procés de la prova.
+    """
+    from streamlit.runtime import Runtime
+
+    last = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        if last:
+            return last[0]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    def exists(cls):
+        return cls._instance is not None or bool(last)
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+
+
+def run_session(app, steps, seed, think=0.0, live=False):
+    """Una sessió: primera càrrega i ``steps`` canvis. Retorna ``[(acció, segons, error)]``."""
+    from streamlit.testing.v1 import AppTest
+
+    rng = np.random.default_rng(seed)
+    at = AppTest.from_file(os.path.abspath(SCRIPTS[app]), default_timeout=TIMEOUT)
+    if live:
+        at.session_state[LIVE_KEY] = True
+    samples = []
+
+    def rerun(name):
+        start = time.perf_counter()
+        at.run()
+        error = at.exception[0].value if len(at.exception) else None
+        samples.append((name, time.perf_counter() - start, error))
+
+    rerun("inici")
+    for _ in range(steps):
+        if think:
+            time.sleep(rng.exponential(think))
+        name = _act(at, rng, ACTIONS[app])
+        if name is None:
+            break
+        rerun(name)
+    return samples
+
+
+def run_process(app, sessions, steps, seed, think=0.0, live=False):
+    """``sessions`` sessions concurrents en fils d'aquest procés."""
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings("ignore")
+    # Les dades es carreguen dins de la prova, com en un servidor que arrenca
+    start_rss = rss_mb()
+    if sessions > 1:
+        share_runtime()
+    barrier = threading.Barrier(sessions)
+
+    def session(i):
+        barrier.wait()
+        return run_session(app, steps, seed + i, think, live)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        samples = [s for result in pool.map(session, range(sessions)) for s in result]
+    return {
+        "pid": os.getpid(),
+        "seconds": time.perf_counter() - start,
+        "samples": samples,
+        "rss_start_mb": round(start_rss, 1),
+        "rss_end_mb": round(rss_mb(), 1),
+        "rss_peak_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def _percentiles(values):
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def run_level(app, sessions, processes, steps, seed, think=0.0, live=False):
+    """Resultats d'un nivell de concurrència: ``processes`` processos amb ``sessions`` sessions cadascun."""
+    # Processos nets (spawn): cada un carrega les seves dades, com una rèplica
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(run_process, app, sessions, steps, seed + 1000 * p, think, live)
+                   for p in range(processes)]
+        workers = [f.result() for f in futures]
+    samples = [s for w in workers for s in w["samples"]]
+    reruns = [seconds for name, seconds, _ in samples if name != "inici"]
+    errors = [error for _, _, error in samples if error]
+    actions = {}
+    for name, seconds, _ in samples:
+        actions.setdefault(name, []).append(seconds)
+    wall = max(w["seconds"] for w in workers)
+    return {
+        "sessions": sessions * processes,
+        "processes": processes,
+        "reruns": len(reruns),
+        "latency": _percentiles(reruns),
+        "first_load": _percentiles(actions.get("inici", [])),
+        "throughput": round(len(samples) / wall, 3),
+        "seconds": round(wall, 2),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "actions": {name: {"n": len(values), **_percentiles(values)} for name, values in actions.items()},
+        "processes_rss": [{key: w[key] for key in ("pid", "rss_start_mb", "rss_end_mb", "rss_peak_mb")}
+                          for w in workers],
+    }
+
+
+# ---------- Informe ----------
+def print_report(app, levels, out=sys.stdout):
+    print(f"\n{app}", file=out)
+    print(f"  {'sessions':>8}{'reruns':>8}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}"
+          f"{'reruns/s':>10}{'1a càrrega p95':>16}{'errors':>8}  RSS per procés, MB: inici→final (pic)",
+          file=out)
+    for level in levels:
+        lat, first = level["latency"], level["first_load"]
+        rss = ", ".join(f"{p['rss_start_mb']:.0f}→{p['rss_end_mb']:.0f} ({p['rss_peak_mb']:.0f})"
+                        for p in level["processes_rss"])
+        print(f"  {level['sessions']:>8}{level['reruns']:>8}{_fmt(lat['p50'])}{_fmt(lat['p95'])}"
+              f"{_fmt(lat['p99'])}{level['throughput']:>10.2f}{_fmt(first['p95'], 16)}"
+              f"{level['errors']:>8}  {rss}", file=out)
+        if level["first_error"]:
+            print(f"    primer error: {level['first_error']}", file=out)
+
+
+def _fmt(value, width=10):
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.3f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", choices=list(SCRIPTS), default="app2")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8],
+                        help="sessions concurrents per procés (un nivell per valor)")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=20, help="canvis de controls per sessió")
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="temps mitjà de reflexió entre canvis (s, exponencial)")
+    parser.add_argument("--live", action="store_true",
+                        help="comença en vista en viu (sense instantània estàtica)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="desa els resultats en JSON")
+    parser.add_argument("--max-p95", type=float, help="codi 1 si la p95 d'algun nivell el supera (s)")
+    args = parser.parse_args(argv)
+
+    levels = [run_level(args.app, n, args.processes, args.steps, args.seed, args.think, args.live)
+              for n in args.sessions]
+    print_report(args.app, levels)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"app": args.app, "levels": levels}, f, indent=2, ensure_ascii=False)
+        print(f"\nResultats desats a {args.out}")
+    failed = [level for level in levels if level["errors"]]
+    if args.max_p95 is not None:
+        failed += [level for level in levels
+                   if level["latency"]["p95"] is not None and level["latency"]["p95"] > args.max_p95]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
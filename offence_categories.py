@@ -0,0 +1,67 @@
+"""Categories de delicte definides per una taula de regles declarativa.
+
+Les regles són a ``offence_categories.json``: una llista ordenada de
+categories amb paraules clau. Un tipus de delicte rep la primera categoria
+que té alguna paraula clau continguda en el nom (en minúscules); si cap regla
+coincideix, rep la categoria per defecte. Per afegir o canviar categories
+només cal editar el JSON.
+
+La categoria es calcula una sola vegada per cada tipus de delicte diferent,
+no per fila.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RULES_FILE = Path(__file__).with_name("offence_categories.json")
+
+
+def load_rules(path=RULES_FILE):
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    rules = [
+        (rule["category"], tuple(k.lower() for k in rule["keywords"]))
+        for rule in table["rules"]
+    ]
+    return rules, table.get("default", "Altres")
+
+
+def categorize(offence, rules):
+    """Categoria d'un sol tipus de delicte segons ``rules``."""
+    ordered, default = rules
+    name = offence.lower()
+    for category, keywords in ordered:
+        if any(k in name for k in keywords):
+            return category
+    return default
+
+
+def category_lookup(offences, rules):
+    """Taula ``{tipus de delicte: categoria}`` per a valors únics."""
+    return {offence: categorize(offence, rules) for offence in offences}
+
+
+def categorize_column(offences, rules):
+    """Columna categòrica de categories per a una sèrie de tipus de delicte.
+
+    Si la sèrie ja és categòrica només es classifiquen les seves categories i
+    es reutilitzen els codis; altrament es classifiquen els valors únics.
+    """
+    if isinstance(offences.dtype, pd.CategoricalDtype):
+        names = offences.cat.categories
+        codes = offences.cat.codes.to_numpy()
+    else:
+        codes, names = pd.factorize(offences)
+    lookup = category_lookup(names, rules)
+    labels = sorted(set(lookup.values()))
+    position = {label: i for i, label in enumerate(labels)}
+    mapping = np.array([position[lookup[n]] for n in names], dtype="int8")
+    # Els codis -1 (valors nuls) es mantenen com a nuls
+    category_codes = np.where(codes >= 0, mapping[codes], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(category_codes, categories=labels),
+        index=offences.index,
+        name="Categorie",
+    )
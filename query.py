@@ -0,0 +1,334 @@
+"""Capa de consultes dels dashboards: filtres, agregacions i percentatges.
+
+Els cubs (``crime_cube``, ``hotel_cube``) i les vistes no agrupen ni filtren
+directament amb pandas sinó a través d'un backend amb tres operacions:
+
+* ``mask``: predicat de files (``isin``, rang ``between`` i ``exclude``) com
+  a vector booleà, en l'ordre de la taula;
+* ``group_sum``: sumes per grup, amb el mateix resultat que
+  ``frame.groupby(by, observed=...)[columns].sum().reset_index()``;
+* ``share``: percentatge de cada fila dins del seu grup.
+
+``pandas`` és el backend de referència. ``polars`` i ``duckdb`` són opcionals
+i multifil (fan servir tots els nuclis); els resultats es tornen a pandas
+amb els mateixos tipus, el mateix ordre de grups i, amb ``observed=False``,
+els mateixos grups buits. Es tria amb la variable d'entorn
+``VIZ_QUERY_BACKEND``; si el paquet no hi és, s'avisa i es fa servir pandas.
+
+``python query.py --check`` executa les consultes de les seccions amb cada
+backend disponible sobre els dos datasets i les compara amb pandas (enters
+exactes; decimals amb tolerància relativa de 1e-12, perquè l'ordre de les
+sumes pot canviar l'últim bit). ``python -m pytest tests`` fa la mateixa
+comparació amb ``assert_frame_equal`` sobre mostres petites dels datasets
+(``tests/data``), i també hi prova pivots i casos límit (NaN, ordre de
+categories, tipus enters). Els backends s'instal·len amb
+``pip install -r requirements-backends.txt``; sense el paquet, les proves
+del backend s'ometen.
+"""
+import argparse
+import functools
+import os
+import sys
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+BACKEND_ENV = "VIZ_QUERY_BACKEND"
+DEFAULT_BACKEND = "pandas"
+
+
+def _as_list(by):
+    return [by] if isinstance(by, str) else list(by)
+
+
+def _astype(values, dtype):
+    """``values.astype(dtype)``, també amb l'ordre de les categories de ``dtype``.
+
+    Dues categòriques no ordenades amb les mateixes categories són del mateix
+    tipus per a pandas, i ``astype`` no les reordena.
+    """
+    if isinstance(dtype, pd.CategoricalDtype) and isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.set_categories(dtype.categories, ordered=dtype.ordered)
+    return values.astype(dtype)
+
+
+def _like_pandas(result, frame, by, columns, observed):
+    """Dona a ``result`` l'ordre, els tipus i els grups buits del groupby de pandas."""
+    for col in by:
+        result[col] = _astype(result[col], frame[col].dtype)
+    result = result.sort_values(by, kind="stable", ignore_index=True)
+    categorical = [isinstance(frame[col].dtype, pd.CategoricalDtype) for col in by]
+    if not observed and any(categorical):
+        levels = [
+            frame[col].cat.categories if is_cat else pd.Index(np.sort(pd.unique(result[col])))
+            for col, is_cat in zip(by, categorical)
+        ]
+        if len(by) > 1:
+            full = pd.MultiIndex.from_product(levels, names=by)
+        else:
+            full = pd.Index(levels[0], name=by[0])
+        result = result.set_index(by).reindex(full, fill_value=0).reset_index()
+        for col in by:
+            result[col] = _astype(result[col], frame[col].dtype)
+    expected = frame.iloc[:0].groupby(by, observed=True)[columns].sum().dtypes
+    return result.astype({col: expected[col] for col in columns})
+
+
+class PandasBackend:
+    """Backend de referència: pandas d'un sol fil."""
+
+    name = "pandas"
+
+    def mask(self, frame, isin=None, between=None, exclude=None):
+        mask = np.ones(len(frame), dtype=bool)
+        for col, values in (isin or {}).items():
+            mask &= frame[col].isin(values).to_numpy()
+        for col, (low, high) in (between or {}).items():
+            mask &= frame[col].between(low, high).to_numpy()
+        for col, value in (exclude or {}).items():
+            mask &= (frame[col] != value).to_numpy()
+        return mask
+
+    def group_sum(self, frame, by, columns, observed=True):
+        by, columns = _as_list(by), _as_list(columns)
+        return frame.groupby(by, observed=observed)[columns].sum().reset_index()
+
+    def share(self, frame, by, column):
+        # En decimals: amb enters petits (int8...) ``100 *`` es desbordaria
+        values = frame[column].astype(np.float64)
+        totals = values.groupby([frame[col] for col in _as_list(by)], observed=True).transform("sum")
+        return 100 * values / totals
+
+
+class PolarsBackend:
+    """Polars (columnar, multifil)."""
+
+    name = "polars"
+
+    def __init__(self):
+        import polars as pl
+
+        self.pl = pl
+
+    def _frame(self, frame, columns):
+        return self.pl.from_pandas(frame[list(dict.fromkeys(columns))])
+
+    def _col(self, frame, col):
+        # Les categòriques es comparen pel seu valor, com a pandas
+        expr = self.pl.col(col)
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            expr = expr.cast(self.pl.String)
+        return expr
+
+    def mask(self, frame, isin=None, between=None, exclude=None):
+        isin, between, exclude = isin or {}, between or {}, exclude or {}
+        columns = list(isin) + list(between) + list(exclude)
+        if not columns:
+            return np.ones(len(frame), dtype=bool)
+        pl = self.pl
+        expr = pl.lit(True)
+        for col, values in isin.items():
+            expr &= self._col(frame, col).is_in(list(values))
+        for col, (low, high) in between.items():
+            expr &= self._col(frame, col).is_between(low, high)
+        for col, value in exclude.items():
+            expr &= self._col(frame, col).ne_missing(value)
+        out = self._frame(frame, columns).select(expr.fill_null(False).alias("mask"))
+        return out["mask"].to_numpy()
+
+    def group_sum(self, frame, by, columns, observed=True):
+        by, columns = _as_list(by), _as_list(columns)
+        pl = self.pl
+        result = (
+            self._frame(frame, by + columns)
+            .drop_nulls(by)
+            .group_by(by)
+            .agg([pl.col(col).sum() for col in columns])
+            .to_pandas()
+        )
+        return _like_pandas(result, frame, by, columns, observed)
+
+    def share(self, frame, by, column):
+        by = _as_list(by)
+        pl = self.pl
+        values = pl.col(column).cast(pl.Float64)
+        # Com pandas: les files amb alguna clau nul·la no tenen grup (NaN)
+        keyed = pl.all_horizontal([pl.col(col).is_not_null() for col in by])
+        out = self._frame(frame, by + [column]).select(
+            pl.when(keyed).then(100 * values / values.sum().over(by)).alias("share")
+        )
+        return pd.Series(out["share"].to_numpy(), index=frame.index, name=column, dtype=np.float64)
+
+
+class DuckDBBackend:
+    """DuckDB incrustat (columnar, multifil); una connexió per fil."""
+
+    name = "duckdb"
+
+    def __init__(self):
+        import duckdb
+
+        self.duckdb = duckdb
+        self._local = threading.local()
+
+    def _con(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = self.duckdb.connect()
+        return con
+
+    @staticmethod
+    def _q(name):
+        return '"' + str(name).replace('"', '""') + '"'
+
+    def _col(self, frame, col):
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            return f"CAST({self._q(col)} AS VARCHAR)"
+        return self._q(col)
+
+    def _run(self, frame, columns, sql, params=()):
+        con = self._con()
+        table = frame[list(dict.fromkeys(columns))].reset_index(drop=True)
+        table["__fila"] = np.arange(len(table))
+        con.register("t", table)
+        try:
+            return con.execute(sql, list(params)).df()
+        finally:
+            con.unregister("t")
+
+    def mask(self, frame, isin=None, between=None, exclude=None):
+        isin, between, exclude = isin or {}, between or {}, exclude or {}
+        columns = list(isin) + list(between) + list(exclude)
+        if not columns:
+            return np.ones(len(frame), dtype=bool)
+        terms, params = [], []
+        for col, values in isin.items():
+            terms.append(f"COALESCE(list_contains(?, {self._col(frame, col)}), FALSE)")
+            params.append([v.item() if hasattr(v, "item") else v for v in values])
+        for col, (low, high) in between.items():
+            terms.append(f"COALESCE({self._q(col)} BETWEEN ? AND ?, FALSE)")
+            params += [int(low) if isinstance(low, np.integer) else low,
+                       int(high) if isinstance(high, np.integer) else high]
+        for col, value in exclude.items():
+            terms.append(f"{self._col(frame, col)} IS DISTINCT FROM ?")
+            params.append(value)
+        sql = f"SELECT {' AND '.join(terms)} AS mask FROM t ORDER BY __fila"
+        return self._run(frame, columns, sql, params)["mask"].to_numpy(dtype=bool)
+
+    def group_sum(self, frame, by, columns, observed=True):
+        by, columns = _as_list(by), _as_list(columns)
+        keys = ", ".join(self._q(col) for col in by)
+        # Com pandas, la suma d'un grup sense valors (tot NULL/NaN) és 0
+        sums = ", ".join(f"COALESCE(SUM({self._q(col)}), 0) AS {self._q(col)}" for col in columns)
+        not_null = " AND ".join(f"{self._q(col)} IS NOT NULL" for col in by)
+        sql = f"SELECT {keys}, {sums} FROM t WHERE {not_null} GROUP BY {keys}"
+        result = self._run(frame, by + columns, sql)
+        return _like_pandas(result, frame, by, columns, observed)
+
+    def share(self, frame, by, column):
+        by = _as_list(by)
+        keys = ", ".join(self._q(col) for col in by)
+        keyed = " AND ".join(f"{self._q(col)} IS NOT NULL" for col in by)
+        value = f"CAST({self._q(column)} AS DOUBLE)"
+        # Com pandas: en decimals, i NULL si alguna clau és nul·la
+        sql = (f"SELECT CASE WHEN {keyed} THEN 100 * {value} / SUM({value}) OVER (PARTITION BY {keys}) END "
+               f"AS share FROM t ORDER BY __fila")
+        out = self._run(frame, by + [column], sql)
+        return pd.Series(out["share"].to_numpy(dtype=float), index=frame.index, name=column)
+
+
+BACKENDS = {"pandas": PandasBackend, "polars": PolarsBackend, "duckdb": DuckDBBackend}
+
+
+@functools.cache
+def get_backend(name=None):
+    """Backend ``name`` (per defecte, el de ``VIZ_QUERY_BACKEND``); pandas si no està instal·lat."""
+    name = (name or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de consultes desconegut: {name!r} (opcions: {', '.join(BACKENDS)})")
+    try:
+        return BACKENDS[name]()
+    except ImportError:
+        warnings.warn(f"{name} no està instal·lat: les consultes es fan amb pandas", RuntimeWarning)
+        return PandasBackend()
+
+
+# ---------- Comprovació entre backends ----------
+def _queries():
+    """Consultes de les seccions sobre els dos datasets: ``{nom: funció(backend)}``."""
+    from crime_cube import TOTAL_CASOS
+    from crime_store import load_cube_tables
+    from hotel_cube import BookingCube, MONTH_ORDER
+    from hotel_data import load_bookings
+
+    facts, _, _ = load_cube_tables()
+    rows = load_bookings()
+    cells = BookingCube.from_bookings(rows).cells
+    offences = list(pd.unique(facts["Tipus_de_Delicte"]))[::2]
+    return {
+        "crim/filtre": lambda b: b.mask(facts, isin={"Tipus_de_Delicte": offences},
+                                        between={"Any": (2012, 2018)}),
+        "crim/exclou": lambda b: b.mask(facts, exclude={"Nivell_de_Resolucio": TOTAL_CASOS}),
+        "crim/totals": lambda b: b.group_sum(facts, ["Any", "Tipus_de_Delicte"], "Nombre_de_Delictes"),
+        "crim/taxa": lambda b: b.group_sum(facts, ["Canto_norm", "Any"],
+                                           ["Taxa_suma", "Taxa_n", "Nombre_de_Delictes"]),
+        "crim/percentatge": lambda b: b.share(
+            b.group_sum(facts, ["Any", "Nivell_de_Resolucio"], "Nombre_de_Delictes"),
+            "Any", "Nombre_de_Delictes"),
+        "hotel/filtre": lambda b: b.mask(rows, isin={"Tipus_Hotel": ["Resort"],
+                                                     "Mes": MONTH_ORDER[5:8]}),
+        "hotel/recompte": lambda b: b.group_sum(cells, ["Segment_Mercat", "Tipus_Hotel"], "Nombre"),
+        "hotel/tots": lambda b: b.group_sum(cells, "Cancel·lada", "Nombre", observed=False),
+        "hotel/tarifa": lambda b: b.group_sum(cells, ["Mes", "Tipus_Hotel"], ["Tarifa_suma", "Tarifa_n"]),
+    }
+
+
+def _compare(expected, actual):
+    if isinstance(expected, np.ndarray):
+        np.testing.assert_array_equal(actual, expected)
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(actual, expected, check_exact=False, rtol=1e-12)
+    else:
+        pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-12)
+
+
+def check(names, out=sys.stdout):
+    """Compara cada backend de ``names`` amb pandas; retorna el nombre de diferències."""
+    queries = _queries()
+    reference = PandasBackend()
+    expected = {name: query(reference) for name, query in queries.items()}
+    failures = 0
+    for name in names:
+        try:
+            backend = BACKENDS[name]()
+        except ImportError:
+            print(f"{name}: no instal·lat, s'omet", file=out)
+            continue
+        for query_name, query in queries.items():
+            try:
+                _compare(expected[query_name], query(backend))
+            except AssertionError as exc:
+                failures += 1
+                print(f"{name} {query_name}: DIFERENT\n{exc}", file=out)
+            else:
+                print(f"{name} {query_name}: ok", file=out)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true",
+                        help="compara els backends disponibles amb pandas")
+    parser.add_argument("--backends", nargs="+", choices=[b for b in BACKENDS if b != "pandas"],
+                        default=["polars", "duckdb"])
+    args = parser.parse_args(argv)
+    if not args.check:
+        print(f"Backend actiu: {get_backend().name}")
+        return 0
+    return 1 if check(args.backends) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Memòria cau de resultats per estat de filtres, amb expulsió LRU.
+
+Cada entrada guarda les dades derivades d'una secció i les seves figures ja
+serialitzades a JSON. La clau és l'estat normalitzat dels filtres: el rang
+d'anys, el cantó i el conjunt de delictes (amb un hash independent de
+l'ordre de selecció), més els paràmetres propis de la secció.
+
+Quan se supera el pressupost de memòria o el nombre màxim d'entrades,
+s'expulsen primer les entrades usades fa més temps.
+
+Quan el dataset avança d'estat (anys afegits amb ``crime_store --append``),
+``ResultCache.sync`` només esborra les entrades els filtres de les quals
+cobreixen alguna de les particions (cantó, any) canviades.
+
+Una memòria cau amb nom es pot desar a disc (``save``) per a un estat del
+dataset i recuperar-se en arrencar (``restore``); és el que fa ``warmup.py``
+per evitar que el primer usuari pagui la construcció de la vista per defecte.
+
+Les figures es guarden ja serialitzades i compactes (``figure_codec``); la
+``go.Figure`` de cada una es construeix un sol cop, en enviar-la. A més,
+``cached_figure`` reutilitza, entre reruns i sessions del procés, la figura
+construïda a partir d'un mateix agregat (per hash del contingut) i una
+mateixa especificació del gràfic, encara que l'estat dels filtres sigui un
+altre.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from figure_codec import EncodedFigure, encode_figure
+
+DEFAULT_MAX_BYTES = int(os.environ.get("VIZ_RESULT_CACHE_MB", "256")) * 1024 * 1024
+FIGURE_CACHE_BYTES = int(os.environ.get("VIZ_FIGURE_CACHE_MB", "128")) * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 512
+SNAPSHOT_DIR = Path(".cache") / "results"
+
+
+def offence_set_key(offences):
+    """Hash del conjunt de delictes, independent de l'ordre de selecció."""
+    digest = hashlib.sha1()
+    for offence in sorted(set(map(str, offences))):
+        digest.update(offence.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def filter_key(years, canton, offences):
+    """Estat normalitzat dels filtres del sidebar d'app2 (``canton=None``: tots)."""
+    return (int(years[0]), int(years[1]), canton, offence_set_key(offences))
+
+
+def partition_predicate(pairs):
+    """Cert per a les claus ``(secció, filtres, ...)`` que depenen d'alguna
+    partició ``(cantó, any)`` de ``pairs``."""
+    pairs = {(str(canton), int(year)) for canton, year in pairs}
+    years = {year for _, year in pairs}
+
+    def affected(key):
+        y0, y1, canton = key[1][:3]
+        if canton is None:
+            return any(y0 <= year <= y1 for year in years)
+        return any(c == canton and y0 <= year <= y1 for c, year in pairs)
+    return affected
+
+
+def _size(value):
+    if isinstance(value, EncodedFigure):
+        return len(value.json)
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if isinstance(value, dict):
+        return sum(_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def freeze(value):
+    """Còpia de ``value`` amb les figures serialitzades, tal com es desa a la memòria cau."""
+    if isinstance(value, go.Figure):
+        return encode_figure(value)
+    if isinstance(value, dict):
+        return {k: freeze(v) for k, v in value.items()}
+    return value
+
+
+def content_hash(value):
+    """Hash del contingut d'un agregat (DataFrame, Series, array o valors simples)."""
+    digest = hashlib.sha1()
+
+    def update(item):
+        if isinstance(item, (pd.DataFrame, pd.Series)):
+            frame = item.to_frame() if isinstance(item, pd.Series) else item
+            digest.update(repr([(str(c), str(t)) for c, t in frame.dtypes.items()]).encode())
+            digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+        elif isinstance(item, np.ndarray):
+            digest.update(repr((item.dtype.str, item.shape)).encode())
+            digest.update(np.ascontiguousarray(item).tobytes())
+        elif isinstance(item, (list, tuple)):
+            digest.update(b"[")
+            for part in item:
+                update(part)
+            digest.update(b"]")
+        else:
+            digest.update(repr(item).encode())
+        digest.update(b"\0")
+
+    update(value)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """LRU amb límit d'entrades i de bytes, segura entre fils (sessions)."""
+
+    def __init__(self, name=None, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES,
+                 snapshot_dir=SNAPSHOT_DIR):
+        self.name = name
+        self.snapshot_dir = Path(snapshot_dir)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.state = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = _size(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+
+    def invalidate(self, predicate=None):
+        """Esborra les entrades la clau de les quals compleix ``predicate`` (o totes)."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate is None or predicate(k)]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def sync(self, lineage):
+        """Adapta la memòria cau a l'estat del dataset descrit per ``lineage``.
+
+        ``lineage`` és el de ``crime_store.read_lineage``: la llista d'estats
+        (base i un per afegit) i les particions que va canviar cada afegit.
+        Si l'estat anterior hi apareix, només s'invaliden les entrades
+        afectades pels afegits posteriors; si no, s'invalida tot. Després
+        s'afegeixen les entrades desades a disc per al nou estat, si n'hi ha.
+        """
+        if lineage is None or not lineage["states"]:
+            return
+        state = lineage["states"][-1]
+        if state == self.state:
+            return
+        if self.state in lineage["states"]:
+            start = lineage["states"].index(self.state) + 1
+            pairs = [tuple(p) for step in lineage["partitions"][start:] for p in step]
+            self.invalidate(partition_predicate(pairs))
+        elif self.state is not None:
+            self.invalidate()
+        self.restore(state)
+        self.state = state
+
+    def snapshot_path(self, state):
+        return self.snapshot_dir / f"{self.name}-{state[:16]}.pkl"
+
+    def save(self, state):
+        """Desa les entrades (ja serialitzades) per a l'estat ``state`` del dataset."""
+        if self.name is None:
+            return None
+        target = self.snapshot_path(state)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            entries = [(key, value) for key, (value, _) in self._entries.items()]
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=target.parent)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, target)
+        for old in target.parent.glob(f"{self.name}-*.pkl"):
+            if old != target:
+                old.unlink(missing_ok=True)
+        return target
+
+    def restore(self, state):
+        """Afegeix les entrades desades per a ``state``, si n'hi ha. Retorna quantes."""
+        if self.name is None:
+            return 0
+        try:
+            with open(self.snapshot_path(state), "rb") as f:
+                entries = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return 0
+        for key, value in entries:
+            self.put(key, value)
+        return len(entries)
+
+    def get_or_build(self, key, build):
+        """Resultat de ``build()`` per a ``key``; les figures es desen serialitzades."""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        value = freeze(build())
+        self.put(key, value)
+        return value
+
+
+# Figures per (gràfic, hash de l'agregat, paràmetres), compartides per tot el procés
+FIGURES = ResultCache(max_bytes=FIGURE_CACHE_BYTES)
+
+
+def cached_figure(name, data, build, *params):
+    """Figura serialitzada de ``build()``, reutilitzada si ``data`` i ``params`` coincideixen.
+
+    ``name`` identifica el gràfic i ``params`` ha d'incloure tot el que, a
+    part de ``data``, canvia la figura (mètrica, títol, nivell de detall...).
+    """
+    key = (name, content_hash(data)) + params
+    fig = FIGURES.get(key)
+    if fig is None:
+        fig = encode_figure(build())
+        FIGURES.put(key, fig)
+    return fig
@@ -0,0 +1,64 @@
+"""Constants i claus de versió de les fonts que les apps necessiten abans de carregar res.
+
+Només depèn de la biblioteca estàndard: les apps en treuen la versió del
+dataset, les opcions fixes del sidebar i els valors per defecte per decidir
+si serveixen la instantània estàtica, sense importar pandas ni plotly (vegeu
+``startup``). ``crime_store``, ``hotel_data``, ``hotel_cube`` i
+``crime_views`` en reexporten els noms.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+HOTEL_SOURCE = "hotel_bookings.csv"
+CRIME_SOURCE = "df_final_compressed.csv.gz"
+# Registre dels fitxers d'anys nous afegits sobre la font (al costat de la font)
+APPENDS_FILE = "crime_appends.json"
+
+MONTH_ORDER = ["January","February","March","April","May","June","July","August","September","October","November","December"]
+
+# Valors per defecte del top N d'app2 (tipus de delicte i cantons per gràfic).
+# Amb 267 tipus de delicte i 24 cantons, tots dos sumen la resta en un grup
+TOP_DELICTES = 20
+TOP_CANTONS = 10
+
+
+def file_version(path=HOTEL_SOURCE):
+    """Clau barata (mida i data de modificació) d'un fitxer."""
+    stat = Path(path).stat()
+    return (str(path), stat.st_size, stat.st_mtime_ns)
+
+
+def file_hash(path, block_size=1 << 20):
+    """Hash SHA-256 del contingut d'un fitxer, llegit per blocs."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def appends_file(path=CRIME_SOURCE):
+    return Path(path).parent / APPENDS_FILE
+
+
+def read_appends(path=CRIME_SOURCE):
+    """Fitxers d'anys nous afegits sobre ``path``, en l'ordre en què es van afegir."""
+    registry = appends_file(path)
+    if not registry.exists():
+        return []
+    with open(registry, encoding="utf-8") as f:
+        names = json.load(f)["appends"]
+    return [str(Path(path).parent / name) for name in names]
+
+
+def dataset_version(path=CRIME_SOURCE):
+    """Clau barata (mida i data de modificació) de la font i dels afegits.
+
+    Canvia quan es modifica el fitxer font o s'afegeix un any, sense haver de
+    calcular cap hash.
+    """
+    files = [Path(path), appends_file(path)] + [Path(p) for p in read_appends(path)]
+    return tuple(
+        (str(f), f.stat().st_size, f.stat().st_mtime_ns) for f in files if f.exists()
+    )
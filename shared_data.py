@@ -0,0 +1,132 @@
+"""Dades de només lectura compartides entre sessions de Streamlit.
+
+Els datasets es carreguen un sol cop per procés (``st.cache_resource``) i
+totes les sessions en fan servir el mateix objecte, sense còpies. Perquè cap
+sessió el pugui corrompre:
+
+* els vectors de dades es marquen com a no escrivibles (o són projeccions
+  ``mmap`` de només lectura dels paquets de ``.cache/``, i aleshores les
+  pàgines també es comparteixen entre processos del servidor);
+* els DataFrames compartits són ``FrozenFrame``: assignar columnes o valors
+  (``df['Categorie'] = ...``, ``df.loc[...] = ...``, ``inplace=True``) llança
+  ``TypeError``. Qualsevol operació que en deriva un resultat (filtres,
+  ``groupby``, ``copy()``...) retorna un DataFrame normal i modificable.
+"""
+import numpy as np
+import pandas as pd
+
+
+class ReadOnlyError(TypeError):
+    """S'ha intentat modificar un dataset compartit."""
+
+
+def _read_only(*args, **kwargs):
+    raise ReadOnlyError(
+        "Dataset compartit de només lectura: treballa sobre una còpia (df.copy()) o un resultat derivat"
+    )
+
+
+class _ReadOnlyIndexer:
+    """``loc``/``iloc``/``at``/``iat`` que permeten llegir però no assignar."""
+
+    __slots__ = ("_indexer",)
+
+    def __init__(self, indexer):
+        self._indexer = indexer
+
+    def __getitem__(self, key):
+        return self._indexer[key]
+
+    __setitem__ = _read_only
+
+
+class FrozenFrame(pd.DataFrame):
+    """DataFrame compartit que no es pot modificar; els derivats són DataFrames normals."""
+
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    @property
+    def loc(self):
+        return _ReadOnlyIndexer(super().loc)
+
+    @property
+    def iloc(self):
+        return _ReadOnlyIndexer(super().iloc)
+
+    @property
+    def at(self):
+        return _ReadOnlyIndexer(super().at)
+
+    @property
+    def iat(self):
+        return _ReadOnlyIndexer(super().iat)
+
+    def __setattr__(self, name, value):
+        if not name.startswith("_") and (name in ("columns", "index") or name in self.columns):
+            _read_only()
+        super().__setattr__(name, value)
+
+    __setitem__ = __delitem__ = _read_only
+    insert = pop = isetitem = update = _read_only
+    # Camins interns de pandas per a les operacions ``inplace=True``
+    _update_inplace = _set_item = _iset_item = _set_item_mgr = _iset_item_mgr = _read_only
+
+
+def readonly_array(values):
+    """Vista no escrivible de ``values`` (sense còpia)."""
+    values = np.asarray(values).view()
+    values.flags.writeable = False
+    return values
+
+
+def freeze_frame(df):
+    """``FrozenFrame`` amb les mateixes columnes que ``df``, sense copiar les dades.
+
+    Les columnes numèriques i els codis de les categòriques queden com a
+    vectors no escrivibles; la resta de tipus (text d'Arrow) ja són immutables.
+    """
+    data = {}
+    for name, col in df.items():
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            codes = readonly_array(col.array.codes)
+            data[name] = pd.Categorical.from_codes(codes, dtype=col.dtype, validate=False)
+        elif isinstance(col.dtype, np.dtype):
+            data[name] = readonly_array(col.to_numpy())
+        else:
+            data[name] = col.array
+    return FrozenFrame(data, index=df.index, copy=False)
+
+
+def freeze_cube(cube):
+    """Fa de només lectura les taules, l'índex, els moments i la llista de delictes d'un ``CrimeCube``."""
+    cube.facts = freeze_frame(cube.facts)
+    cube.attributes = freeze_frame(cube.attributes)
+    cube.offences = tuple(cube.offences)
+    if cube.stats is not None:
+        for name, value in vars(cube.stats).items():
+            if isinstance(value, np.ndarray):
+                setattr(cube.stats, name, readonly_array(value))
+            elif isinstance(value, dict):
+                for key, array in value.items():
+                    if isinstance(array, np.ndarray):
+                        value[key] = readonly_array(array)
+    if cube.index is not None:
+        cube.index.years = readonly_array(cube.index.years)
+        for postings in (cube.index.cantons, cube.index.offences):
+            for attr in ("codes", "order", "offsets"):
+                setattr(postings, attr, readonly_array(getattr(postings, attr)))
+    return cube
+
+
+def freeze_booking_cube(cube):
+    """Fa de només lectura les cel·les d'un ``BookingCube``."""
+    cube.cells = freeze_frame(cube.cells)
+    return cube
+
+
+def freeze_daily(daily):
+    """Fa de només lectura els arrays d'una ``DailySeries``."""
+    daily.values = {name: readonly_array(values) for name, values in daily.values.items()}
+    return daily
@@ -0,0 +1,328 @@
+"""Instantànies estàtiques (HTML) de la vista per defecte d'app.py i app2.py.
+
+La majoria de visites només miren els filtres per defecte. En mode lot
+(``python snapshot.py``) s'executa cada app sense navegador (``AppTest``)
+amb els filtres per defecte i amb totes les seccions obertes, i l'arbre
+d'elements resultant (títols, text, mètriques i figures de Plotly) es
+converteix en una pàgina HTML estàtica. La instantània es desa a
+``.cache/snapshots/`` amb un manifest que la lliga a la versió del dataset
+i que guarda les opcions del sidebar.
+
+En arrencar, l'app busca la instantània de la versió actual del dataset
+(``load_snapshot``): si hi és i els filtres són els per defecte, la serveix
+tal qual (``serve``), sense carregar dades ni construir cap figura, i només
+passa a calcular en viu quan es canvia un filtre o s'activa la vista
+interactiva.
+
+Ús::
+
+    python snapshot.py                          # les dues apps
+    python snapshot.py --apps app2 --assets site/   # + lloc estàtic amb figures a part
+"""
+import argparse
+import html
+import json
+import os
+import re
+import sys
+import tempfile
+import textwrap
+import time
+from pathlib import Path
+
+import plotly
+import streamlit as st
+
+# Sense pandas: les apps l'importen abans de saber si cal carregar dades
+from settings import CRIME_SOURCE, HOTEL_SOURCE, dataset_version, file_hash, file_version
+
+SNAPSHOT_DIR = Path(".cache") / "snapshots"
+# Clau del commutador del sidebar que força la vista en viu
+LIVE_KEY = "vista_interactiva"
+# Prefix de les claus dels expanders de les seccions (app2.lazy_section)
+SECTION_PREFIX = "seccio_"
+
+SCRIPTS = {"app": "app.py", "app2": "app2.py"}
+
+
+# ---------- Opcions del sidebar ----------
+def hotel_options(cube):
+    """Opcions dels filtres d'app.py a partir del ``BookingCube``."""
+    return {"hotels": [str(h) for h in cube.hotels]}
+
+
+def crime_options(cube):
+    """Opcions dels filtres d'app2 a partir del ``CrimeCube``."""
+    return {
+        "years": [int(y) for y in cube.year_range()],
+        "cantons": [str(c) for c in cube.cantons()],
+        "offences": [str(o) for o in cube.offences],
+    }
+
+
+def _hotel_dataset():
+    from hotel_cube import BookingCube
+    from hotel_data import load_bookings
+
+    cube = BookingCube.from_bookings(load_bookings(HOTEL_SOURCE))
+    return file_hash(HOTEL_SOURCE), file_version(HOTEL_SOURCE), hotel_options(cube)
+
+
+def _crime_dataset():
+    from crime_cube import CrimeCube
+    from crime_store import MMAP, cube_lineage, load_cube_tables
+
+    cube = CrimeCube.from_aggregates(*load_cube_tables(CRIME_SOURCE, mmap=MMAP))
+    state = cube_lineage(CRIME_SOURCE)["states"][-1]
+    return state, dataset_version(CRIME_SOURCE), crime_options(cube)
+
+
+DATASETS = {"app": _hotel_dataset, "app2": _crime_dataset}
+
+
+# ---------- Manifest ----------
+def _plain(version):
+    """Versió del dataset tal com queda al JSON (tuples -> llistes)."""
+    return json.loads(json.dumps(version))
+
+
+def manifest_path(app, snapshot_dir=SNAPSHOT_DIR):
+    return Path(snapshot_dir) / f"{app}.json"
+
+
+def load_snapshot(app, version, snapshot_dir=SNAPSHOT_DIR):
+    """Instantània d'``app`` per a ``version`` del dataset, o ``None``.
+
+    Retorna el manifest (``state``, ``version``, ``options``...) amb la
+    pàgina a ``html``.
+    """
+    try:
+        manifest = json.loads(manifest_path(app, snapshot_dir).read_text(encoding="utf-8"))
+        if manifest["version"] != _plain(version):
+            return None
+        manifest["html"] = (Path(snapshot_dir) / manifest["page"]).read_text(encoding="utf-8")
+    except (OSError, ValueError, KeyError):
+        return None
+    return manifest
+
+
+def serve(snapshot, default_view):
+    """Mostra la instantània si n'hi ha i la vista és la per defecte.
+
+    Retorna ``True`` si s'ha servit (l'app s'ha d'aturar); afegeix al sidebar
+    el commutador per passar a la vista en viu.
+    """
+    if snapshot is None:
+        return False
+    live = st.sidebar.toggle(
+        "Vista interactiva", key=LIVE_KEY,
+        help="Calcula les seccions en viu (detall del mapa, mode de la dispersió...)",
+    )
+    if live or not default_view:
+        return False
+    st.iframe(snapshot["html"])
+    return True
+
+
+# ---------- Conversió a HTML ----------
+def _inline(text):
+    """Marques en línia del Markdown que fan servir les apps."""
+    text = html.escape(text, quote=False)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])", r"<em>\1</em>", text)
+    text = re.sub(r"\[([^\]]+)\]\((https?://[^)\s]+)\)", r'<a href="\2">\1</a>', text)
+    text = re.sub(r"(?<![\"'>])(https?://[^\s<]+)", r'<a href="\1">\1</a>', text)
+    return re.sub(r" {2,}\n", "<br>\n", text)
+
+
+def markdown_html(text):
+    """Markdown de blocs (títols, cites, separadors i paràgrafs) a HTML."""
+    out = []
+    for block in re.split(r"\n\s*\n", textwrap.dedent(text).strip()):
+        lines = block.strip("\n").splitlines()
+        if not lines:
+            continue
+        first = lines[0].strip()
+        if first == "---" and len(lines) == 1:
+            out.append("<hr>")
+        elif first.startswith("#"):
+            level = min(len(first) - len(first.lstrip("#")), 6)
+            out.append(f"<h{level}>{_inline(first.lstrip('#').strip())}</h{level}>")
+            if lines[1:]:
+                out.append(markdown_html("\n".join(lines[1:])))
+        elif all(line.lstrip().startswith(">") for line in lines):
+            quote = "\n".join(line.lstrip()[1:].strip() for line in lines)
+            out.append(f"<blockquote>{_inline(quote)}</blockquote>")
+        else:
+            out.append(f"<p>{_inline(chr(10).join(line.strip() for line in lines))}</p>")
+    return "\n".join(out)
+
+
+class _Page:
+    """Acumula l'HTML i les figures d'un arbre d'elements d'``AppTest``."""
+
+    HEADINGS = {"title": "h1", "header": "h2", "subheader": "h3"}
+    WIDGETS = {"selectbox", "number_input", "slider", "select_slider", "multiselect", "radio"}
+
+    def __init__(self, expanded):
+        self.expanded = expanded
+        self.figures = []
+
+    def render(self, node):
+        kind = getattr(node, "type", None)
+        if kind in self.HEADINGS:
+            tag = self.HEADINGS[kind]
+            return f"<{tag}>{html.escape(node.value)}</{tag}>"
+        if kind == "markdown":
+            return markdown_html(node.value)
+        if kind == "caption":
+            return f'<p class="caption">{_inline(node.value)}</p>'
+        if kind == "metric":
+            return (f'<div class="metric"><div class="label">{html.escape(node.label)}</div>'
+                    f'<div class="value">{html.escape(str(node.value))}</div></div>')
+        if kind == "plotly_chart":
+            self.figures.append(node.proto.spec)
+            return f'<div class="chart" id="fig-{len(self.figures) - 1}"></div>'
+        if kind in self.WIDGETS:
+            # Els controls de cada secció queden fixats al seu valor per defecte
+            return f'<p class="param">{html.escape(node.label)}: {html.escape(str(node.value))}</p>'
+        body = "\n".join(self.render(child) for child in getattr(node, "children", {}).values())
+        if kind == "expander":
+            state = " open" if self.expanded.get(node.label) else ""
+            return f"<details{state}><summary>{html.escape(node.label)}</summary>\n{body}\n</details>"
+        if kind == "flex_container":
+            return f'<div class="row">{body}</div>'
+        if kind == "column":
+            return f'<div class="col">{body}</div>'
+        return body
+
+
+STYLE = """
+body { font-family: "Source Sans Pro", sans-serif; max-width: 1100px; margin: 0 auto;
+       padding: 1rem 2rem; color: #31333f; }
+.row { display: flex; gap: 1rem; } .col { flex: 1; min-width: 0; }
+.metric .label { font-size: .9rem; } .metric .value { font-size: 2.2rem; }
+.caption, .param { color: #808495; font-size: .9rem; }
+blockquote { border-left: 4px solid #ddd; margin: 0; padding-left: 1rem; }
+details { border: 1px solid #e6e6e6; border-radius: .5rem; padding: .5rem 1rem; margin: .5rem 0; }
+summary { cursor: pointer; }
+"""
+
+# Dibuixa les figures (JSON incrustat o, amb ``data-src``, fitxers a part),
+# amb els seus frames d'animació, i les redimensiona en obrir una secció plegada.
+SCRIPT = """
+document.querySelectorAll(".chart").forEach(async function (div) {
+  var spec = div.dataset.src
+    ? await (await fetch(div.dataset.src)).json()
+    : JSON.parse(document.getElementById(div.id + "-data").textContent);
+  // Figura sencera: amb els frames, les animacions (play/pausa, slider d'anys) funcionen
+  Plotly.newPlot(div, {data: spec.data, layout: spec.layout, frames: spec.frames || [],
+                       config: {responsive: true, displaylogo: false}});
+});
+document.querySelectorAll("details").forEach(function (box) {
+  box.addEventListener("toggle", function () {
+    box.querySelectorAll(".js-plotly-plot").forEach(function (div) { Plotly.Plots.resize(div); });
+  });
+});
+"""
+
+
+def _escape_json(spec):
+    return spec.replace("</", "<\\/")
+
+
+def render_page(at, expanded, assets=None, plotlyjs="cdn"):
+    """Pàgina HTML de la vista d'``at``; amb ``assets``, les figures van a ``assets/figures/``."""
+    page = _Page(expanded)
+    body = page.render(at.main)
+    if assets is None:
+        # JSON incrustat; "</" s'escapa (_escape_json) perquè no tanqui el <script>
+        data = "\n".join(
+            f'<script type="application/json" id="fig-{i}-data">{_escape_json(spec)}</script>'
+            for i, spec in enumerate(page.figures)
+        )
+    else:
+        figures = Path(assets) / "figures"
+        figures.mkdir(parents=True, exist_ok=True)
+        for i, spec in enumerate(page.figures):
+            (figures / f"{i}.json").write_text(spec, encoding="utf-8")
+            body = body.replace(f'id="fig-{i}"', f'id="fig-{i}" data-src="figures/{i}.json"', 1)
+        data = ""
+    if plotlyjs == "inline":
+        library = f"<script>{plotly.offline.get_plotlyjs()}</script>"
+    else:
+        library = f'<script src="https://cdn.plot.ly/plotly-{plotly.offline.get_plotlyjs_version()}.min.js"></script>'
+    title = html.escape(at.title[0].value) if len(at.title) else ""
+    return (f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{title}</title>\n'
+            f"<style>{STYLE}</style>\n{library}\n</head><body>\n{body}\n{data}\n"
+            f"<script>{SCRIPT}</script>\n</body></html>\n")
+
+
+# ---------- Exportació ----------
+def _run_default_view(app):
+    """Executa ``app`` amb els filtres per defecte i totes les seccions obertes."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.abspath(SCRIPTS[app]), default_timeout=600)
+    at.session_state[LIVE_KEY] = True
+    at.run()
+    expanded = {}
+    for node in at.main.children.values():
+        if getattr(node, "type", None) == "expander":
+            expanded[node.label] = node.proto.expanded
+    lazy = [key for key in at.session_state if key.startswith(SECTION_PREFIX)]
+    if lazy:
+        for key in lazy:
+            at.session_state[key] = True
+        at.run()
+    if len(at.exception):
+        raise RuntimeError(f"{app}: {at.exception[0].value}")
+    return at, expanded
+
+
+def export(app, snapshot_dir=SNAPSHOT_DIR, assets=None, plotlyjs="cdn"):
+    """Desa la instantània d'``app`` i en retorna el manifest."""
+    state, version, options = DATASETS[app]()
+    at, expanded = _run_default_view(app)
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    page = f"{app}-{state[:16]}.html"
+    text = render_page(at, expanded, plotlyjs=plotlyjs)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=snapshot_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    # Llegible pel servidor web si es publica el directori
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, snapshot_dir / page)
+    if assets is not None:
+        site = Path(assets) / app
+        site.mkdir(parents=True, exist_ok=True)
+        (site / "index.html").write_text(render_page(at, expanded, site, plotlyjs), encoding="utf-8")
+    manifest = {"app": app, "state": state, "version": _plain(version), "options": options,
+                "page": page, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    manifest_path(app, snapshot_dir).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    # Les pàgines d'estats anteriors ja no es poden servir
+    for old in snapshot_dir.glob(f"{app}-*.html"):
+        if old.name != page:
+            old.unlink(missing_ok=True)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=list(SCRIPTS), default=list(SCRIPTS))
+    parser.add_argument("--assets", metavar="DIR",
+                        help="escriu també un lloc estàtic per app amb les figures en fitxers JSON")
+    parser.add_argument("--plotlyjs", choices=["cdn", "inline"], default="cdn",
+                        help="plotly.js des del CDN (per defecte) o incrustat a la pàgina")
+    args = parser.parse_args(argv)
+    for app in args.apps:
+        start = time.perf_counter()
+        manifest = export(app, assets=args.assets, plotlyjs=args.plotlyjs)
+        size = (SNAPSHOT_DIR / manifest["page"]).stat().st_size
+        print(f"{app}: {manifest['page']} ({size / 1024:.0f} KB) en {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
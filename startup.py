@@ -0,0 +1,235 @@
+"""Arrencada ràpida dels dashboards i perfil d'arrencada.
+
+En un procés nou (una rèplica que s'acaba d'engegar), el primer rerun paga
+la importació de pandas, plotly.express i les vistes, la càrrega de dades i
+la construcció de les figures abans que l'usuari vegi res. Amb l'arrencada
+ràpida (``VIZ_FAST_START``, activada per defecte):
+
+* les apps només importen d'entrada ``streamlit`` i mòduls lleugers
+  (``settings``, ``snapshot``, ``instrumentation``), de manera que la
+  instantània estàtica es serveix sense importar pandas ni plotly;
+* en la vista en viu es pinten el títol, el text i els KPI abans d'importar
+  la pila de gràfics (``plotly.express`` i les vistes) i de construir les
+  seccions: Streamlit envia cada element al navegador a mesura que avança
+  l'script.
+
+Amb ``VIZ_FAST_START=0``, ``preload`` importa tota la pila d'entrada.
+
+``StartupProfile`` reparteix cada rerun entre ``imports`` (mòduls de
+l'script i de dades), ``dades`` (càrrega de dades i resultats desats),
+``imports_grafics`` (pila de gràfics) i ``render`` (la resta: elements,
+seccions i figures), i guarda quan s'ha fet el primer pintat (KPI o
+instantània). En el primer rerun de cada app dins del procés hi afegeix
+``arrencada``: el temps des que va començar el procés. Amb la instrumentació
+activada (``VIZ_PROFILE=1`` o ``?debug=1``) el perfil es mostra al sidebar i
+s'afegeix a ``logs/startup.jsonl`` (o al fitxer de ``VIZ_STARTUP_LOG``).
+
+Ús::
+
+    python startup.py                      # arrencada en fred de les dues apps, ràpida i completa
+    python startup.py --apps app2 --live   # sense instantània estàtica
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import instrumentation
+
+ENV_VAR = "VIZ_FAST_START"
+FAST_START = os.environ.get(ENV_VAR, "1").lower() in instrumentation.TRUE_VALUES
+LOG_PATH = Path(os.environ.get("VIZ_STARTUP_LOG", Path("logs") / "startup.jsonl"))
+
+# Pila que cada app importa després del primer pintat
+HEAVY_MODULES = {
+    "app": ["pandas", "plotly.express", "hotel_cube", "hotel_daily", "hotel_data", "result_cache", "charts",
+            "hotel_views"],
+    "app2": ["pandas", "plotly.express", "crime_cube", "crime_store", "result_cache", "geo_lod", "crime_views"],
+}
+
+# Últim perfil de cada app en aquest procés
+LAST = {}
+_started = set()
+_log_lock = threading.Lock()
+
+
+def process_age():
+    """Segons des que va començar el procés (Linux), o ``None``."""
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            # starttime és el camp 22; els camps comencen després del nom entre parèntesis
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def preload(app):
+    """Importa d'entrada la pila pesada d'``app`` (arrencada ràpida desactivada)."""
+    for name in HEAVY_MODULES[app]:
+        importlib.import_module(name)
+
+
+class StartupProfile:
+    """Temps de cada fase d'un rerun, des de l'inici de l'script."""
+
+    def __init__(self, app):
+        self.app = app
+        self.cold = app not in _started
+        _started.add(app)
+        self.boot = process_age() if self.cold else None
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.first_paint = None
+
+    def mark(self, phase):
+        """Compta com a ``phase`` el temps des de l'inici de l'script (p. ex. els imports del principi)."""
+        self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - self.start
+
+    @contextmanager
+    def phase(self, phase):
+        """Compta el temps del bloc com a ``phase``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - start
+
+    def load(self, *modules, phase="imports"):
+        """Importa ``modules`` (si no ho estaven) comptant-ho a ``phase``."""
+        with self.phase(phase):
+            return [importlib.import_module(name) for name in modules]
+
+    def painted(self):
+        """Marca el primer pintat: KPI o instantània ja enviats al navegador."""
+        if self.first_paint is None:
+            self.first_paint = time.perf_counter() - self.start
+
+    def record(self):
+        total = time.perf_counter() - self.start
+        phases = dict(self.phases, render=max(0.0, total - sum(self.phases.values())))
+        phases = {name: round(seconds, 4) for name, seconds in phases.items()}
+        if self.boot is not None:
+            phases = {"arrencada": round(self.boot, 3), **phases}
+        return {
+            "app": self.app,
+            "cold": self.cold,
+            "fast_start": FAST_START,
+            "phases": phases,
+            "first_paint_s": None if self.first_paint is None else round(self.first_paint, 4),
+            "total_s": round(total, 4),
+        }
+
+    def finish(self):
+        """Desa el perfil a ``LAST`` i, si la instrumentació està activada, el registra i el mostra."""
+        record = LAST[self.app] = self.record()
+        if not instrumentation.enabled():
+            return record
+        self._log(record)
+        self._panel(record)
+        return record
+
+    def _log(self, record):
+        stamp = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        try:
+            LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with _log_lock, open(LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"ts": stamp, **record}, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+    def _panel(self, record):
+        import streamlit as st
+
+        title = "Arrencada (debug)" if record["cold"] else "Rerun (debug)"
+        with st.sidebar.expander(title, expanded=record["cold"]):
+            rows = "\n".join(f"| {name} | {seconds:.3f} |" for name, seconds in record["phases"].items())
+            st.markdown(f"| fase | s |\n|---|---:|\n{rows}")
+            first = record["first_paint_s"]
+            st.caption(f"Primer pintat: {'-' if first is None else f'{first:.3f} s'} · "
+                       f"total: {record['total_s']:.3f} s · "
+                       f"arrencada ràpida: {'sí' if record['fast_start'] else 'no'}")
+
+
+# ---------- Mesura en fred ----------
+def _child(app, live):
+    """Primer i segon rerun d'``app`` en aquest procés; escriu el perfil en JSON."""
+    import logging
+    import warnings
+
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings("ignore")
+    start = time.perf_counter()
+    # Només per carregar-lo: el temps d'importar el servidor de Streamlit (el que
+    # ja té carregat abans del primer rerun) es compta com a "servidor"
+    importlib.import_module("streamlit.web.server")
+    from streamlit.testing.v1 import AppTest
+
+    import startup
+
+    server = time.perf_counter() - start
+    from snapshot import LIVE_KEY, SCRIPTS
+
+    at = AppTest.from_file(os.path.abspath(SCRIPTS[app]), default_timeout=600)
+    if live:
+        at.session_state[LIVE_KEY] = True
+    at.run()
+    cold = startup.LAST.get(app)
+    at.run()
+    warm = startup.LAST.get(app)
+    errors = [e.value for e in at.exception]
+    print(json.dumps({"servidor_s": round(server, 4), "cold": cold, "warm": warm, "errors": errors}))
+
+
+def measure(app, fast, live=False):
+    """Perfil d'arrencada en fred d'``app`` en un procés nou."""
+    env = dict(os.environ, **{ENV_VAR: "1" if fast else "0"})
+    args = [sys.executable, os.path.abspath(__file__), "--child", app] + (["--live"] if live else [])
+    out = subprocess.run(args, env=env, capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def print_report(results, out=sys.stdout):
+    phases = ["imports", "dades", "imports_grafics", "render"]
+    print(f"  {'app':<6}{'mode':<9}{'servidor':>10}" + "".join(f"{p:>16}" for p in phases)
+          + f"{'1r pintat':>11}{'total':>9}{'rerun':>9}", file=out)
+    for (app, mode), result in results.items():
+        cold, warm = result["cold"], result["warm"]
+        cells = "".join(f"{cold['phases'].get(p, 0.0):>16.3f}" for p in phases)
+        first = cold["first_paint_s"]
+        print(f"  {app:<6}{mode:<9}{result['servidor_s']:>10.3f}{cells}"
+              f"{'-' if first is None else f'{first:.3f}':>11}{cold['total_s']:>9.3f}"
+              f"{warm['total_s']:>9.3f}", file=out)
+        for error in result["errors"]:
+            print(f"    error: {error}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=list(HEAVY_MODULES), default=list(HEAVY_MODULES))
+    parser.add_argument("--modes", nargs="+", choices=["rapida", "completa"], default=["rapida", "completa"],
+                        help="arrencada ràpida i/o amb tota la pila importada d'entrada")
+    parser.add_argument("--live", action="store_true", help="vista en viu (sense instantània estàtica)")
+    parser.add_argument("--child", choices=list(HEAVY_MODULES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child(args.child, args.live)
+        return 0
+    results = {(app, mode): measure(app, mode == "rapida", args.live)
+               for app in args.apps for mode in args.modes}
+    print_report(results)
+    return 1 if any(result["errors"] for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Els mòduls del dashboard són al directori arrel del repositori
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,99 @@
+"""Top N de ``CrimeCube``: els valors fora del top se sumen en un sol grup.
+
+El cub es construeix amb una taula sintètica amb més tipus de delicte i
+cantons que els valors per defecte del top N, de manera que el límit
+s'aplica; els totals de cada tipus de delicte i de cada cantó són diferents
+(no hi ha empats) i proporcionals al seu índex.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import crime_views
+from crime_cube import KEYS, NACIONAL, RESTA_CANTONS, RESTA_DELICTES, TOTAL_CASOS, CrimeCube
+from settings import TOP_CANTONS, TOP_DELICTES
+
+OFFENCES = [f"Delicte {i:02d}" for i in range(TOP_DELICTES + 10)]
+CANTONS = [NACIONAL] + [f"Cantó {i:02d}" for i in range(TOP_CANTONS + 5)]
+YEARS = [2020, 2021, 2022]
+LEVELS = [TOTAL_CASOS, "Resolts", "No resolts"]
+
+
+@pytest.fixture(scope="module")
+def cube():
+    df = pd.DataFrame(
+        [(c, y, o, level) for c in CANTONS for y in YEARS for o in OFFENCES for level in LEVELS],
+        columns=KEYS,
+    )
+    offence = df["Tipus_de_Delicte"].map({o: i + 1 for i, o in enumerate(OFFENCES)})
+    canton = df["Canto_norm"].map({c: i + 1 for i, c in enumerate(CANTONS)})
+    df["Nombre_de_Delictes"] = offence * canton * (df["Any"] - 2000)
+    df["Taxa_Criminalitat_per_1000"] = 1.0
+    df["Percentatge_Casos_Resolts"] = 50.0
+    df["PIB_per_Capita"] = 80_000.0
+    df["Percentatge_Estrangers"] = 25.0
+    df["Poblacio_Total"] = 100_000
+    return CrimeCube.from_frame(df)
+
+
+@pytest.mark.parametrize("selection", [
+    (None, None, None),
+    ((2021, 2022), None, None),
+    (None, "Cantó 03", None),
+    ((2020, 2021), None, OFFENCES[::2]),
+])
+@pytest.mark.parametrize("column", ["Tipus_de_Delicte", "Canto_norm"])
+def test_ranking_matches_totals(cube, selection, column):
+    # Els totals de ``StatsStore`` són els mateixos que agrupant les files
+    for part in (cube.filter(*selection), cube.filter(*selection).exclude("Canto_norm", NACIONAL)):
+        values, counts = part.ranking(column)
+        totals = part.totals(column)
+        assert list(values) == list(totals[column])
+        np.testing.assert_array_equal(counts, totals["Nombre_de_Delictes"].to_numpy())
+
+
+def test_top_offences(cube):
+    assert cube.top("Tipus_de_Delicte", 3) == OFFENCES[:-4:-1]
+    assert cube.filter(offences=OFFENCES[:5]).top("Tipus_de_Delicte", 3) == OFFENCES[4:1:-1]
+
+
+def test_limit_offences(cube):
+    totals = cube.totals(["Tipus_de_Delicte", "Nivell_de_Resolucio"])
+    limited = cube.limit(totals, "Tipus_de_Delicte", 5, RESTA_DELICTES)
+    kept = OFFENCES[-5:]
+    assert list(limited["Tipus_de_Delicte"].cat.categories) == kept + [RESTA_DELICTES]
+    # Els valors del top no canvien i la resta se suma per nivell de resolució
+    inside = totals[totals["Tipus_de_Delicte"].isin(kept)]
+    assert_frame_equal(
+        limited[limited["Tipus_de_Delicte"].isin(kept)].reset_index(drop=True),
+        inside.assign(Tipus_de_Delicte=inside["Tipus_de_Delicte"].astype(
+            limited["Tipus_de_Delicte"].dtype)).reset_index(drop=True),
+    )
+    other = limited[limited["Tipus_de_Delicte"] == RESTA_DELICTES]
+    expected = totals[~totals["Tipus_de_Delicte"].isin(kept)].groupby(
+        "Nivell_de_Resolucio", observed=True)["Nombre_de_Delictes"].sum()
+    assert dict(zip(other["Nivell_de_Resolucio"], other["Nombre_de_Delictes"])) == expected.to_dict()
+
+
+def test_limit_without_remainder(cube):
+    # Si tots els valors hi caben, la taula no canvia
+    totals = cube.totals(["Tipus_de_Delicte"])
+    assert cube.limit(totals, "Tipus_de_Delicte", len(OFFENCES), RESTA_DELICTES) is totals
+
+
+def test_resolution_view_default(cube):
+    data = crime_views.resolution_view(cube)["data"]
+    offences = data["Tipus_de_Delicte"].unique()
+    assert len(offences) == TOP_DELICTES + 1
+    assert RESTA_DELICTES in offences
+    assert TOTAL_CASOS not in set(data["Nivell_de_Resolucio"])
+
+
+def test_canton_view_default(cube):
+    data = crime_views.canton_category_view(cube)["data"]
+    cantons = list(data["Canto_norm"].cat.categories)
+    assert cantons[-1] == RESTA_CANTONS and len(cantons) == TOP_CANTONS + 1
+    assert NACIONAL not in cantons
+    assert data["Nombre_de_Delictes"].sum() == cube.exclude("Canto_norm", NACIONAL).totals(
+        "Canto_norm")["Nombre_de_Delictes"].sum()
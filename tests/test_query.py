@@ -0,0 +1,168 @@
+"""Paritat dels backends de ``query`` (polars, duckdb) amb pandas.
+
+Cada operació (``mask``, ``group_sum``, pivots sobre les sumes i ``share``)
+s'executa sobre les taules dels cubs construïts amb les mostres de
+``tests/data`` i sobre una taula petita amb els casos límit (NaN a les claus
+i als valors, categories en ordre no alfabètic i sense files, enters de mides
+diferents) i es compara amb el backend de pandas. Els backends s'instal·len
+amb ``requirements-backends.txt``; si el paquet no hi és, les proves s'ometen.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal, assert_series_equal
+
+import query
+from settings import MONTH_ORDER
+
+# Mostres petites dels dos datasets
+DATA = Path(__file__).resolve().parent / "data"
+CRIME_SAMPLE = DATA / "crime_sample.csv.gz"
+HOTEL_SAMPLE = DATA / "hotel_sample.csv"
+# Decimals: l'ordre de les sumes pot canviar l'últim bit
+RTOL = 1e-12
+
+
+@pytest.fixture(scope="module", params=["polars", "duckdb"])
+def backend(request):
+    pytest.importorskip(request.param)
+    return query.BACKENDS[request.param]()
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return query.PandasBackend()
+
+
+@pytest.fixture(scope="module")
+def facts(tmp_path_factory):
+    from crime_store import load_cube_tables
+
+    return load_cube_tables(CRIME_SAMPLE, cache_dir=tmp_path_factory.mktemp("crime"))[0]
+
+
+@pytest.fixture(scope="module")
+def cells():
+    from hotel_cube import BookingCube
+    from hotel_data import load_bookings
+
+    return BookingCube.from_bookings(load_bookings(HOTEL_SAMPLE)).cells
+
+
+@pytest.fixture(scope="module")
+def edge():
+    """Taula petita amb els casos límit."""
+    return pd.DataFrame({
+        # Ordre de categories no alfabètic, una categoria sense files i claus nul·les
+        "Clau": pd.Categorical(["b", "a", None, "b", "c", "a", None, "c"],
+                               categories=["c", "b", "a", "z"]),
+        "Any": np.array([2012, 2010, 2011, 2012, 2010, 2011, 2012, 2010], dtype=np.int16),
+        "Text": ["x", "y", "x", None, "y", "x", "y", "x"],
+        "Petit": np.array([1, 2, 3, 4, 5, 6, 7, 8], dtype=np.int8),
+        "Gran": np.array([10**12, 1, 2, 3, 4, 5, 6, 7], dtype=np.int64),
+        "Decimal": [0.1, np.nan, 2.5, 1e-3, np.nan, 7.25, 3.0, np.nan],
+    })
+
+
+def _assert_same(expected, actual):
+    if isinstance(expected, np.ndarray):
+        np.testing.assert_array_equal(actual, expected)
+    elif isinstance(expected, pd.Series):
+        assert_series_equal(actual, expected, check_exact=False, rtol=RTOL)
+    else:
+        assert_frame_equal(actual, expected, check_exact=False, rtol=RTOL)
+
+
+# ---------- Taules dels cubs ----------
+def test_mask_crime(backend, reference, facts):
+    offences = list(pd.unique(facts["Tipus_de_Delicte"]))[::2]
+    from crime_cube import TOTAL_CASOS
+
+    for kwargs in [
+        {"isin": {"Tipus_de_Delicte": offences}, "between": {"Any": (2012, 2018)}},
+        {"exclude": {"Nivell_de_Resolucio": TOTAL_CASOS}},
+        {"isin": {"Canto_norm": ["Zurich", "Bern"]}, "exclude": {"Nivell_de_Resolucio": TOTAL_CASOS}},
+        {},
+    ]:
+        _assert_same(reference.mask(facts, **kwargs), backend.mask(facts, **kwargs))
+
+
+def test_mask_hotel(backend, reference, cells):
+    kwargs = {"isin": {"Tipus_Hotel": ["Resort"], "Mes": MONTH_ORDER[5:8]}}
+    _assert_same(reference.mask(cells, **kwargs), backend.mask(cells, **kwargs))
+
+
+@pytest.mark.parametrize("by, columns", [
+    (["Any", "Tipus_de_Delicte"], "Nombre_de_Delictes"),
+    (["Canto_norm", "Any"], ["Taxa_suma", "Taxa_n", "Nombre_de_Delictes"]),
+    ("Nivell_de_Resolucio", "Nombre_de_Delictes"),
+])
+def test_group_sum_crime(backend, reference, facts, by, columns):
+    _assert_same(reference.group_sum(facts, by, columns), backend.group_sum(facts, by, columns))
+
+
+@pytest.mark.parametrize("by, columns, observed", [
+    (["Segment_Mercat", "Tipus_Hotel"], "Nombre", True),
+    ("Cancel·lada", "Nombre", False),
+    (["Mes", "Tipus_Hotel"], ["Tarifa_suma", "Tarifa_n"], True),
+    (["Dies_Abans_Cat", "Tipus_Hotel"], ["Nombre", "Tarifa_suma"], False),
+])
+def test_group_sum_hotel(backend, reference, cells, by, columns, observed):
+    _assert_same(reference.group_sum(cells, by, columns, observed=observed),
+                 backend.group_sum(cells, by, columns, observed=observed))
+
+
+def test_pivot(backend, reference, facts, cells):
+    # Com les vistes: sumes per dues claus i pivot a taula ampla
+    def crime(b):
+        return b.group_sum(facts, ["Any", "Tipus_de_Delicte"], "Nombre_de_Delictes").pivot(
+            index="Any", columns="Tipus_de_Delicte", values="Nombre_de_Delictes")
+
+    def hotel(b):
+        return b.group_sum(cells, ["Dies_Abans_Cat", "Tipus_Hotel"], "Nombre", observed=False).pivot(
+            index="Dies_Abans_Cat", columns="Tipus_Hotel", values="Nombre")
+
+    _assert_same(crime(reference), crime(backend))
+    _assert_same(hotel(reference), hotel(backend))
+
+
+def test_share(backend, reference, facts, cells):
+    totals = reference.group_sum(facts, ["Any", "Nivell_de_Resolucio"], "Nombre_de_Delictes")
+    _assert_same(reference.share(totals, "Any", "Nombre_de_Delictes"),
+                 backend.share(totals, "Any", "Nombre_de_Delictes"))
+    segments = reference.group_sum(cells, ["Segment_Mercat", "Tipus_Hotel"], "Nombre")
+    _assert_same(reference.share(segments, ["Tipus_Hotel"], "Nombre"),
+                 backend.share(segments, ["Tipus_Hotel"], "Nombre"))
+
+
+# ---------- Casos límit ----------
+@pytest.mark.parametrize("kwargs", [
+    {"isin": {"Clau": ["a", "z"]}},
+    {"isin": {"Text": ["x"]}},
+    {"between": {"Decimal": (0.0, 3.0)}},
+    {"between": {"Any": (2011, 2012)}},
+    {"exclude": {"Clau": "b"}},
+    {"exclude": {"Text": "y"}},
+])
+def test_mask_edge(backend, reference, edge, kwargs):
+    # Les claus i els valors nuls no compleixen isin/between i sí exclude
+    _assert_same(reference.mask(edge, **kwargs), backend.mask(edge, **kwargs))
+
+
+@pytest.mark.parametrize("by", ["Clau", ["Clau", "Any"], ["Any", "Clau"], "Text", "Any"])
+@pytest.mark.parametrize("observed", [True, False])
+def test_group_sum_edge(backend, reference, edge, by, observed):
+    # Grups amb clau nul·la descartats, NaN saltats, ordre de categories,
+    # grups buits amb observed=False i tipus enters com a pandas
+    columns = ["Petit", "Gran", "Decimal"]
+    expected = reference.group_sum(edge, by, columns, observed=observed)
+    actual = backend.group_sum(edge, by, columns, observed=observed)
+    _assert_same(expected, actual)
+    assert list(actual.dtypes) == list(expected.dtypes)
+
+
+def test_share_edge(backend, reference, edge):
+    for by, column in [("Any", "Decimal"), (["Any"], "Petit"), ("Text", "Gran")]:
+        _assert_same(reference.share(edge, by, column), backend.share(edge, by, column))
@@ -0,0 +1,187 @@
+"""Escalfament de les memòries cau dels dos dashboards, pensat per a un readiness hook.
+
+Construeix els paquets de dades a ``.cache/`` i precalcula, amb els filtres
+per defecte, les dades i figures de totes les seccions d'app.py i app2.py.
+Les seccions són independents i es reparteixen entre un pool de processos;
+cada resultat es desa ja serialitzat amb ``ResultCache.save``, i les apps el
+recuperen en arrencar (``ResultCache.restore``/``sync``). Així el primer
+usuari després d'un desplegament no paga ni el parseig ni les figures.
+
+Ús::
+
+    python warmup.py                    # les dues apps, un procés per CPU
+    python warmup.py --apps app2 --workers 2
+
+Surt amb codi 1 si alguna secció falla.
+"""
+import argparse
+import functools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Importar streamlit registra la plantilla de Plotly que fan servir les apps;
+# sense ella les figures desades tindrien colors diferents.
+import streamlit  # noqa: F401
+
+import crime_views
+import hotel_views
+from charts import DEFAULT_MAX_POINTS, LOD_MODES
+from crime_cube import CrimeCube
+from crime_store import SOURCE as CRIME_SOURCE, build_cube_cache, cube_lineage, read_cube
+from geo_lod import AUTO, load_level
+from hotel_cube import MONTH_ORDER, BookingCube, booking_filter_key
+from hotel_daily import METRICS as DAILY_METRICS, DailySeries
+from hotel_data import SOURCE as HOTEL_SOURCE, load_bookings
+from result_cache import ResultCache, filter_key, freeze
+from settings import file_hash
+
+GEOJSON = "switzerland.geojson"
+DEFAULT_METRIC = "Taxa_Criminalitat_per_1000"
+
+# Dades carregades un sol cop per procés del pool
+_loaded = {}
+
+
+# ---------- Seccions per defecte ----------
+# Les claus han de coincidir amb les que construeixen app.py i app2.py
+# amb els valors per defecte dels seus widgets: (funció, paràmetres).
+HOTEL_SECTIONS = {
+    "kpis": (hotel_views.kpis_view, ()),
+    "cancel_pastissos": (hotel_views.cancellation_pies_view, ()),
+    "tipus_viatge": (hotel_views.trip_view, ()),
+    "segments": (hotel_views.segment_view, ()),
+    "estacionalitat": (hotel_views.season_view, ()),
+    "diari": (hotel_views.daily_view, (next(iter(DAILY_METRICS)),)),
+    "antelacio_tarifa": (hotel_views.lead_adr_view, (LOD_MODES[0], DEFAULT_MAX_POINTS)),
+    "perdua_cancel": (hotel_views.cancel_loss_view, ()),
+    "families": (hotel_views.family_view, ()),
+    "canals": (hotel_views.channel_view, ()),
+    "estada": (hotel_views.stay_view, ()),
+}
+
+CRIME_SECTIONS = {
+    "kpis": (crime_views.kpis_view, ()),
+    "mapa": (None, (DEFAULT_METRIC, AUTO)),
+    "evolucio": (crime_views.evolution_view, (DEFAULT_METRIC,)),
+    "socioeconomic": (crime_views.socioeconomic_view, ()),
+    "resolucio": (crime_views.resolution_view, (crime_views.TOP_DELICTES,)),
+    "tendencia_categoria": (crime_views.category_trend_view, ()),
+    "tendencia_resolucio": (crime_views.resolution_trend_view, ()),
+    "cantons": (crime_views.canton_category_view, (crime_views.TOP_CANTONS,)),
+    "correlacio": (crime_views.correlation_view, ()),
+    "bombolles": (crime_views.bubble_view, ()),
+}
+
+
+def _bind(view, params):
+    return lambda data: view(data, *params)
+
+
+def hotel_sections(df, cube):
+    """``{nom: (clau, funció)}`` de les seccions d'app.py amb els filtres per defecte."""
+    filters = booking_filter_key(cube.hotels, (MONTH_ORDER[0], MONTH_ORDER[-1]))
+
+    def lead_adr_view(data, mode, max_points):
+        # La dispersió és reserva a reserva: no surt del cub
+        return hotel_views.lead_adr_view(df, mode, max_points)
+
+    def daily_view(data, metric):
+        # La tendència diària surt de la sèrie per data d'arribada
+        return hotel_views.daily_view(DailySeries.from_bookings(df), metric)
+
+    overrides = {hotel_views.lead_adr_view: lead_adr_view, hotel_views.daily_view: daily_view}
+    return {name: ((name, filters) + params, _bind(overrides.get(view, view), params))
+            for name, (view, params) in HOTEL_SECTIONS.items()}
+
+
+def crime_sections(cube):
+    """``{nom: (clau, funció)}`` de les seccions d'app2 amb els filtres per defecte."""
+    years = cube.year_range()
+    filters = filter_key(years, None, cube.offences)
+    load_geojson = functools.cache(lambda level: load_level(level, GEOJSON))
+
+    def map_view(data, metric, detail):
+        return crime_views.map_view(data, years[1], metric, detail, load_geojson, cube.cantons())
+
+    return {name: ((name, filters) + params, _bind(view or map_view, params))
+            for name, (view, params) in CRIME_SECTIONS.items()}
+
+
+# ---------- Treball de cada procés ----------
+def _data(app):
+    if app not in _loaded:
+        if app == "app":
+            df = load_bookings(HOTEL_SOURCE)
+            cube = BookingCube.from_bookings(df)
+            _loaded[app] = (cube, hotel_sections(df, cube))
+        else:
+            cube = CrimeCube.from_aggregates(*read_cube(build_cube_cache(CRIME_SOURCE)))
+            data = cube.filter(cube.year_range(), None, cube.offences)
+            _loaded[app] = (data, crime_sections(cube))
+    return _loaded[app]
+
+
+def build_section(app, name):
+    """Calcula una secció i la retorna serialitzada: ``(clau, valor, segons)``."""
+    start = time.perf_counter()
+    data, sections = _data(app)
+    key, build = sections[name]
+    value = build(data)
+    return key, freeze(value), time.perf_counter() - start
+
+
+# ---------- Orquestració ----------
+def dataset_states(apps):
+    """Estat del dataset de cada app (clau de la instantània desada)."""
+    states = {}
+    if "app" in apps:
+        states["app"] = file_hash(HOTEL_SOURCE)
+    if "app2" in apps:
+        build_cube_cache(CRIME_SOURCE)
+        states["app2"] = cube_lineage(CRIME_SOURCE)["states"][-1]
+    return states
+
+
+def warm(apps, workers=None, out=sys.stdout):
+    """Precalcula i desa les seccions de ``apps``; retorna el nombre d'errors."""
+    apps = [app for app in apps if app != "app" or Path(HOTEL_SOURCE).exists()]
+    start = time.perf_counter()
+    # Els paquets de dades es construeixen abans del pool: un sol procés escriu a .cache/
+    states = dataset_states(apps)
+    names = {"app": list(HOTEL_SECTIONS), "app2": list(CRIME_SECTIONS)}
+    tasks = [(app, name) for app in apps for name in names[app]]
+    caches = {app: ResultCache(app) for app in apps}
+    errors = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(build_section, app, name): (app, name) for app, name in tasks}
+        for future in as_completed(futures):
+            app, name = futures[future]
+            try:
+                key, value, seconds = future.result()
+            except Exception as exc:
+                errors += 1
+                print(f"  {app}/{name}: ERROR {exc!r}", file=out)
+                continue
+            caches[app].put(key, value)
+            print(f"  {app}/{name}: {seconds:.2f} s", file=out)
+    for app, results in caches.items():
+        path = results.save(states[app])
+        print(f"{app}: {len(results)} seccions -> {path}", file=out)
+    print(f"Escalfament complet en {time.perf_counter() - start:.2f} s", file=out)
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=["app", "app2"], default=["app", "app2"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processos del pool (per defecte, un per CPU)")
+    args = parser.parse_args(argv)
+    return 1 if warm(args.apps, args.workers) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())